@@ -191,9 +191,10 @@ class DatasetController
                 throw new Exception("Python script failed with exit code {$returnCode}. Stderr: {$stderr}");
             }
 
-            // Robust JSON extraction: look for the LAST JSON object in stdout
+            // Robust JSON extraction: the optimizer writes one JSON message per line and the
+            // LAST one is the result (an optional provisional preview line comes first).
             $pythonResult = null;
-            if (preg_match('/(\{"success":\s*(?:true|false).+\})$/s', $stdout, $matches)) {
+            if (preg_match('/(\{"success":\s*(?:true|false)[^\n]*\})\s*$/', $stdout, $matches)) {
                 $pythonResult = json_decode($matches[1], true);
             }
 
@@ -298,7 +299,9 @@ class DatasetController
     private function executePython(string $canonicalJson): array
     {
         $pythonBin = "/usr/bin/python3";
-        $pythonScript = realpath(__DIR__ . "/../python/10/optimizer_canonical.py");
+        // Thin client: forwards to the persistent optimizer worker when it is running,
+        // otherwise runs optimizer_canonical.py in-process.
+        $pythonScript = realpath(__DIR__ . "/../python/10/optimizer_client.py");
         if (!file_exists($pythonScript)) throw new Exception('Python optimizer script not found.');
 
         $descriptorspec = [
@@ -1,8 +1,7 @@
 import os
 import sys
 import math
-import pandas as pd
-import numpy as np
+import statistics
 
 # -------------------------
 # División en bloques (3 a 5 pisos por bloque, lo más uniforme posible)
@@ -34,7 +33,7 @@ def dividir_en_bloques(pisos_max):
         sizes = [base + (1 if i < extra else 0) for i in range(nb)]
         # Si la partición es válida (todos los bloques entre 3 y 5 pisos), calcula su "balance" (varianza).
         if all(3 <= s <= 5 for s in sizes):
-            balance = np.var(sizes)
+            balance = statistics.pvariance(sizes)
             # Guarda la partición si es la más balanceada encontrada hasta ahora.
             if best_balance is None or balance < best_balance:
                 best_balance = balance
@@ -76,6 +75,9 @@ def leer_datos(sheet_name, INPUT_FILE, index_col=None):
         FileNotFoundError: Si el archivo `INPUT_FILE` no se encuentra.
         RuntimeError: Si ocurre cualquier otro error durante la lectura.
     """
+    # pandas solo se necesita para la carga desde Excel; se importa aquí para que
+    # la ruta JSON (optimizer_canonical) no pague su coste de importación.
+    import pandas as pd
     try:
         return pd.read_excel(INPUT_FILE, sheet_name=sheet_name, index_col=index_col)
     except FileNotFoundError:
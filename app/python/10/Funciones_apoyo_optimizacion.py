@@ -1,37 +1,53 @@
-import pandas as pd
-import math
-import os
-import sys
-import numpy as np
-from pulp import LpVariable, LpBinary, lpSum, value
+from itertools import repeat
+
+from pulp import LpVariable, LpBinary, LpAffineExpression, lpSum, value
+
+from apartment_tables import tablas_apartamento, repartidores_permitidos
+from catalog import compile_catalog
 
 # Definición de constantes para nombres de archivo de salida de gráficos.
 PLOT_LEVELS_PNG = "niveles_por_tu.png"
 PLOT_HIST_PNG = "histograma_niveles.png"
 
-def _crear_variables(params, pisos, all_toma_indices, bloques_de_pisos):
+def _crear_variables(params, pisos, all_toma_indices, bloques_de_pisos, tablas=None, reducida=False):
     """
     Crea y devuelve todas las variables de decisión para el modelo MILP.
 
     Define variables binarias para la selección de componentes (derivadores, repartidores)
-    y variables continuas para los niveles de señal y las desviaciones.
+    y variables continuas para los niveles de señal y las desviaciones. `tablas` son las
+    tablas de repartidores por apartamento; si no se pasan, se calculan aquí. Con
+    `reducida=True` no se crean variables 'nivel_tu': _restriccion_niveles_tu las
+    sustituye por su expresión afín.
     """
+    # Solo se crean variables para los pares (piso, equipo) que pueden ser factibles:
+    # los equipos sin salidas suficientes no llegan al modelo.
+
     # x: Variable binaria que indica si se selecciona el derivador 'd' en el piso 'p'.
     x = {(p, d): LpVariable(f"x_deriv_{p}_{d}", cat=LpBinary)
-         for p in pisos for d in params['derivadores_data']}
+         for p in pisos for d in _derivadores_validos(params)}
     
     # y: Variable binaria que indica si se selecciona el repartidor 'r' para el apartamento 'a' en el piso 'p'.
+    # Solo se crea para los repartidores de la tabla del apartamento (ver apartment_tables.py):
+    # uno por pérdida de inserción distinta y solo los que son la mejor opción para algún nivel de entrada.
+    if tablas is None:
+        tablas = tablas_apartamento(params, all_toma_indices)
     y = {(p, a, r): LpVariable(f"y_rep_{p}_{a}_{r}", cat=LpBinary)
          for p in pisos for a in range(1, params['apartamentos_por_piso'] + 1)
-         for r in params['repartidores_data']}
+         if (p, a) in tablas
+         for r in repartidores_permitidos(tablas[p, a])}
     
-    # z: Variable binaria que indica si se USA un repartidor en el apartamento 'a' del piso 'p'.
-    z = {(p, a): LpVariable(f"z_rep_use_{p}_{a}", cat=LpBinary)
-         for p in pisos for a in range(1, params['apartamentos_por_piso'] + 1)}
+    # z: Indica si se USA un repartidor en el apartamento 'a' del piso 'p'. Depende solo de las
+    # tomas requeridas (más de 1), así que se fija con sus cotas y no entra en el modelo.
+    z = {}
+    for p in pisos:
+        for a in range(1, params['apartamentos_por_piso'] + 1):
+            usa = 1 if params['tus_requeridos_por_apartamento'].get((p, a), 0) > 1 else 0
+            z[p, a] = LpVariable(f"z_rep_use_{p}_{a}", cat=LpBinary)
+            z[p, a].lowBound = z[p, a].upBound = z[p, a].varValue = usa
     
     # nivel_tu: Nivel de señal (variable continua) en una toma de usuario (TU) específica.
-    nivel_tu = {(p, a, tu_idx): LpVariable(f"nivel_{p}_{a}_{tu_idx}", lowBound=0)
-                for (p, a, tu_idx) in all_toma_indices}
+    nivel_tu = {} if reducida else {(p, a, tu_idx): LpVariable(f"nivel_{p}_{a}_{tu_idx}", lowBound=0)
+                                    for (p, a, tu_idx) in all_toma_indices}
     
     # d_plus/d_minus: Variables de desviación para penalizar la diferencia entre el nivel de señal y el objetivo.
     d_plus = {(p, a, tu_idx): LpVariable(f"dplus_{p}_{a}_{tu_idx}", lowBound=0)
@@ -41,7 +57,7 @@ def _crear_variables(params, pisos, all_toma_indices, bloques_de_pisos):
     
     # r_troncal: Variable binaria para la selección del repartidor troncal.
     r_troncal = {r: LpVariable(f"r_troncal_{r}", cat=LpBinary)
-                 for r in params['repartidores_data']}
+                 for r in _troncales_validos(params, len(bloques_de_pisos))}
     
     # pot_in_riser_by_block: Potencia de entrada a la línea principal (riser) en un piso y bloque específicos.
     pot_in_riser_by_block = {(p, b_idx): LpVariable(f"pot_riser_p{p}_b{b_idx}", lowBound=0)
@@ -49,43 +65,62 @@ def _crear_variables(params, pisos, all_toma_indices, bloques_de_pisos):
     
     return x, y, z, nivel_tu, d_plus, d_minus, r_troncal, pot_in_riser_by_block
 
+def _derivadores_validos(params):
+    """Derivadores no dominados con salidas suficientes para los apartamentos de un piso."""
+    return compile_catalog(params).derivadores.para_salidas(params['apartamentos_por_piso'])
+
+def _troncales_validos(params, num_bloques):
+    """Repartidores no dominados con salidas suficientes para alimentar todos los bloques."""
+    return compile_catalog(params).repartidores.para_salidas(num_bloques)
+
+def _clases_tomas(params, all_toma_indices):
+    """
+    Agrupa las tomas que comparten piso, apartamento y largo de cable: {representante: [tomas]}.
+
+    Las tomas de una misma clase tienen el mismo nivel con cualquier diseño, así que el
+    modelo crea variables y restricciones solo para el representante (la primera toma de
+    la clase) y pondera su desviación por el tamaño de la clase.
+    """
+    clases, representante = {}, {}
+    for (p, a, tu_idx) in all_toma_indices:
+        clave = (p, a, params['largo_cable_tu'][(p, a, tu_idx)])
+        rep = representante.setdefault(clave, (p, a, tu_idx))
+        clases.setdefault(rep, []).append((p, a, tu_idx))
+    return clases
+
+def _repartidores_por_apto(y):
+    """Agrupa las variables 'y' por apartamento: {(p, a): [repartidores]}."""
+    por_apto = {}
+    for (p, a, r) in y:
+        por_apto.setdefault((p, a), []).append(r)
+    return por_apto
+
+def _perdida_seleccion(variables, columnas, atributo):
+    """Expresión sum(var * atributo) para [(nombre, var)], con coeficientes del catálogo compilado."""
+    return LpAffineExpression([(var, columnas.valor(nombre, atributo)) for nombre, var in variables])
+
 def _restriccion_troncal(modelo, params, r_troncal, num_bloques):
     """Añade las restricciones para la selección del repartidor troncal."""
-    # Asegura que se seleccione exactamente un repartidor troncal.
+    # Asegura que se seleccione exactamente un repartidor troncal (solo existen
+    # variables para los que tienen salidas suficientes para todos los bloques).
     modelo += lpSum(r_troncal[r] for r in r_troncal) == 1, "seleccion_un_troncal"
-    # Asegura que el repartidor troncal seleccionado tenga suficientes salidas para todos los bloques.
-    for r, data in params['repartidores_data'].items():
-        if data.get('salidas', 0) < num_bloques:
-            modelo += r_troncal[r] == 0, f"troncal_{r}_no_suf_salidas"
 
 def _restriccion_derivador(modelo, params, x, pisos):
     """Añade las restricciones para la selección de derivadores en cada piso."""
+    derivadores = _derivadores_validos(params)
     for p in pisos:
         # Asegura que se seleccione exactamente un derivador por piso.
-        modelo += lpSum(x[p, d] for d in params['derivadores_data']) == 1, f"one_derivador_p{p}"
-        # Asegura que el derivador seleccionado tenga suficientes salidas para los apartamentos del piso.
-        for d, ddata in params['derivadores_data'].items():
-            if ddata.get('salidas', 0) < params['apartamentos_por_piso']:
-                modelo += x[p, d] == 0, f"deriv_{d}_no_salidas_p{p}"
+        modelo += lpSum(x[p, d] for d in derivadores) == 1, f"one_derivador_p{p}"
 
 def _restriccion_repartidor_apto(modelo, params, y, z, pisos):
     """Añade las restricciones para la selección de repartidores en cada apartamento."""
+    repartidores = _repartidores_por_apto(y)
     for p in pisos:
         for a in range(1, params['apartamentos_por_piso'] + 1):
-            tu_req = params['tus_requeridos_por_apartamento'].get((p, a), 0)
-            # Si el apartamento requiere 1 o 0 tomas, no se necesita repartidor.
-            if tu_req <= 1:
-                modelo += z[p, a] == 0, f"no_rep_p{p}_a{a}"
-                modelo += lpSum(y[p, a, r] for r in params['repartidores_data']) == 0, f"no_yvars_p{p}_a{a}"
-            # Si se requieren más de 1 toma, se debe usar un repartidor.
-            else:
-                modelo += z[p, a] == 1, f"use_rep_p{p}_a{a}"
-                # Asegura que se seleccione un solo repartidor para el apartamento.
-                modelo += lpSum(y[p, a, r] for r in params['repartidores_data']) == 1, f"one_y_p{p}_a{a}"
-                # El repartidor seleccionado debe tener suficientes salidas.
-                for r, rdata in params['repartidores_data'].items():
-                    if rdata.get('salidas', 0) < tu_req:
-                        modelo += y[p, a, r] == 0, f"y_{r}_insuf_p{p}_a{a}"
+            # Si el apartamento requiere 1 o 0 tomas no tiene variables 'y' (z fijado a 0).
+            # Si requiere más, se debe seleccionar un solo repartidor de su tabla.
+            if params['tus_requeridos_por_apartamento'].get((p, a), 0) > 1:
+                modelo += lpSum(y[p, a, r] for r in repartidores.get((p, a), [])) == 1, f"one_y_p{p}_a{a}"
 
 def _perdidas_comunes(params, r_troncal):
     """Calculates common losses from the antenna to the trunk distributor.
@@ -106,78 +141,119 @@ def _perdidas_comunes(params, r_troncal):
     loss_ant_troncal = long_ant_troncal * params['atenuacion_cable_por_metro']
     loss_conns_ant_troncal = params['conectores_por_union'] * params['atenuacion_conector']
     # Pérdida de inserción del troncal seleccionado    
-    loss_troncal_ins = lpSum(r_troncal[r] * params['repartidores_data'][r]['perdida_insercion']
-                             for r in params['repartidores_data'])
+    loss_troncal_ins = _perdida_seleccion(r_troncal.items(), compile_catalog(params).repartidores, 'perdida_insercion')
     return p_troncal, long_ant_troncal, loss_ant_troncal, loss_conns_ant_troncal, loss_troncal_ins
 
 def _restriccion_bloques(modelo, params, bloques_de_pisos, p_troncal, x, pot_in_riser_by_block, loss_ant_troncal, loss_conns_ant_troncal, loss_troncal_ins):
     """Añade las restricciones para la propagación de la señal a través de los bloques del edificio."""
     for b_idx, bloque in enumerate(bloques_de_pisos):
-        p_ent, direccion = entrada_y_direccion_bloque(bloque, p_troncal)
-        
-        # Calcula las pérdidas en el cable 'feeder' que conecta el troncal con la entrada del bloque.
-        long_vertical = abs(p_ent - p_troncal) * params['largo_cable_entre_pisos']
-        long_feeder_bloque = params['largo_cable_feeder_bloque'] + long_vertical
-        loss_feeder_bloque = long_feeder_bloque * params['atenuacion_cable_por_metro']
-        loss_conns_feeder_bloque = params['conectores_por_union'] * params['atenuacion_conector']
+        _restriccion_bloque(
+            modelo, params, b_idx, bloque, p_troncal, x, pot_in_riser_by_block,
+            loss_ant_troncal, loss_conns_ant_troncal, loss_troncal_ins
+        )
 
-        # Define la potencia de entrada al 'riser' del bloque.
-        modelo += (
-            pot_in_riser_by_block[p_ent, b_idx]
-            == params['potencia_entrada']
-            - loss_ant_troncal - loss_conns_ant_troncal
-            - loss_troncal_ins
-            - loss_feeder_bloque - loss_conns_feeder_bloque
-        ), f"pot_block_init_b{b_idx}_p{p_ent}"
-
-        # Modela la propagación de la señal (pérdidas) a través del 'riser' del bloque, piso por piso.
-        if direccion == 'up':
-            pisos_up = sorted([p for p in bloque if p >= p_ent])
-            for i in range(len(pisos_up) - 1):
-                p_act, p_sig = pisos_up[i], pisos_up[i + 1]
-                paso_piso = lpSum(x[p_act, d] * params['derivadores_data'][d]['paso'] for d in params['derivadores_data'])
-                loss_entre_pisos = params['largo_cable_entre_pisos'] * params['atenuacion_cable_por_metro']
-                loss_conns_entre_pisos = params['conectores_por_union'] * params['atenuacion_conector']
-                modelo += (
-                    pot_in_riser_by_block[p_sig, b_idx]
-                    == pot_in_riser_by_block[p_act, b_idx]
-                    - paso_piso - loss_entre_pisos - loss_conns_entre_pisos
-                ), f"prop_up_b{b_idx}_{p_act}_to_{p_sig}"
-        elif direccion == 'down':
-            pisos_down = sorted([p for p in bloque if p <= p_ent], reverse=True)
-            for i in range(len(pisos_down) - 1):
-                p_act, p_sig = pisos_down[i], pisos_down[i + 1]
-                paso_piso = lpSum(x[p_act, d] * params['derivadores_data'][d]['paso'] for d in params['derivadores_data'])
-                loss_entre_pisos = params['largo_cable_entre_pisos'] * params['atenuacion_cable_por_metro']
-                loss_conns_entre_pisos = params['conectores_por_union'] * params['atenuacion_conector']
-                modelo += (
-                    pot_in_riser_by_block[p_sig, b_idx]
-                    == pot_in_riser_by_block[p_act, b_idx]
-                    - paso_piso - loss_entre_pisos - loss_conns_entre_pisos
-                ), f"prop_down_b{b_idx}_{p_act}_to_{p_sig}"
-
-def _restriccion_niveles_tu(modelo, params, all_toma_indices, bloques_de_pisos, x, y, nivel_tu, d_plus, d_minus, pot_in_riser_by_block):
-    """Añade las restricciones para los niveles de señal en cada toma de usuario (TU)."""
+def _restriccion_bloque(modelo, params, b_idx, bloque, p_troncal, x, pot_in_riser_by_block, loss_ant_troncal, loss_conns_ant_troncal, loss_troncal_ins):
+    """Añade las restricciones de propagación de la señal para un único bloque.
+
+    `loss_troncal_ins` puede ser una expresión (selección del troncal dentro del modelo)
+    o una constante (troncal fijado, como en el motor de descomposición).
+    """
+    p_ent, direccion = entrada_y_direccion_bloque(bloque, p_troncal)
+    columnas = compile_catalog(params).derivadores
+    derivadores = _derivadores_validos(params)
+    
+    # Calcula las pérdidas en el cable 'feeder' que conecta el troncal con la entrada del bloque.
+    long_vertical = abs(p_ent - p_troncal) * params['largo_cable_entre_pisos']
+    long_feeder_bloque = params['largo_cable_feeder_bloque'] + long_vertical
+    loss_feeder_bloque = long_feeder_bloque * params['atenuacion_cable_por_metro']
+    loss_conns_feeder_bloque = params['conectores_por_union'] * params['atenuacion_conector']
+
+    # Define la potencia de entrada al 'riser' del bloque.
+    modelo += (
+        pot_in_riser_by_block[p_ent, b_idx]
+        == params['potencia_entrada']
+        - loss_ant_troncal - loss_conns_ant_troncal
+        - loss_troncal_ins
+        - loss_feeder_bloque - loss_conns_feeder_bloque
+    ), f"pot_block_init_b{b_idx}_p{p_ent}"
+
+    # Modela la propagación de la señal (pérdidas) a través del 'riser' del bloque, piso por piso.
+    if direccion == 'up':
+        pisos_up = sorted([p for p in bloque if p >= p_ent])
+        for i in range(len(pisos_up) - 1):
+            p_act, p_sig = pisos_up[i], pisos_up[i + 1]
+            paso_piso = _perdida_seleccion([(d, x[p_act, d]) for d in derivadores], columnas, 'paso')
+            loss_entre_pisos = params['largo_cable_entre_pisos'] * params['atenuacion_cable_por_metro']
+            loss_conns_entre_pisos = params['conectores_por_union'] * params['atenuacion_conector']
+            modelo += (
+                pot_in_riser_by_block[p_sig, b_idx]
+                == pot_in_riser_by_block[p_act, b_idx]
+                - paso_piso - loss_entre_pisos - loss_conns_entre_pisos
+            ), f"prop_up_b{b_idx}_{p_act}_to_{p_sig}"
+    elif direccion == 'down':
+        pisos_down = sorted([p for p in bloque if p <= p_ent], reverse=True)
+        for i in range(len(pisos_down) - 1):
+            p_act, p_sig = pisos_down[i], pisos_down[i + 1]
+            paso_piso = _perdida_seleccion([(d, x[p_act, d]) for d in derivadores], columnas, 'paso')
+            loss_entre_pisos = params['largo_cable_entre_pisos'] * params['atenuacion_cable_por_metro']
+            loss_conns_entre_pisos = params['conectores_por_union'] * params['atenuacion_conector']
+            modelo += (
+                pot_in_riser_by_block[p_sig, b_idx]
+                == pot_in_riser_by_block[p_act, b_idx]
+                - paso_piso - loss_entre_pisos - loss_conns_entre_pisos
+            ), f"prop_down_b{b_idx}_{p_act}_to_{p_sig}"
+
+def _restriccion_niveles_tu(modelo, params, all_toma_indices, bloques_de_pisos, x, y, nivel_tu, d_plus, d_minus, pot_in_riser_by_block, reducida=False):
+    """Añade las restricciones para los niveles de señal en cada toma de usuario (TU).
+
+    Las pérdidas del derivador de cada piso y la llegada a cada apartamento se construyen
+    una sola vez y se comparten entre sus tomas.
+
+    Con `reducida=True` no hay variables de nivel por toma: la potencia de llegada a cada
+    apartamento es una variable ('llegada_{p}_{a}', una restricción por apartamento) y
+    'nivel_tu' se llena con la expresión afín `llegada - pérdidas fijas de la toma`. Cada
+    toma tiene así 2 variables y 3 restricciones (en vez de 3 y 4), y las restricciones de
+    límites y desviación no repiten las pérdidas de derivador y repartidor. Devuelve las
+    variables de llegada ({} en la formulación estándar).
+    """
+    catalogo = compile_catalog(params)
+    derivadores = _derivadores_validos(params)
+    repartidores = _repartidores_por_apto(y)
+    bloque_de_piso = {p: b_idx for b_idx, bloque in enumerate(bloques_de_pisos) for p in bloque}
+    conns_apto_loss = 4 * params['atenuacion_conector']
+    conn_tu_loss = params['atenuacion_conexion_tu']
+
+    deriv_loss = {}
+    llegada_apto = {}
+    llegada_vars = {}
     for (p, a, tu_idx) in all_toma_indices:
-        b_idx_toma = next(b for b, bloque in enumerate(bloques_de_pisos) if p in bloque)
-        
-        # Calcula las pérdidas desde la entrada del 'riser' en el piso hasta la toma.
-        deriv_loss = lpSum(x[p, d] * params['derivadores_data'][d]['derivacion'] for d in params['derivadores_data']) 
-        cable_deriv_rep = params['largo_cable_derivador_repartidor'][(p, a)] * params['atenuacion_cable_por_metro']
-        repartidor_loss = lpSum(y[p, a, r] * params['repartidores_data'][r]['perdida_insercion'] for r in params['repartidores_data'])
+        if (p, a) not in llegada_apto:
+            # Potencia a la entrada de las tomas del apartamento: 'riser' del piso menos
+            # derivador, cable y conectores hasta el repartidor y el propio repartidor.
+            if p not in deriv_loss:
+                deriv_loss[p] = _perdida_seleccion([(d, x[p, d]) for d in derivadores], catalogo.derivadores, 'derivacion')
+            cable_deriv_rep = params['largo_cable_derivador_repartidor'][(p, a)] * params['atenuacion_cable_por_metro']
+            repartidor_loss = _perdida_seleccion(
+                [(r, y[p, a, r]) for r in repartidores.get((p, a), [])], catalogo.repartidores, 'perdida_insercion'
+            )
+            llegada_apto[p, a] = (
+                pot_in_riser_by_block[p, bloque_de_piso[p]]
+                - deriv_loss[p]
+                - cable_deriv_rep - conns_apto_loss
+                - repartidor_loss
+            )
+            if reducida:
+                llegada_vars[p, a] = LpVariable(f"llegada_{p}_{a}")
+                modelo += llegada_vars[p, a] == llegada_apto[p, a], f"llegada_apto_{p}_{a}"
+                llegada_apto[p, a] = llegada_vars[p, a]
         cable_tu_loss = params['largo_cable_tu'][(p, a, tu_idx)] * params['atenuacion_cable_por_metro']
-        conns_apto_loss = 4 * params['atenuacion_conector']
-        conn_tu_loss = params['atenuacion_conexion_tu']
 
-        # Define el nivel de señal final en la toma como la potencia en el 'riser' menos todas las pérdidas.
-        modelo += (
-            nivel_tu[p, a, tu_idx] == pot_in_riser_by_block[p, b_idx_toma]
-            - deriv_loss
-            - cable_deriv_rep - conns_apto_loss
-            - repartidor_loss
-            - cable_tu_loss
-            - conn_tu_loss
-        ), f"nivel_tu_{p}_{a}_{tu_idx}"
+        # Nivel de señal final en la toma: la potencia en el 'riser' menos todas las pérdidas.
+        nivel = llegada_apto[p, a] - cable_tu_loss - conn_tu_loss
+        if reducida:
+            nivel_tu[p, a, tu_idx] = nivel
+        else:
+            modelo += nivel_tu[p, a, tu_idx] == nivel, f"nivel_tu_{p}_{a}_{tu_idx}"
 
         # Asegura que el nivel de señal esté dentro de los límites mínimo y máximo permitidos.
         modelo += nivel_tu[p, a, tu_idx] >= params['Nivel_minimo'], f"nivel_min_{p}_{a}_{tu_idx}"
@@ -187,6 +263,7 @@ def _restriccion_niveles_tu(modelo, params, all_toma_indices, bloques_de_pisos,
         modelo += (
             nivel_tu[p, a, tu_idx] - params['Potencia_Objetivo_TU'] == d_plus[p, a, tu_idx] - d_minus[p, a, tu_idx]
         ), f"dev_abs_{p}_{a}_{tu_idx}"
+    return llegada_vars
 
 # -------------------------
 # Funciones auxiliares del modelo
@@ -206,11 +283,100 @@ def entrada_y_direccion_bloque(bloque, p_troncal):
 
 def _seleccionar_troncal(params, aux):
     """Extrae del resultado del modelo el repartidor troncal seleccionado y sus propiedades."""
-    r_troncal_sel = [r for r in params['repartidores_data'] if value(aux['r_troncal'][r]) > 0.5][0]
+    r_troncal_sel = [r for r in aux['r_troncal'] if value(aux['r_troncal'][r]) > 0.5][0]
     loss_troncal_ins_val = params['repartidores_data'][r_troncal_sel]['perdida_insercion']
     salidas_troncal = params['repartidores_data'][r_troncal_sel]['salidas']
     return r_troncal_sel, loss_troncal_ins_val, salidas_troncal
 
+def _potencia_entrada_bloque(params, bloque, p_troncal, loss_troncal_ins):
+    """Potencia a la entrada del 'riser' de un bloque para una pérdida de troncal dada."""
+    p_ent, _ = entrada_y_direccion_bloque(bloque, p_troncal)
+    long_ant_troncal = (params['Piso_Maximo'] - p_troncal + 1) * params['largo_cable_entre_pisos'] + params['largo_cable_amplificador_ultimo_piso']
+    loss_ant_troncal = long_ant_troncal * params['atenuacion_cable_por_metro']
+    loss_conns = params['conectores_por_union'] * params['atenuacion_conector']
+    long_feeder_bloque = params['largo_cable_feeder_bloque'] + abs(p_ent - p_troncal) * params['largo_cable_entre_pisos']
+    loss_feeder_bloque = long_feeder_bloque * params['atenuacion_cable_por_metro']
+    return (
+        params['potencia_entrada'] - loss_ant_troncal - loss_conns
+        - loss_troncal_ins - loss_feeder_bloque - loss_conns
+    )
+
+def _potencias_riser(params, bloques_de_pisos, p_troncal, loss_troncal_ins, derivadores):
+    """
+    Calcula la potencia en el 'riser' de cada piso para un troncal y unos derivadores fijos.
+
+    Reproduce las restricciones de _restriccion_bloque con valores numéricos.
+    Devuelve un diccionario {(piso, b_idx): potencia}.
+    """
+    loss_conns = params['conectores_por_union'] * params['atenuacion_conector']
+    loss_entre_pisos = params['largo_cable_entre_pisos'] * params['atenuacion_cable_por_metro']
+
+    pot = {}
+    for b_idx, bloque in enumerate(bloques_de_pisos):
+        p_ent, direccion = entrada_y_direccion_bloque(bloque, p_troncal)
+        pot[p_ent, b_idx] = _potencia_entrada_bloque(params, bloque, p_troncal, loss_troncal_ins)
+        pisos_orden = sorted(bloque, reverse=(direccion == 'down'))
+        for p_act, p_sig in zip(pisos_orden, pisos_orden[1:]):
+            paso = params['derivadores_data'][derivadores[p_act]]['paso']
+            pot[p_sig, b_idx] = pot[p_act, b_idx] - paso - loss_entre_pisos - loss_conns
+    return pot
+
+def _nivel_toma(params, pot_piso, derivador, repartidor, p, a, tu_idx):
+    """Nivel de señal en una toma para una potencia de 'riser' y unos equipos dados."""
+    loss_rep = params['repartidores_data'][repartidor]['perdida_insercion'] if repartidor is not None else 0.0
+    return (
+        pot_piso
+        - params['derivadores_data'][derivador]['derivacion']
+        - params['largo_cable_derivador_repartidor'][(p, a)] * params['atenuacion_cable_por_metro']
+        - 4 * params['atenuacion_conector']
+        - loss_rep
+        - params['largo_cable_tu'][(p, a, tu_idx)] * params['atenuacion_cable_por_metro']
+        - params['atenuacion_conexion_tu']
+    )
+
+def _asignar_diseno(aux, params, all_toma_indices, diseno):
+    """
+    Fija en las variables del modelo los valores de un diseño concreto.
+
+    `diseno` contiene el repartidor troncal ('troncal'), el derivador de cada piso
+    ('derivadores': {p: d}) y el repartidor de cada apartamento ('repartidores':
+    {(p, a): r o None}). Los niveles se calculan igual que en las restricciones del
+    modelo, de modo que _generar_filas_detalle puede leer el resultado como si viniera
+    del solver. Devuelve la desviación total (función objetivo) del diseño.
+    """
+    troncal = diseno['troncal']
+    derivadores = diseno['derivadores']
+    repartidores = diseno['repartidores']
+
+    for r, var in aux['r_troncal'].items():
+        var.varValue = 1 if r == troncal else 0
+    for (p, d), var in aux['x'].items():
+        var.varValue = 1 if derivadores[p] == d else 0
+    for (p, a, r), var in aux['y'].items():
+        var.varValue = 1 if repartidores.get((p, a)) == r else 0
+
+    bloques = aux['bloques_de_pisos']
+    loss_troncal_ins = params['repartidores_data'][troncal]['perdida_insercion']
+    pot = _potencias_riser(params, bloques, aux['p_troncal'], loss_troncal_ins, derivadores)
+    for key, var in aux['pot_in_riser_by_block'].items():
+        var.varValue = pot[key]
+
+    bloque_de_piso = {p: b_idx for b_idx, bloque in enumerate(bloques) for p in bloque}
+    objetivo = 0.0
+    for (p, a, tu_idx) in all_toma_indices:
+        nivel = _nivel_toma(params, pot[p, bloque_de_piso[p]], derivadores[p], repartidores.get((p, a)), p, a, tu_idx)
+        desviacion = nivel - params['Potencia_Objetivo_TU']
+        if isinstance(aux['nivel_tu'][p, a, tu_idx], LpVariable):
+            aux['nivel_tu'][p, a, tu_idx].varValue = nivel
+        if (p, a) in aux.get('llegada_apto', {}):
+            # Formulación reducida: el nivel se lee de la llegada al apartamento.
+            cable_tu = params['largo_cable_tu'][(p, a, tu_idx)] * params['atenuacion_cable_por_metro']
+            aux['llegada_apto'][p, a].varValue = nivel + cable_tu + params['atenuacion_conexion_tu']
+        aux['d_plus'][p, a, tu_idx].varValue = max(desviacion, 0.0)
+        aux['d_minus'][p, a, tu_idx].varValue = max(-desviacion, 0.0)
+        objetivo += abs(desviacion)
+    return objetivo
+
 # -------------------------
 # Generación de resultados
 # -------------------------
@@ -219,11 +385,19 @@ def _generar_filas_detalle(
     all_toma_indices, bloques, p_troncal, long_ant_troncal, loss_ant_troncal,
     loss_conns_ant_troncal, r_troncal_sel, loss_troncal_ins_val, salidas_troncal, aux, params
 ):
-    """ This guarantees:
+    """
+    Genera las filas de resultados detallados para cada toma (TU) a partir del modelo resuelto.
 
-    detalle is never empty
+    El cálculo es por columnas: cada valor del modelo se lee una sola vez y cada
+    magnitud se calcula en el nivel del que depende (edificio, piso, apartamento o
+    toma). Los acumulados de 'paso' del riser son sumas prefijas en el orden de
+    propagación de cada bloque, y las columnas por toma se arman como arreglos de
+    NumPy. Las sumas siguen el mismo orden que el cálculo toma a toma, de modo que
+    las filas (valores y redondeo) son idénticas.
 
-    The failure is explicit and reportable """
+    Sin tomas devuelve una única fila 'INFEASIBLE': el detalle nunca está vacío y el
+    fallo queda explícito.
+    """
     if not all_toma_indices:
         return [{
             'Toma': 'N/A',
@@ -235,129 +409,154 @@ def _generar_filas_detalle(
             'Estado': 'INFEASIBLE',
             'Motivo': 'Modelo sin solución factible'
         }]
-    """
-    Genera las filas de resultados detallados para cada toma (TU) a partir del modelo resuelto.
-    
-    Calcula todas las pérdidas, distancias y niveles de señal para cada toma individualmente,
-    creando un registro completo para el informe final.
-    """
-    filas_detalle = []
-    for (p, a, tu_idx) in all_toma_indices:
-        # Identifica el bloque al que pertenece la toma.
-        b_idx = next(b for b, bloque in enumerate(bloques) if p in bloque)
-        bloque = bloques[b_idx]
+    # Importado aquí para que la ruta canónica no cargue NumPy al arrancar.
+    import numpy as np
+
+    att = params['atenuacion_cable_por_metro']
+    largo_piso = params['largo_cable_entre_pisos']
+    # Equipos seleccionados por piso y por apartamento, y potencias del riser, leídos una sola vez del modelo.
+    deriv_sel = {p: d for (p, d), var in aux['x'].items() if value(var) > 0.5}
+    rep_sel = {(p, a): r for (p, a, r), var in aux['y'].items() if value(var) > 0.5}
+    pot = {k: value(var) for k, var in aux['pot_in_riser_by_block'].items()}
+    # Las tomas de una clase de _clases_tomas comparten la variable de nivel de su representante.
+    clases = aux.get('clases_tomas') or {k: [k] for k in all_toma_indices}
+    nivel_tomas = {}
+    for rep, miembros in clases.items():
+        nivel_rep = value(aux['nivel_tu'][rep])
+        for k in miembros:
+            nivel_tomas[k] = nivel_rep
+
+    # --- Columnas por piso ---
+    # Índices de las tomas en las tablas de pisos y de apartamentos.
+    pos_piso, pos_apto = {}, {}
+    for (p, a, _) in all_toma_indices:
+        pos_piso.setdefault(p, len(pos_piso))
+        pos_apto.setdefault((p, a), len(pos_apto))
+
+    conns_union = params['conectores_por_union'] * params['atenuacion_conector']
+    base_troncal = loss_ant_troncal + loss_conns_ant_troncal + loss_troncal_ins_val
+    columnas_piso, perdida_piso, distancia_piso = {}, {}, {}
+    for b_idx, bloque in enumerate(bloques):
         p_ent, direccion = entrada_y_direccion_bloque(bloque, p_troncal)
-
-        # Calcula longitudes y pérdidas del feeder del bloque.
-        long_vertical = abs(p_ent - p_troncal) * params['largo_cable_entre_pisos']
-        long_feeder_bloque = params['largo_cable_feeder_bloque'] + long_vertical
-        loss_feeder_bloque = long_feeder_bloque * params['atenuacion_cable_por_metro']
-        loss_conns_feeder_bloque = params['conectores_por_union'] * params['atenuacion_conector']
-
-        # Obtiene potencias y pérdidas del riser del modelo.
-        pot_entry = value(aux['pot_in_riser_by_block'][p_ent, b_idx])
-        pot_riser_p = value(aux['pot_in_riser_by_block'][p, b_idx])
-        loss_riser_dentro_bloque = pot_entry - pot_riser_p
-
-        # --- Desglose de pérdidas en el riser ---
-        dist_riser_cable = abs(p - p_ent) * params['largo_cable_entre_pisos']
-        loss_cable_riser = dist_riser_cable * params['atenuacion_cable_por_metro']
-        num_conns_riser = abs(p - p_ent) * params['conectores_por_union']
-        loss_conns_riser = num_conns_riser * params['atenuacion_conector']
-        
-        loss_paso_acumulada = 0
-        pisos_atravesados = []
-        if direccion == 'up':
-            pisos_atravesados = sorted([pi for pi in bloque if p_ent <= pi < p])
-        elif direccion == 'down':
-            pisos_atravesados = sorted([pi for pi in bloque if p < pi <= p_ent], reverse=True)
-
-        for pi in pisos_atravesados:
-            d_sel_paso = [d for d in params['derivadores_data'] if value(aux['x'][pi, d]) > 0.5][0]
-            loss_paso_acumulada += params['derivadores_data'][d_sel_paso]['paso']
-        
-        # Obtiene el derivador seleccionado y su pérdida.
-        d_sel = [d for d in params['derivadores_data'] if value(aux['x'][p, d]) > 0.5][0]
-        loss_deriv = params['derivadores_data'][d_sel]['derivacion']
-
-        # Obtiene el repartidor del apartamento (si se usa) y su pérdida.
+        long_feeder_bloque = params['largo_cable_feeder_bloque'] + abs(p_ent - p_troncal) * largo_piso
+        loss_feeder_bloque = long_feeder_bloque * att
+
+        # Pérdida acumulada de 'paso' desde la entrada del bloque: suma prefija en el
+        # orden de propagación (los pisos atravesados hasta el piso anterior a p).
+        orden = sorted(bloque, reverse=(direccion == 'down'))
+        taps = {}
+        acumulado = 0
+        for i, pi in enumerate(orden):
+            taps[pi] = acumulado
+            if i + 1 < len(orden):
+                acumulado += params['derivadores_data'][deriv_sel[pi]]['paso']
+
+        for p in bloque:
+            if p not in pos_piso:
+                continue
+            tramos_riser = abs(p - p_ent)
+            dist_riser = tramos_riser * largo_piso
+            num_conns_riser = tramos_riser * params['conectores_por_union']
+            loss_riser_dentro_bloque = pot[p_ent, b_idx] - pot[p, b_idx]
+            d_sel = deriv_sel[p]
+            loss_deriv = params['derivadores_data'][d_sel]['derivacion']
+            columnas_piso[p] = (
+                b_idx + 1, p_ent, 'Arriba' if direccion == 'up' else 'Abajo',
+                round(long_feeder_bloque, 3), round(loss_feeder_bloque, 3), round(conns_union, 3),
+                round(loss_riser_dentro_bloque, 3), round(dist_riser, 2), round(dist_riser * att, 3),
+                num_conns_riser, round(num_conns_riser * params['atenuacion_conector'], 3),
+                round(taps[p], 3), d_sel, round(loss_deriv, 3)
+            )
+            perdida_piso[p] = base_troncal + loss_feeder_bloque + conns_union + loss_riser_dentro_bloque + loss_deriv
+            distancia_piso[p] = long_ant_troncal + long_feeder_bloque + dist_riser
+
+    # --- Columnas por apartamento ---
+    loss_conns_apto = 4 * params['atenuacion_conector']
+    columnas_apto, perdida_apto, distancia_apto = [], [], []
+    for (p, a) in pos_apto:
         r_apt_sel, loss_rep_apt = 'N/A', 0.0
-        for r in params['repartidores_data']:
-            if value(aux['y'][p, a, r]) > 0.5:
-                r_apt_sel = r
-                loss_rep_apt = params['repartidores_data'][r]['perdida_insercion']
-                break
-
-        # Calcula pérdidas en los tramos finales de cable y conectores.
-        loss_cable_deriv_rep = params['largo_cable_derivador_repartidor'][(p, a)] * params['atenuacion_cable_por_metro']
-        loss_cable_tu = params['largo_cable_tu'][(p, a, tu_idx)] * params['atenuacion_cable_por_metro']
-        loss_conns_apto = 4 * params['atenuacion_conector']
-        loss_conn_tu = params['atenuacion_conexion_tu']
-
-        # Obtiene el nivel de señal final de la variable del modelo.
-        nivel_tu_modelo = value(aux['nivel_tu'][p, a, tu_idx])
-
-        # Calcula la pérdida total como suma de todas las pérdidas parciales (para verificación).
-        perdida_total = (
-            loss_ant_troncal + loss_conns_ant_troncal
-            + loss_troncal_ins_val
-            + loss_feeder_bloque + loss_conns_feeder_bloque
-            + loss_riser_dentro_bloque
-            + loss_deriv + loss_cable_deriv_rep + loss_conns_apto
-            + loss_rep_apt + loss_cable_tu + loss_conn_tu
-        )
-        # Calcula el nivel de señal por balance de potencias (para verificación).
-        nivel_balance = params['potencia_entrada'] - perdida_total
-
-        # Calcula la distancia total de cable hasta la toma.
-        tramos_riser = abs(p - p_ent)
-        dist_riser = tramos_riser * params['largo_cable_entre_pisos']
-        dist_total = (
-            long_ant_troncal
-            + long_feeder_bloque
-            + dist_riser
-            + params['largo_cable_derivador_repartidor'][(p, a)]
-            + params['largo_cable_tu'][(p, a, tu_idx)]
-        )
+        if (p, a) in rep_sel:
+            r_apt_sel = rep_sel[p, a]
+            loss_rep_apt = params['repartidores_data'][r_apt_sel]['perdida_insercion']
+        largo_dr = params['largo_cable_derivador_repartidor'][(p, a)]
+        loss_cable_deriv_rep = largo_dr * att
+        columnas_apto.append((round(loss_cable_deriv_rep, 3), r_apt_sel, round(loss_rep_apt, 3)))
+        perdida_apto.append(perdida_piso[p] + loss_cable_deriv_rep + loss_conns_apto + loss_rep_apt)
+        distancia_apto.append(distancia_piso[p] + largo_dr)
+
+    # --- Columnas por toma (arreglos de NumPy) ---
+    i_piso = np.fromiter((pos_piso[p] for (p, _, _) in all_toma_indices), dtype=np.intp, count=len(all_toma_indices))
+    i_apto = np.fromiter((pos_apto[p, a] for (p, a, _) in all_toma_indices), dtype=np.intp, count=len(all_toma_indices))
+    largo_tu = np.array([params['largo_cable_tu'][k] for k in all_toma_indices])
+    loss_cable_tu = largo_tu * att
+    perdida_total = np.array(perdida_apto)[i_apto] + loss_cable_tu + params['atenuacion_conexion_tu']
+    dist_total = np.array(distancia_apto)[i_apto] + largo_tu
+
+    # Los valores por piso y apartamento se reparten a las tomas sin recalcularse; el
+    # redondeo por toma usa round() de Python, como el resto de columnas.
+    por_piso = np.empty(len(pos_piso), dtype=object)
+    por_piso[:] = [columnas_piso[p] for p in pos_piso]
+    por_apto = np.empty(len(columnas_apto), dtype=object)
+    por_apto[:] = columnas_apto
+    n = len(all_toma_indices)
+    columnas = [
+        [f"P{p:02d}A{a}TU{tu_idx}" for (p, a, tu_idx) in all_toma_indices],
+        [p for (p, _, _) in all_toma_indices],
+        [a for (_, a, _) in all_toma_indices],
+        por_piso[i_piso].tolist(),
+        repeat((
+            p_troncal, round(long_ant_troncal, 2), round(loss_ant_troncal, 3), round(loss_conns_ant_troncal, 3),
+            r_troncal_sel, salidas_troncal, round(loss_troncal_ins_val, 3)
+        ), n),
+        por_apto[i_apto].tolist(),
+        [round(v, 3) for v in loss_cable_tu.tolist()],
+        [round(v, 3) for v in perdida_total.tolist()],
+        [round(nivel_tomas[k], 3) for k in all_toma_indices],
+        [round(v, 2) for v in dist_total.tolist()],
+    ]
+    loss_conns_apto = round(loss_conns_apto, 3)
+    loss_conn_tu = round(params['atenuacion_conexion_tu'], 3)
+    p_in = round(params['potencia_entrada'], 2)
 
-        # Crea un diccionario con todos los resultados detallados para esta toma.
+    filas_detalle = []
+    for (toma, p, a, c_piso, c_troncal, c_apto, cable_tu, total, nivel, dist) in zip(*columnas):
+        (bloque, p_ent, direccion, long_feeder, loss_feeder, loss_conns_feeder, loss_riser, dist_riser,
+         loss_cable_riser, num_conns_riser, loss_conns_riser, loss_paso, d_sel, loss_deriv) = c_piso
         filas_detalle.append({
-            'Toma': f"P{p:02d}A{a}TU{tu_idx}",
+            'Toma': toma,
             'Piso': p,
             'Apto': a,
-            'Bloque': b_idx + 1,
-            'Piso Troncal': p_troncal,
+            'Bloque': bloque,
+            'Piso Troncal': c_troncal[0],
             'Piso Entrada Riser Bloque': p_ent,
-            'Direccion Propagacion': 'Arriba' if direccion == 'up' else 'Abajo',
-            'Longitud Antena→Troncal (m)': round(long_ant_troncal, 2),
-            'Pérdida Antena→Troncal (cable) (dB)': round(loss_ant_troncal, 3),
-            'Pérdida Antena↔Troncal (conectores) (dB)': round(loss_conns_ant_troncal, 3),
-            'Repartidor Troncal': r_troncal_sel,
-            'Salidas Troncal': salidas_troncal,
-            'Pérdida Repartidor Troncal (dB)': round(loss_troncal_ins_val, 3),
-            'Feeder Troncal→Entrada Bloque (m)': round(long_feeder_bloque, 3),
-            'Pérdida Feeder (cable) (dB)': round(loss_feeder_bloque, 3),
-            'Pérdida Feeder (conectores) (dB)': round(loss_conns_feeder_bloque, 3),
-            'Pérdida Riser dentro del Bloque (dB)': round(loss_riser_dentro_bloque, 3),
-            # 'Distancia riser dentro bloque Cable (m)': round(dist_riser_cable, 2),
-            'Distancia riser dentro bloque (m)': round(dist_riser, 2),
-            'Riser Atenuacion Cable (dB)': round(loss_cable_riser, 3),
+            'Direccion Propagacion': direccion,
+            'Longitud Antena→Troncal (m)': c_troncal[1],
+            'Pérdida Antena→Troncal (cable) (dB)': c_troncal[2],
+            'Pérdida Antena↔Troncal (conectores) (dB)': c_troncal[3],
+            'Repartidor Troncal': c_troncal[4],
+            'Salidas Troncal': c_troncal[5],
+            'Pérdida Repartidor Troncal (dB)': c_troncal[6],
+            'Feeder Troncal→Entrada Bloque (m)': long_feeder,
+            'Pérdida Feeder (cable) (dB)': loss_feeder,
+            'Pérdida Feeder (conectores) (dB)': loss_conns_feeder,
+            'Pérdida Riser dentro del Bloque (dB)': loss_riser,
+            'Distancia riser dentro bloque (m)': dist_riser,
+            'Riser Atenuacion Cable (dB)': loss_cable_riser,
             'Riser Conectores (uds)': num_conns_riser,
-            'Riser Atenuacion Conectores (dB)': round(loss_conns_riser, 3),
-            'Riser Atenuación Taps (dB)': round(loss_paso_acumulada, 3),
+            'Riser Atenuacion Conectores (dB)': loss_conns_riser,
+            'Riser Atenuación Taps (dB)': loss_paso,
             'Derivador Piso': d_sel,
-            'Pérdida Derivador Piso (dB)': round(loss_deriv, 3),
-            'Pérdida Cable Deriv→Rep (dB)': round(loss_cable_deriv_rep, 3),
-            'Pérdida Conectores Apto (dB)': round(loss_conns_apto, 3),
-            'Repartidor Apt': r_apt_sel,
-            'Pérdida Repartidor Apt (dB)': round(loss_rep_apt, 3),
-            'Pérdida Cable Rep→TU (dB)': round(loss_cable_tu, 3),
-            'Pérdida Conexión TU (dB)': round(loss_conn_tu, 3),
-            'Pérdida Total (dB)': round(perdida_total, 3),
-            'P_in (entrada) (dBµV)': round(params['potencia_entrada'], 2),
-            'Nivel TU Final (dBµV)': round(nivel_tu_modelo, 3),
-            # 'Nivel TU (balance) (dBµV)': round(nivel_balance, 3),
-            'Distancia total hasta la toma (m)': round(dist_total, 2),
+            'Pérdida Derivador Piso (dB)': loss_deriv,
+            'Pérdida Cable Deriv→Rep (dB)': c_apto[0],
+            'Pérdida Conectores Apto (dB)': loss_conns_apto,
+            'Repartidor Apt': c_apto[1],
+            'Pérdida Repartidor Apt (dB)': c_apto[2],
+            'Pérdida Cable Rep→TU (dB)': cable_tu,
+            'Pérdida Conexión TU (dB)': loss_conn_tu,
+            'Pérdida Total (dB)': total,
+            'P_in (entrada) (dBµV)': p_in,
+            'Nivel TU Final (dBµV)': nivel,
+            'Distancia total hasta la toma (m)': dist,
         })
     return filas_detalle
 
@@ -1,35 +1,45 @@
 #!/usr/bin/env python3
 # Script completo: carga, MILP (troncal + feeder variable a cada bloque), export y visualización.
 
-from pulp import LpProblem, LpMinimize, lpSum, LpStatus
-import pandas as pd
-from Funciones_apoyo_datos_entrada import dividir_en_bloques, cargar_datos_y_parametros, generar_indices_y_validar_datos
-from Funciones_apoyo_salida import (_exportar_a_excel, _generar_graficos, 
-                                _generar_df_inventario, _dibujar_esquema_conexiones_ascii, 
-                                _generar_df_resumen_por_piso,  
-                                _generar_df_detalle_resumido)
+# Solo se importa aquí la ruta de resolución (PuLP + funciones del modelo). Las
+# herramientas de exportación (Excel, gráficos, esquema ASCII, árbol HTML) y pandas
+# se importan dentro de las funciones que las usan, para que una ejecución
+# JSON -> JSON (optimizer_canonical) no pague su coste de arranque.
+from pulp import LpProblem, LpMinimize, lpSum, LpStatus, value
+from Funciones_apoyo_datos_entrada import dividir_en_bloques, generar_indices_y_validar_datos
 from Funciones_apoyo_optimizacion import (
-    _crear_variables, _restriccion_troncal, _restriccion_derivador,
+    _crear_variables, _clases_tomas, _restriccion_troncal, _restriccion_derivador,
     _restriccion_repartidor_apto, _perdidas_comunes,
     _restriccion_bloques, _restriccion_niveles_tu,
     _seleccionar_troncal, _generar_filas_detalle
 )
-from Funciones_apoyo_visualizacion import _generar_arbol_completo_con_specs
+from apartment_tables import tablas_apartamento
 import json
-import hashlib
-from decimal import Decimal
+import sys
 # -------------------------
 # Config / Defaults
 # -------------------------
 INPUT_FILE = "datos_entrada.xlsx"
 OUTPUT_XLSX = "Resultados_Optimizacion_TDT_Troncal.xlsx"
 esquema_out_file = "esquema_conexiones.txt"
+# Modo carrera: resuelve con varias configuraciones de solver en paralelo y se queda
+# con la primera que alcanza el gap (solver_portfolio.py).
+MODO_CARRERA = False
+AJUSTES_CARRERA = {"timeLimit": 60, "gapRel": 0.05, "threads": 4}
+# Arranque greedy: el diseño de greedy_start.py se pasa al solver como solución inicial (warmStart).
+ARRANQUE_GREEDY = True
+# Modo anytime: informa de cada solución mejorada mientras el solver corre y, al final, de la
+# mejor solución con su cota y gap (también si el solver se detiene por límite de tiempo).
+MODO_ANYTIME = True
+# Artefactos de resultados que genera la ejecución desde Excel (ver result_pipeline.py);
+# el árbol HTML se genera al final, a partir del Excel.
+ARTEFACTOS_CLI = ('excel', 'plots', 'scheme')
 
 # -------------------------
 # Construir modelo MILP
 # -------------------------
 
-def construir_modelo_milp(params, all_toma_indices):
+def construir_modelo_milp(params, all_toma_indices, tablas=None, reducida=False, agrupar=True):
     """Builds and returns a MILP model for the TDT trunk optimization problem.
 
     This function creates the decision variables, objective function, and constraints for the MILP model
@@ -39,6 +49,16 @@ def construir_modelo_milp(params, all_toma_indices):
     Args:
         params: Dictionary containing all required parameters for the model.
         all_toma_indices: List of tuples representing all (floor, apartment, TU) indices.
+        tablas: Optional precomputed apartment splitter tables (apartment_tables.tablas_apartamento).
+        reducida: If True, builds the reduced formulation: the TU levels are affine
+            expressions of one arrival-power variable per apartment
+            (`_aux['llegada_apto']`) instead of variables, so `_aux['nivel_tu']` holds
+            expressions (value() reads both) and there are no `nivel_tu_*` constraints.
+        agrupar: If True (default), TUs with the same floor, apartment and cable length
+            share one set of level/deviation variables and constraints, with their
+            deviation weighted by the class size. `_aux['clases_tomas']` maps each
+            representative to its TUs, and `nivel_tu`, `d_plus` and `d_minus` hold the
+            representative's variable under every TU of the class.
 
     Returns:
         A PuLP LpProblem object representing the constructed MILP model.
@@ -51,11 +71,21 @@ def construir_modelo_milp(params, all_toma_indices):
     bloques_de_pisos = dividir_en_bloques(params['Piso_Maximo'])
     num_bloques = len(bloques_de_pisos)
 
+    # Las tablas de repartidores se calculan con todas las tomas (el coste de cada
+    # repartidor cuenta cada toma), aunque el modelo solo tenga un representante por clase.
+    if tablas is None:
+        tablas = tablas_apartamento(params, all_toma_indices)
+    clases = _clases_tomas(params, all_toma_indices) if agrupar else {t: [t] for t in all_toma_indices}
+    tomas = list(clases)
+
     # Crea las variables de decisión del modelo (selección de equipos, niveles de señal, etc.).
-    x, y, z, nivel_tu, d_plus, d_minus, r_troncal, pot_in_riser_by_block = _crear_variables(params, pisos, all_toma_indices, bloques_de_pisos)
+    x, y, z, nivel_tu, d_plus, d_minus, r_troncal, pot_in_riser_by_block = _crear_variables(
+        params, pisos, tomas, bloques_de_pisos, tablas, reducida
+    )
 
-    # Define la función objetivo: minimizar la desviación total respecto al nivel de señal objetivo.
-    total_deviation = lpSum(d_plus[p, a, tu] + d_minus[p, a, tu] for (p, a, tu) in all_toma_indices)
+    # Define la función objetivo: minimizar la desviación total respecto al nivel de señal objetivo,
+    # contando cada clase de tomas tantas veces como tomas tiene.
+    total_deviation = lpSum(len(clases[t]) * (d_plus[t] + d_minus[t]) for t in tomas)
     modelo += total_deviation, "min_desviacion_total"
 
     # Añade las restricciones al modelo.
@@ -73,12 +103,17 @@ def construir_modelo_milp(params, all_toma_indices):
         loss_ant_troncal, loss_conns_ant_troncal, loss_troncal_ins
     )
     niveles_tu_args = (
-        modelo, params, all_toma_indices, bloques_de_pisos, x, y, nivel_tu, d_plus, d_minus, pot_in_riser_by_block
+        modelo, params, tomas, bloques_de_pisos, x, y, nivel_tu, d_plus, d_minus, pot_in_riser_by_block
     )
 
     # 4. Añade las restricciones de propagación de señal por bloques y los niveles en tomas.
     _restriccion_bloques(*bloques_args)
-    _restriccion_niveles_tu(*niveles_tu_args)
+    llegada_apto = _restriccion_niveles_tu(*niveles_tu_args, reducida=reducida)
+
+    # Cada toma de una clase lee las variables (o expresiones) de su representante.
+    for rep, miembros in clases.items():
+        for t in miembros[1:]:
+            nivel_tu[t], d_plus[t], d_minus[t] = nivel_tu[rep], d_plus[rep], d_minus[rep]
 
     # Almacena variables y parámetros importantes en un diccionario auxiliar dentro del modelo.
     modelo._aux = {
@@ -86,6 +121,8 @@ def construir_modelo_milp(params, all_toma_indices):
         'd_plus': d_plus, 'd_minus': d_minus,
         'r_troncal': r_troncal,
         'pot_in_riser_by_block': pot_in_riser_by_block,
+        'llegada_apto': llegada_apto,
+        'clases_tomas': clases,
         'bloques_de_pisos': bloques_de_pisos,
         'p_troncal': p_troncal,
         'long_ant_troncal': long_ant_troncal,
@@ -93,6 +130,52 @@ def construir_modelo_milp(params, all_toma_indices):
         'loss_conns_ant_troncal': loss_conns_ant_troncal
     }
     return modelo
+
+def estadisticas_modelo(modelo):
+    """Tamaño de un modelo construido: variables, binarias, restricciones y no ceros."""
+    variables = modelo.variables()
+    restricciones = modelo.constraints()
+    return {
+        'variables': len(variables),
+        'binarias': sum(1 for v in variables if v.cat == 'Integer' and v.lowBound == 0 and v.upBound == 1),
+        'restricciones': len(restricciones),
+        'no_ceros': sum(len(c) for c in restricciones)
+    }
+
+def estadisticas_modelo_denso(params, all_toma_indices):
+    """
+    Tamaño que tendría el modelo creando variables para todo el catálogo en cada piso
+    y apartamento, y descartando los equipos sin salidas suficientes con restricciones
+    '== 0'. Sirve de referencia para estadisticas_modelo.
+    """
+    pisos = params['Piso_Maximo']
+    aptos = params['apartamentos_por_piso']
+    num_bloques = len(dividir_en_bloques(pisos))
+    derivadores = params['derivadores_data'].values()
+    repartidores = params['repartidores_data'].values()
+    n_d, n_r, n_t = len(derivadores), len(repartidores), len(all_toma_indices)
+
+    troncal_insuf = sum(1 for r in repartidores if r.get('salidas', 0) < num_bloques)
+    deriv_insuf = sum(1 for d in derivadores if d.get('salidas', 0) < aptos)
+
+    binarias = pisos * n_d + pisos * aptos * n_r + pisos * aptos + n_r
+    restricciones = 1 + troncal_insuf + pisos * (1 + deriv_insuf)
+    no_ceros = n_r + troncal_insuf + pisos * (n_d + deriv_insuf)
+    for p in range(1, pisos + 1):
+        for a in range(1, aptos + 1):
+            tu_req = params['tus_requeridos_por_apartamento'].get((p, a), 0)
+            insuf = 0 if tu_req <= 1 else sum(1 for r in repartidores if r.get('salidas', 0) < tu_req)
+            restricciones += 2 + insuf
+            no_ceros += 1 + n_r + insuf
+    # Propagación por bloques (una por piso) y 4 restricciones por toma.
+    restricciones += pisos + 4 * n_t
+    no_ceros += num_bloques * (1 + n_r) + (pisos - num_bloques) * (2 + n_d) + n_t * (2 + n_d + n_r + 1 + 1 + 3)
+    return {
+        'variables': binarias + 3 * n_t + pisos,
+        'binarias': binarias,
+        'restricciones': restricciones,
+        'no_ceros': no_ceros
+    }
 # Canonical Serializer
 def make_json_safe(obj):
     if isinstance(obj, dict):
@@ -114,6 +197,7 @@ def make_json_safe(obj):
 # 1. Normalize numbers (avoid float drift)
 # ----------------------------------------
 def normalize_numbers(obj):
+    from decimal import Decimal
     if isinstance(obj, float):
         # Convert to Decimal via string to avoid FP noise
         d = Decimal(str(obj))
@@ -165,35 +249,45 @@ def canonical_json_dumps(obj):
 # 4. SHA256 hash generator
 # ----------------------------------------
 def compute_canonical_hash(obj):
+    import hashlib
     canonical_str = canonical_json_dumps(obj)
     return hashlib.sha256(canonical_str.encode("utf-8")).hexdigest()
 
 # -------------------------
-# Resolver y exportar (Excel + gráficos)
+# Resolver y extraer resultados
 # -------------------------
 
-def resolver_y_exportar(modelo, params, all_toma_indices, output_excel_file=OUTPUT_XLSX):
-    """Solves the MILP model and exports the results to Excel and plots.
+def resolver_modelo(modelo, params, all_toma_indices, solver=None):
+    """Solves the MILP model and extracts the per-TU detail rows.
 
-    This function solves the provided MILP model, processes the results, exports detailed and summary data to an Excel file, and generates plots of the TU levels. It returns the detailed and summary DataFrames for further analysis.
+    This is the canonical solve path: it does not build DataFrames nor touch the
+    Excel/plot/HTML tooling.
 
     Args:
         modelo: The PuLP LpProblem object representing the MILP model.
         params: Dictionary containing all required parameters for the model.
         all_toma_indices: List of tuples representing all (floor, apartment, TU) indices.
-        output_excel_file: Path to the output Excel file.
+        solver: Optional PuLP solver instance; PuLP's default solver is used if omitted.
 
     Returns:
-        Tuple of (df_detalle, df_resumen) DataFrames with detailed and summary results.
-    """    
+        List of detail row dicts (one per TU), or None if no optimal solution was found.
+    """
     # Resuelve el modelo MILP.
-    modelo.solve()
+    modelo.solve(solver)
 
     # Verifica si se encontró una solución óptima.
     if LpStatus[modelo.status] != 'Optimal':
-        print("No se encontró solución óptima. Estado:", LpStatus[modelo.status])
-        return None, None
+        # A stderr: en optimizer_canonical cada línea de stdout es un registro JSON.
+        print("No se encontró solución óptima. Estado:", LpStatus[modelo.status], file=sys.stderr)
+        return None
+    return extraer_filas_detalle(modelo, params, all_toma_indices)
+
+def extraer_filas_detalle(modelo, params, all_toma_indices):
+    """Per-TU detail rows of the values currently loaded in the model.
 
+    The values come from the last solve or from a design loaded with
+    greedy_start.fijar_arranque (e.g. the provisional design of lp_preview.py).
+    """
     # Extrae los resultados y variables auxiliares del modelo resuelto.
     aux = modelo._aux
     bloques = aux['bloques_de_pisos']
@@ -202,39 +296,21 @@ def resolver_y_exportar(modelo, params, all_toma_indices, output_excel_file=OUTP
     loss_ant_troncal = aux['loss_ant_troncal']
     loss_conns_ant_troncal = aux['loss_conns_ant_troncal']
 
-    # Procesa los resultados para generar filas de datos detallados y de resumen.
+    # Procesa los resultados para generar filas de datos detallados.
     r_troncal_sel, loss_troncal_ins_val, salidas_troncal = _seleccionar_troncal(params, aux)
-    filas_detalle = _generar_filas_detalle(
+    return _generar_filas_detalle(
         all_toma_indices, bloques, p_troncal, long_ant_troncal, loss_ant_troncal,
         loss_conns_ant_troncal, r_troncal_sel, loss_troncal_ins_val, salidas_troncal, aux, params
     )
-    # filas_resumen = _generar_filas_resumen(bloques, p_troncal, aux, params)
-
-    # Convierte las listas de resultados en DataFrames de pandas.
-    df_detalle = pd.DataFrame(filas_detalle)
-    # df_resumen = pd.DataFrame(filas_resumen)
-    
-    # Genera DataFrames adicionales para el inventario, resumen por piso y análisis de frecuencias.
-    df_inventario = _generar_df_inventario(df_detalle, params, bloques)
-    df_resumen_piso = _generar_df_resumen_por_piso(df_detalle)
-    df_detalle_resumido = _generar_df_detalle_resumido(df_detalle, params)
-
-    # Exporta todos los DataFrames a un único archivo Excel con múltiples hojas.
-    _exportar_a_excel(df_detalle, df_inventario, df_resumen_piso, df_detalle_resumido, output_excel_file)
-    
-    # Genera y guarda los gráficos de niveles de señal.
-    _generar_graficos(df_detalle)
-
-    # Genera y exporta un esquema de la red en formato de texto.
-    _dibujar_esquema_conexiones_ascii(df_detalle, params=params, aux=aux, output_file=esquema_out_file)
-        
-    # Devuelve los DataFrames principales para posible uso posterior.
-    return df_detalle
 
 # -------------------------
 # Main
 # -------------------------
 def main():
+    import hashlib
+    from Funciones_apoyo_datos_entrada import cargar_datos_y_parametros
+    from result_pipeline import ResultPipeline
+
     # 1. Cargar datos de entrada desde el archivo Excel.
     print("Cargando datos...")
     params = cargar_datos_y_parametros(INPUT_FILE)
@@ -242,6 +318,13 @@ def main():
     # 2. Generar la lista de todas las tomas del edificio y validar datos.
     print("Generando índices de tomas y validando...")
     all_toma_indices = generar_indices_y_validar_datos(params)
+
+    # Descarta en milisegundos los datos que ningún diseño puede cumplir.
+    from infeasibility_screen import cribar_niveles, mensaje_rechazo
+    problemas, tomas_infactibles = cribar_niveles(params, all_toma_indices)
+    if problemas or tomas_infactibles:
+        print(mensaje_rechazo(problemas, tomas_infactibles))
+        return
     
     # 3. Construir el modelo de optimización lineal (MILP).
     print("Construyendo modelo MILP...")
@@ -254,9 +337,56 @@ def main():
     print("Nivel_max:", params['Nivel_maximo'])
     # --------------------------------
 
-    # 4. Resolver el modelo y exportar los resultados a Excel, gráficos y texto.
+    # 4. Solución inicial con la heurística greedy.
+    objetivo_greedy = None
+    if ARRANQUE_GREEDY:
+        from greedy_start import diseno_greedy, fijar_arranque
+        diseno, _ = diseno_greedy(params, all_toma_indices)
+        if diseno is not None:
+            objetivo_greedy = fijar_arranque(modelo, params, all_toma_indices, diseno)
+            print(f"Arranque greedy: desviación total {objetivo_greedy:.3f} (troncal {diseno['troncal']})")
+        else:
+            print("Arranque greedy: no se encontró un diseño factible.")
+
+    # 5. Resolver el modelo y exportar los resultados a Excel, gráficos y texto.
     print("Resolviendo y exportando resultados...")
-    df_detalle = resolver_y_exportar(modelo, params, all_toma_indices, OUTPUT_XLSX)
+    if MODO_CARRERA:
+        from solver_portfolio import PortfolioSolver
+        solver = PortfolioSolver(dict(AJUSTES_CARRERA, warmStart=objetivo_greedy is not None))
+    elif MODO_ANYTIME:
+        from solver_backends import CbcSolver
+        solver = CbcSolver(
+            progress_callback=lambda e: print(f"  [{e['time']:.2f} s] nueva solución: desviación total {e['incumbent']:.3f}"),
+            warmStart=objetivo_greedy is not None
+        )
+    else:
+        from pulp import PULP_CBC_CMD
+        solver = PULP_CBC_CMD(warmStart=objetivo_greedy is not None)
+    filas_detalle = resolver_modelo(modelo, params, all_toma_indices, solver)
+
+    # En modo carrera, informa de la configuración ganadora.
+    informe = getattr(solver, 'informe', None)
+    if informe is not None:
+        print(f"Carrera de solvers: gana {informe['ganador']} en {informe['tiempo_s']} s (objetivo {informe['objetivo']})")
+        for c in informe['configuraciones']:
+            print(f"  {c['nombre']}: {c['estado']}, {c['status']}, {c['tiempo_s']} s, objetivo {c['objetivo']}")
+
+    # Solo se calculan los artefactos pedidos (y las tablas que comparten), ver result_pipeline.py.
+    resultados = None
+    if filas_detalle is not None:
+        resultados = ResultPipeline(
+            modelo, params, all_toma_indices, filas_detalle,
+            output_excel_file=OUTPUT_XLSX, scheme_file=esquema_out_file, specs_file=INPUT_FILE
+        )
+        resultados.build(ARTEFACTOS_CLI)
+    if objetivo_greedy is not None and LpStatus[modelo.status] == 'Optimal':
+        print(f"Desviación total final: {value(modelo.objective):.3f} (arranque greedy {objetivo_greedy:.3f})")
+    resumen = getattr(solver, 'resumen', None)
+    if resumen is not None and resumen['incumbent'] is not None:
+        cota = 'n/d' if resumen['bound'] is None else f"{resumen['bound']:.3f}"
+        gap = 'n/d' if resumen['gap'] is None else f"{100 * resumen['gap']:.2f}%"
+        estado = "gap alcanzado" if resumen['optimal'] else "detenido por límite de tiempo"
+        print(f"Mejor solución {resumen['incumbent']:.3f}, cota {cota}, gap {gap} ({estado})")
 
     # 1️⃣ Make JSON-safe
     safe_params = make_json_safe(params)
@@ -286,11 +416,10 @@ def main():
         )
     print(f"Canonical SHA256: {canonical_hash}")
 
-    # 5. Generar una visualización interactiva HTML del árbol de distribución.
-    print("Generando visualización interactiva...")
-    _generar_arbol_completo_con_specs(OUTPUT_XLSX, INPUT_FILE)
-    
-    if df_detalle is not None:
+    # 6. Generar una visualización interactiva HTML del árbol de distribución.
+    if resultados is not None:
+        print("Generando visualización interactiva...")
+        resultados.get('tree')
         print("Listo.")
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+"""Per-apartment splitter lookup tables.
+
+Once the power `q` reaching an apartment's repartidor input is known (riser power
+minus the floor derivador's `derivacion`, the derivador→repartidor cable and the
+apartment connectors), every TU level is `q - L_r - off_t`, where `L_r` is the
+insertion loss of the chosen repartidor and `off_t` the TU cable plus connection
+loss. The repartidor choice only affects the apartment's own TUs.
+
+For each distinct apartment profile (TUs required + sorted TU offsets) this module
+precomputes the piecewise function "q → best repartidor and deviation" once, and
+apartments with the same profile share the table:
+
+- Repartidores with the same insertion loss are interchangeable; only the smallest
+  one with enough outputs is kept.
+- A repartidor that is never the best feasible choice for any `q` is dropped.
+
+The MILP only creates `y[p, a, r]` for the repartidores in the apartment's table,
+and the DP block solver (block_dp.py) replaces its per-apartment search by a lookup.
+Tables depend on the level limits and target, so model_cache includes their
+signature in the structural key.
+"""
+import bisect
+import copy
+
+from catalog import compile_catalog
+
+# Same order of magnitude as the solver's primal feasibility tolerance.
+FEASIBILITY_TOL = 1e-7
+
+
+def _candidatos(params, tu_req):
+    """One (repartidor, loss) per distinct insertion loss, smallest adequate splitter first."""
+    if tu_req <= 1:
+        return [(None, 0.0)]
+    columnas = compile_catalog(params).repartidores
+    return sorted(
+        ((r, columnas.valor(r, 'perdida_insercion')) for r in columnas.para_salidas(tu_req)),
+        key=lambda c: c[1]
+    )
+
+
+class ApartmentTable:
+    """Piecewise map from repartidor input power to the best repartidor and deviation.
+
+    Attributes:
+        candidates: [(repartidor, loss)] with one entry per distinct insertion loss.
+        segments: Sorted [(q_lo, q_hi, repartidor, loss)] covering every feasible `q`.
+        splitters: Repartidores that appear in some segment (empty if none is feasible).
+    """
+
+    def __init__(self, params, tu_req, offsets):
+        self.offsets = offsets
+        self.n_min = params['Nivel_minimo']
+        self.n_max = params['Nivel_maximo']
+        self.objetivo = params['Potencia_Objetivo_TU']
+        self.candidates = _candidatos(params, tu_req)
+        self._ventanas = {loss: self._ventana(loss) for _, loss in self.candidates}
+        self._base = [off + self.objetivo for off in offsets]
+        self.segments = self._envolvente()
+        self._q_lo = [s[0] for s in self.segments]
+        self.splitters = {s[2] for s in self.segments if s[2] is not None}
+
+    def _ventana(self, loss):
+        """Range of `q` that keeps every TU within the limits for a given loss."""
+        return self.n_min + loss + max(self.offsets), self.n_max + loss + min(self.offsets)
+
+    def cost(self, q, loss):
+        """Total deviation of the apartment's TUs, or None if a level is out of limits."""
+        lo, hi = self._ventanas[loss]
+        if q < lo - FEASIBILITY_TOL or q > hi + FEASIBILITY_TOL:
+            return None
+        v = q - loss
+        return sum(abs(v - b) for b in self._base)
+
+    def _envolvente(self):
+        ventanas = self._ventanas
+        puntos = set()
+        for _, loss in self.candidates:
+            lo, hi = ventanas[loss]
+            if lo <= hi:
+                puntos.update((lo, hi))
+                puntos.update(loss + b for b in self._base if lo < loss + b < hi)
+        puntos = sorted(puntos)
+
+        # Between consecutive breakpoints the feasible set is fixed and every cost is
+        # linear; add the crossing points so each piece has a single best candidate.
+        valores = {q: {loss: self.cost(q, loss) for _, loss in self.candidates} for q in puntos}
+        for a, b in zip(puntos, puntos[1:]):
+            va, vb = valores[a], valores[b]
+            factibles = [loss for _, loss in self.candidates if ventanas[loss][0] <= a and ventanas[loss][1] >= b]
+            for j, l1 in enumerate(factibles):
+                for l2 in factibles[j + 1:]:
+                    fa, fb = va[l1] - va[l2], vb[l1] - vb[l2]
+                    if fa * fb < 0:
+                        q = a + (b - a) * fa / (fa - fb)
+                        valores[q] = {loss: self.cost(q, loss) for _, loss in self.candidates}
+        cortes = sorted(valores)
+
+        segmentos = []
+        for a, b in zip(cortes, cortes[1:]):
+            factibles = [c for c in self.candidates if ventanas[c[1]][0] <= a and ventanas[c[1]][1] >= b]
+            if not factibles:
+                continue
+            # Costs are linear on [a, b]: the best at the midpoint is the best on the piece.
+            r, loss = min(factibles, key=lambda c: valores[a][c[1]] + valores[b][c[1]])
+            if segmentos and segmentos[-1][2] == r and abs(segmentos[-1][1] - a) <= FEASIBILITY_TOL:
+                segmentos[-1] = (segmentos[-1][0], b, r, loss)
+            else:
+                segmentos.append((a, b, r, loss))
+
+        # Any window of positive width is covered by the pieces above; a zero-width
+        # window is feasible at a single point.
+        for r, loss in self.candidates:
+            lo, hi = ventanas[loss]
+            if 0 <= hi - lo <= FEASIBILITY_TOL and not any(s[0] <= lo <= s[1] for s in segmentos):
+                segmentos.append((lo, hi, r, loss))
+        return sorted(segmentos, key=lambda s: s[0])
+
+    def lookup(self, q):
+        """Returns (deviation, repartidor) for input power `q`, or (None, None) if infeasible."""
+        i = bisect.bisect_right(self._q_lo, q)
+        best_cost, best_r = None, None
+        for _, _, r, loss in self.segments[max(i - 2, 0):i + 1]:
+            c = self.cost(q, loss)
+            if c is not None and (best_cost is None or c < best_cost):
+                best_cost, best_r = c, r
+        return best_cost, best_r
+
+
+def tablas_apartamento(params, all_toma_indices):
+    """Builds the lookup table of every apartment with TUs: {(p, a): ApartmentTable}.
+
+    Apartments with the same profile share the same table object.
+    """
+    att = params['atenuacion_cable_por_metro']
+    offsets = {}
+    for (p, a, tu_idx) in all_toma_indices:
+        offsets.setdefault((p, a), []).append(
+            params['largo_cable_tu'][(p, a, tu_idx)] * att + params['atenuacion_conexion_tu']
+        )
+
+    compartidas, tablas = {}, {}
+    for (p, a), offs in offsets.items():
+        tu_req = params['tus_requeridos_por_apartamento'].get((p, a), 0)
+        perfil = (tu_req, tuple(sorted(offs)))
+        if perfil not in compartidas:
+            compartidas[perfil] = ApartmentTable(params, tu_req, list(perfil[1]))
+        tablas[p, a] = compartidas[perfil]
+    return tablas
+
+
+def repartidores_permitidos(table):
+    """Repartidores for which the MILP creates `y` variables.
+
+    Falls back to every adequate candidate when no repartidor is feasible, so the
+    model stays well formed and reports the infeasibility through the level limits.
+    """
+    if table.splitters:
+        return sorted(table.splitters)
+    return [r for r, _ in table.candidates if r is not None]
+
+
+def tablas_sin_poda(tablas):
+    """Copies of ``tablas`` whose `y` variables cover every adequate candidate.
+
+    Used by the elastic diagnosis (elastic_diagnosis.py): once the level limits may be
+    violated, pruning by the feasible input powers no longer applies. Shared tables
+    stay shared.
+    """
+    copias = {}
+    for t in tablas.values():
+        if id(t) not in copias:
+            copias[id(t)] = copy.copy(t)
+            copias[id(t)].splitters = set()
+    return {k: copias[id(t)] for k, t in tablas.items()}
+
+
+def firma(tablas):
+    """Hashable signature of the repartidores allowed per apartment."""
+    return sorted((f"{p}|{a}", repartidores_permitidos(t)) for (p, a), t in tablas.items())
@@ -0,0 +1,96 @@
+"""Exact dynamic-programming solver for the subproblem of a single riser block.
+
+Inside a block the signal propagates floor by floor from the entry floor, and the
+power reaching a floor only depends on the `paso` of the derivadores chosen on the
+floors before it. Once the floor's derivador is fixed, each apartment's repartidor is
+a local decision, read from the apartment's lookup table (apartment_tables.py). The DP walks the floors in propagation order with the riser power as
+state and the floor's total deviation as stage cost; paths that reach the same power
+are merged, which keeps the state space to the distinct cumulative `paso` sums.
+
+solve_block_dp returns the same result dict as decomposition_engine.solve_block, so it
+can be used as the block solver of DecomposedModel.
+"""
+from pulp import LpStatusOptimal, LpStatusInfeasible
+
+from Funciones_apoyo_datos_entrada import dividir_en_bloques
+from Funciones_apoyo_optimizacion import entrada_y_direccion_bloque, _potencia_entrada_bloque
+from apartment_tables import tablas_apartamento
+from catalog import compile_catalog
+
+# Riser powers closer than this are the same DP state.
+STATE_DECIMALS = 9
+
+
+def solve_block_dp(params, all_toma_indices, b_idx, loss_troncal_ins, solver_settings=None):
+    """Solves one block exactly by DP over its floors.
+
+    `solver_settings` is accepted for signature compatibility with solve_block and ignored.
+    """
+    bloques = dividir_en_bloques(params['Piso_Maximo'])
+    bloque = bloques[b_idx]
+    p_troncal = params['p_troncal']
+    _, direccion = entrada_y_direccion_bloque(bloque, p_troncal)
+    pisos_orden = sorted(bloque, reverse=(direccion == 'down'))
+
+    att = params['atenuacion_cable_por_metro']
+    loss_conns = params['conectores_por_union'] * params['atenuacion_conector']
+    loss_entre_pisos = params['largo_cable_entre_pisos'] * att
+    columnas = compile_catalog(params).derivadores
+    derivadores = [
+        (d, columnas.valor(d, 'derivacion'), columnas.valor(d, 'paso'))
+        for d in columnas.para_salidas(params['apartamentos_por_piso'])
+    ]
+
+    # Per floor: [(apto, lookup table, cable+connector loss to the repartidor)].
+    tablas = tablas_apartamento(params, [t for t in all_toma_indices if t[0] in bloque])
+    apartamentos = {
+        p: [
+            (a, tablas[p, a], params['largo_cable_derivador_repartidor'][(p, a)] * att + 4 * params['atenuacion_conector'])
+            for a in range(1, params['apartamentos_por_piso'] + 1)
+            if (p, a) in tablas
+        ]
+        for p in bloque
+    }
+
+    memo = {}
+
+    def floor_cost(p, derivacion, pot):
+        key = (p, derivacion, round(pot, STATE_DECIMALS))
+        if key not in memo:
+            memo[key] = _floor_cost(p, derivacion, pot)
+        return memo[key]
+
+    def _floor_cost(p, derivacion, pot):
+        total, choices = 0.0, {}
+        for a, tabla, loss_apto in apartamentos[p]:
+            cost, r = tabla.lookup(pot - derivacion - loss_apto)
+            if cost is None:
+                return None, None
+            total += cost
+            choices[p, a] = r
+        return total, choices
+
+    # state: rounded riser power -> (cost so far, riser power, derivadores, repartidores)
+    pot_entrada = _potencia_entrada_bloque(params, bloque, p_troncal, loss_troncal_ins)
+    states = {round(pot_entrada, STATE_DECIMALS): (0.0, pot_entrada, {}, {})}
+    for i, p in enumerate(pisos_orden):
+        last = i == len(pisos_orden) - 1
+        next_states = {}
+        for cost, pot, derivs, reps in states.values():
+            for d, derivacion, paso in derivadores:
+                stage, choices = floor_cost(p, derivacion, pot)
+                if stage is None:
+                    continue
+                pot_sig = 0.0 if last else pot - paso - loss_entre_pisos - loss_conns
+                key = round(pot_sig, STATE_DECIMALS)
+                total = cost + stage
+                if key not in next_states or total < next_states[key][0]:
+                    next_states[key] = (total, pot_sig, {**derivs, p: d}, {**reps, **choices})
+        states = next_states
+        if not states:
+            break
+
+    if not states:
+        return {'status': LpStatusInfeasible, 'objective': None, 'derivadores': {}, 'repartidores': {}}
+    cost, _, derivs, reps = min(states.values(), key=lambda s: s[0])
+    return {'status': LpStatusOptimal, 'objective': cost, 'derivadores': derivs, 'repartidores': reps}
@@ -0,0 +1,168 @@
+"""Bound-tightening presolve for the MILP of construir_modelo_milp.
+
+_crear_variables creates `pot_in_riser_by_block`, `nivel_tu`, `d_plus` and `d_minus`
+with only `lowBound=0`. apretar_modelo tightens them from the catalog and the
+geometry before the solve:
+
+- Riser power and TU level bounds: the ranges of infeasibility_screen.py (each loss
+  between the catalog's smallest and largest value).
+- Deviation bounds: `d_plus <= Nivel_maximo - Potencia_Objetivo_TU` and
+  `d_minus <= Potencia_Objetivo_TU - Nivel_minimo`, further cut by the level range.
+- Variable fixing: a derivador whose window (greedy_start.ventanas_derivador) is
+  empty on a floor, and a trunk repartidor whose entry power falls outside the
+  windows of some block, are fixed to 0.
+- Valid inequalities, one pair per floor (optional): with lo(p, d) / hi(p, d) the
+  ends of the window of derivador d on floor p,
+
+      sum_d lo(p, d) x[p, d] <= pot_in_riser[p] <= sum_d hi(p, d) x[p, d]
+
+  They hold for every feasible design, since exactly one x[p, d] is 1, but cut
+  fractional points of the LP relaxation where the riser power does not match the
+  mix of derivadores.
+
+Every bound and inequality depends on `potencia_entrada` and the level limits, so
+apretar_modelo is applied again on every solve, also to models reused from
+model_cache (inequalities are rebuilt by name); aflojar_modelo restores the bounds
+of _crear_variables on a reused model solved without the presolve.
+"""
+from pulp import LpAffineExpression, LpConstraint, LpConstraintGE, LpConstraintLE, LpVariable
+
+from Funciones_apoyo_datos_entrada import dividir_en_bloques
+from Funciones_apoyo_optimizacion import _potencia_entrada_bloque, _troncales_validos, entrada_y_direccion_bloque
+from apartment_tables import tablas_apartamento
+from catalog import compile_catalog
+from greedy_start import ventanas_derivador, _contiene, _unir
+from infeasibility_screen import rangos_riser, rangos_nivel
+
+# Name prefix of the valid inequalities, so they can be replaced or removed.
+PREFIJO_DESIGUALDADES = 'vi_riser_'
+
+
+def cotas(params, all_toma_indices, tablas=None):
+    """Bounds and fixings of the presolve, shared by both model builders.
+
+    Returns None if the catalog admits no design (see infeasibility_screen), or a dict:
+        riser: {p: (lo, hi)}; nivel: {(p, a, t): (lo, hi)};
+        d_plus / d_minus: {(p, a, t): upper bound};
+        ventanas: {(p, d): (lo, hi) or None if d is fixed to 0 on p};
+        troncales_fijados: trunk repartidores fixed to 0.
+    """
+    riser = rangos_riser(params)
+    if riser is None:
+        return None
+    if tablas is None:
+        tablas = tablas_apartamento(params, all_toma_indices)
+    nivel = rangos_nivel(params, all_toma_indices, riser)
+    objetivo = params['Potencia_Objetivo_TU']
+    n_min, n_max = params['Nivel_minimo'], params['Nivel_maximo']
+
+    ventanas = {}
+    for (p, d), intervalos in ventanas_derivador(params, all_toma_indices, tablas).items():
+        lo, hi = riser[p]
+        if intervalos:
+            lo, hi = max(lo, intervalos[0][0]), min(hi, intervalos[-1][1])
+        ventanas[p, d] = (lo, hi) if intervalos and lo <= hi else None
+
+    # A trunk is fixed to 0 if some block entry power has no derivador window.
+    repartidores = compile_catalog(params).repartidores
+    bloques = dividir_en_bloques(params['Piso_Maximo'])
+    troncales_fijados = []
+    for r in _troncales_validos(params, len(bloques)):
+        loss = repartidores.valor(r, 'perdida_insercion')
+        for bloque in bloques:
+            p_ent, _ = entrada_y_direccion_bloque(bloque, params['p_troncal'])
+            alcance = _unir(v for d, v in ventanas.items() if d[0] == p_ent and v is not None)
+            if not _contiene(alcance, _potencia_entrada_bloque(params, bloque, params['p_troncal'], loss)):
+                troncales_fijados.append(r)
+                break
+
+    return {
+        'riser': riser,
+        'nivel': nivel,
+        'd_plus': {k: max(0.0, min(hi, n_max) - objetivo) for k, (lo, hi) in nivel.items()},
+        'd_minus': {k: max(0.0, objetivo - max(lo, n_min)) for k, (lo, hi) in nivel.items()},
+        'ventanas': ventanas,
+        'troncales_fijados': troncales_fijados
+    }
+
+
+def apretar_modelo(modelo, params, all_toma_indices, tablas=None, desigualdades=True):
+    """Applies the presolve to an LpProblem of construir_modelo_milp, in place.
+
+    Returns a dict with the number of tightened bounds, fixed binaries and valid
+    inequalities, for the solver log (empty if the catalog admits no design).
+    """
+    c = cotas(params, all_toma_indices, tablas)
+    if c is None:
+        return {}
+    aux = modelo._aux
+    for (p, _), var in aux['pot_in_riser_by_block'].items():
+        lo, hi = c['riser'][p]
+        var.lowBound, var.upBound = max(0.0, lo), max(0.0, hi)
+    # One bound per TU class: its TUs share the variables of the representative.
+    for k in aux['clases_tomas']:
+        var = aux['nivel_tu'][k]
+        # In the reduced formulation the level is an expression, bounded through d_plus/d_minus.
+        if isinstance(var, LpVariable):
+            lo, hi = c['nivel'][k]
+            var.lowBound, var.upBound = max(0.0, lo), max(0.0, hi)
+        aux['d_plus'][k].upBound = c['d_plus'][k]
+        aux['d_minus'][k].upBound = c['d_minus'][k]
+
+    fijados = 0
+    for (p, d), var in aux['x'].items():
+        var.upBound = 1 if c['ventanas'][p, d] is not None else 0
+        fijados += c['ventanas'][p, d] is None
+    for r, var in aux['r_troncal'].items():
+        var.upBound = 0 if r in c['troncales_fijados'] else 1
+    fijados += len(c['troncales_fijados'])
+
+    _quitar_desigualdades(modelo)
+    inecuaciones = 0
+    if desigualdades:
+        for (p, b_idx), pot in aux['pot_in_riser_by_block'].items():
+            lo_expr = LpAffineExpression([(pot, 1.0)])
+            hi_expr = LpAffineExpression([(pot, 1.0)])
+            for (q, d), var in aux['x'].items():
+                if q == p and c['ventanas'][p, d] is not None:
+                    lo, hi = c['ventanas'][p, d]
+                    lo_expr[var] = -lo
+                    hi_expr[var] = -hi
+            for sentido, expr, tipo in (('min', lo_expr, LpConstraintGE), ('max', hi_expr, LpConstraintLE)):
+                modelo.addConstraint(LpConstraint(expr, tipo, rhs=0), _nombre_desigualdad(sentido, p, b_idx))
+            inecuaciones += 2
+    return {
+        'cotas': (
+            len(aux['pot_in_riser_by_block']) + 2 * len(aux['clases_tomas'])
+            + sum(isinstance(aux['nivel_tu'][k], LpVariable) for k in aux['clases_tomas'])
+        ),
+        'binarias_fijadas': fijados,
+        'desigualdades': inecuaciones
+    }
+
+
+def aflojar_modelo(modelo):
+    """Undoes apretar_modelo: the bounds of _crear_variables and no valid inequalities."""
+    aux = modelo._aux
+    for var in list(aux['pot_in_riser_by_block'].values()) + list(aux['nivel_tu'].values()):
+        if isinstance(var, LpVariable):
+            var.lowBound, var.upBound = 0, None
+    for var in list(aux['d_plus'].values()) + list(aux['d_minus'].values()):
+        var.upBound = None
+    for var in list(aux['x'].values()) + list(aux['r_troncal'].values()):
+        var.upBound = 1
+    _quitar_desigualdades(modelo)
+
+
+def _nombre_desigualdad(sentido, p, b_idx):
+    return f"{PREFIJO_DESIGUALDADES}{sentido}_p{p}_b{b_idx}"
+
+
+def _quitar_desigualdades(modelo):
+    # PuLP 3 has no public call to remove a constraint: each inequality is looked up by
+    # name and dropped from the problem's constraint table.
+    for p, b_idx in modelo._aux['pot_in_riser_by_block']:
+        for sentido in ('min', 'max'):
+            nombre = _nombre_desigualdad(sentido, p, b_idx)
+            if modelo.get_constraint_by_name(nombre) is not None:
+                del modelo._constraints[nombre]
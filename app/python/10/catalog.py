@@ -0,0 +1,105 @@
+"""Compiled equipment catalogs shared across requests.
+
+`derivadores_data` and `repartidores_data` arrive as plain dicts ({name: {...}}).
+compile_catalog turns them into array-backed columns (`derivacion`, `paso`,
+`perdida_insercion`, `salidas`) with a name → row index and a per-capacity index:
+`para_salidas(n)` returns the entries with at least `n` outputs, keeping a single
+entry per set of losses (the smallest one, then catalog order). Entries with the
+same losses are interchangeable once they have enough outputs, so the others can
+never beat it.
+
+Lower losses are not pruned against higher ones: the objective penalises
+deviations on both sides of the target level, so either can be the better choice.
+
+Compiled catalogs are kept in memory keyed by the hash of both dicts, so a
+long-lived worker compiles each catalog once.
+"""
+import hashlib
+import json
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+# Number of compiled catalogs kept in memory.
+MAX_CATALOGS = 16
+
+_catalogs = OrderedDict()
+
+
+class CatalogColumns:
+    """Array-backed view of one catalog.
+
+    Attributes:
+        nombres: Entry names in catalog order (exact duplicates removed).
+        fila: {name: row} for every name of the original dict.
+        salidas: array('i') of output counts.
+        <atributo>: array('d') per loss attribute (e.g. `derivacion`, `paso`).
+    """
+
+    def __init__(self, data, atributos):
+        self.atributos = atributos
+        self.nombres, self.fila = [], {}
+        firmas = {}
+        for nombre, item in data.items():
+            firma = (item.get('salidas', 0),) + tuple(item[k] for k in atributos)
+            # An exact duplicate (same outputs and losses) maps to the first entry.
+            if firma in firmas:
+                self.fila[nombre] = firmas[firma]
+                continue
+            firmas[firma] = self.fila[nombre] = len(self.nombres)
+            self.nombres.append(nombre)
+
+        self.salidas = array('i', (int(data[n].get('salidas', 0)) for n in self.nombres))
+        for k in atributos:
+            setattr(self, k, array('d', (float(data[n][k]) for n in self.nombres)))
+
+        # Per-capacity index: one list per distinct output count.
+        self._umbrales = sorted(set(self.salidas))
+        self._por_capacidad = [self._no_dominados(n) for n in self._umbrales]
+
+    def _no_dominados(self, n):
+        elegidos = {}
+        for i, nombre in enumerate(self.nombres):
+            if self.salidas[i] < n:
+                continue
+            perdidas = tuple(getattr(self, k)[i] for k in self.atributos)
+            j = elegidos.get(perdidas)
+            if j is None or self.salidas[i] < self.salidas[j]:
+                elegidos[perdidas] = i
+        return [self.nombres[i] for i in sorted(elegidos.values())]
+
+    def para_salidas(self, n):
+        """Non-dominated entries with at least ``n`` outputs, in catalog order."""
+        i = bisect_left(self._umbrales, n)
+        return self._por_capacidad[i] if i < len(self._umbrales) else []
+
+    def valor(self, nombre, atributo):
+        """Value of ``atributo`` (a loss attribute or 'salidas') for the entry ``nombre``."""
+        return getattr(self, atributo)[self.fila[nombre]]
+
+
+class CompiledCatalog:
+    def __init__(self, params):
+        self.derivadores = CatalogColumns(params['derivadores_data'], ('derivacion', 'paso'))
+        self.repartidores = CatalogColumns(params['repartidores_data'], ('perdida_insercion',))
+
+
+def catalog_hash(params):
+    payload = json.dumps(
+        [params['derivadores_data'], params['repartidores_data']], sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def compile_catalog(params):
+    """Returns the CompiledCatalog for the catalogs in ``params`` (cached by hash)."""
+    key = catalog_hash(params)
+    catalogo = _catalogs.get(key)
+    if catalogo is not None:
+        _catalogs.move_to_end(key)
+        return catalogo
+    catalogo = CompiledCatalog(params)
+    _catalogs[key] = catalogo
+    while len(_catalogs) > MAX_CATALOGS:
+        _catalogs.popitem(last=False)
+    return catalogo
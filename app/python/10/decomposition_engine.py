@@ -0,0 +1,191 @@
+"""Exact decomposition engine: fixed trunk splitter, independent per-block subproblems.
+
+In construir_modelo_milp the blocks from dividir_en_bloques are only coupled through
+the trunk splitter choice (`r_troncal`) and its insertion loss. For a fixed trunk
+splitter, every block's riser/floor/apartment problem is independent, so this engine
+enumerates the feasible trunk splitters (`salidas >= num_bloques`), solves every
+(trunk loss, block) subproblem in a process pool and keeps the trunk with the lowest
+total deviation. Splitters with the same insertion loss produce identical
+subproblems and are solved once.
+
+Each block subproblem is solved either as a small MILP (`block_solver="milp"`, with the
+backend chosen by `solver`, see solver_backends.py) or exactly by dynamic programming
+over the floors (`block_solver="dp"`, see block_dp.py).
+
+DecomposedModel exposes `solve()`, `status` and `_aux` like the LpProblem returned by
+construir_modelo_milp, so Optimizacion_RITEL_10.resolver_modelo works unchanged.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from pulp import LpProblem, LpMinimize, LpStatus, LpStatusOptimal, LpStatusInfeasible, lpSum, value
+
+from Funciones_apoyo_datos_entrada import dividir_en_bloques
+from Funciones_apoyo_optimizacion import (
+    _crear_variables, _restriccion_derivador, _restriccion_repartidor_apto,
+    _perdidas_comunes, _restriccion_bloque, _restriccion_niveles_tu, _asignar_diseno
+)
+from block_dp import solve_block_dp
+from catalog import compile_catalog
+from solver_backends import make_solver
+
+
+def trunk_candidates(params, num_bloques):
+    """Groups the feasible trunk splitters by insertion loss: {loss: [names]}.
+
+    The compiled catalog already keeps a single (smallest) splitter per loss.
+    """
+    columnas = compile_catalog(params).repartidores
+    candidates = {}
+    for r in columnas.para_salidas(num_bloques):
+        candidates.setdefault(columnas.valor(r, 'perdida_insercion'), []).append(r)
+    return candidates
+
+
+def solve_block(params, all_toma_indices, b_idx, loss_troncal_ins, solver_settings, solver="cbc"):
+    """Builds and solves the MILP of one block for a fixed trunk insertion loss.
+
+    Returns a dict with the PuLP status, the block objective and the chosen
+    derivador per floor / repartidor per apartment.
+    """
+    bloques = dividir_en_bloques(params['Piso_Maximo'])
+    bloque = bloques[b_idx]
+    tomas = [t for t in all_toma_indices if t[0] in bloque]
+
+    modelo = LpProblem(f"Optimizacion_TDT_Bloque_{b_idx}", LpMinimize)
+    x, y, z, nivel_tu, d_plus, d_minus, r_troncal, pot = _crear_variables(params, bloque, tomas, bloques)
+    modelo += lpSum(d_plus[t] + d_minus[t] for t in tomas), "min_desviacion_bloque"
+
+    _restriccion_derivador(modelo, params, x, bloque)
+    _restriccion_repartidor_apto(modelo, params, y, z, bloque)
+    p_troncal, _, loss_ant_troncal, loss_conns_ant_troncal, _ = _perdidas_comunes(params, r_troncal)
+    _restriccion_bloque(
+        modelo, params, b_idx, bloque, p_troncal, x, pot,
+        loss_ant_troncal, loss_conns_ant_troncal, loss_troncal_ins
+    )
+    _restriccion_niveles_tu(modelo, params, tomas, bloques, x, y, nivel_tu, d_plus, d_minus, pot)
+
+    modelo.solve(make_solver(solver, solver_settings))
+    result = {'status': modelo.status, 'objective': None, 'derivadores': {}, 'repartidores': {}}
+    if LpStatus[modelo.status] != 'Optimal':
+        return result
+
+    result['objective'] = value(modelo.objective) or 0.0
+    for (p, d), var in x.items():
+        if value(var) > 0.5:
+            result['derivadores'][p] = d
+    for (p, a), var in z.items():
+        result['repartidores'][p, a] = None
+    for (p, a, r), var in y.items():
+        if value(var) > 0.5:
+            result['repartidores'][p, a] = r
+    return result
+
+
+def _solve_block_task(args):
+    return solve_block(*args)
+
+
+def _solve_block_dp_task(args):
+    # The DP ignores the solver backend (last element).
+    return solve_block_dp(*args[:-1])
+
+
+class DecomposedModel:
+    """Drop-in replacement for the monolithic model, solved by trunk enumeration.
+
+    Args:
+        params: Dictionary containing all required parameters for the model.
+        all_toma_indices: List of tuples representing all (floor, apartment, TU) indices.
+        solver_settings: Solver settings (timeLimit, gapRel, ...) for each subproblem.
+            Subproblems run single-threaded; parallelism comes from the process pool.
+        max_workers: Pool size (default: number of CPUs).
+        block_solver: "milp" (one MILP per block, in the process pool) or "dp" (exact
+            dynamic programming, in-process: each block takes milliseconds).
+        solver: Backend of the block MILPs ("cbc" or "highs", see solver_backends.py).
+    """
+
+    def __init__(self, params, all_toma_indices, solver_settings=None, max_workers=None, block_solver="milp", solver="cbc"):
+        self.params = params
+        self.block_solver = block_solver
+        self.solver = solver
+        self.all_toma_indices = all_toma_indices
+        self.solver_settings = dict(solver_settings or {}, threads=1)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.status = 0
+        self.objective = None
+        self.log_lines = []
+
+        # Variables of the full model, used only as containers for the solution values.
+        pisos = list(range(params['Piso_Maximo'], 0, -1))
+        bloques = dividir_en_bloques(params['Piso_Maximo'])
+        x, y, z, nivel_tu, d_plus, d_minus, r_troncal, pot = _crear_variables(params, pisos, all_toma_indices, bloques)
+        p_troncal, long_ant_troncal, loss_ant_troncal, loss_conns_ant_troncal, _ = _perdidas_comunes(params, r_troncal)
+        self._aux = {
+            'x': x, 'y': y, 'z': z, 'nivel_tu': nivel_tu,
+            'd_plus': d_plus, 'd_minus': d_minus,
+            'r_troncal': r_troncal,
+            'pot_in_riser_by_block': pot,
+            'bloques_de_pisos': bloques,
+            'p_troncal': p_troncal,
+            'long_ant_troncal': long_ant_troncal,
+            'loss_ant_troncal': loss_ant_troncal,
+            'loss_conns_ant_troncal': loss_conns_ant_troncal
+        }
+
+    def solve(self, solver=None):
+        """Solves all subproblems and loads the best combination into `_aux`.
+
+        `solver` is accepted for compatibility with LpProblem.solve; a per-block summary
+        is sent to its log_callback (solver_backends) or written to its logPath in
+        place of the solver log.
+        """
+        bloques = self._aux['bloques_de_pisos']
+        candidates = trunk_candidates(self.params, len(bloques))
+
+        tasks = [
+            (self.params, self.all_toma_indices, b_idx, loss, self.solver_settings, self.solver)
+            for loss in candidates for b_idx in range(len(bloques))
+        ]
+        workers = min(self.max_workers, len(tasks)) or 1
+        if self.block_solver == "dp":
+            results = [_solve_block_dp_task(t) for t in tasks]
+        elif workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_solve_block_task, tasks))
+        else:
+            results = [_solve_block_task(t) for t in tasks]
+
+        best = None
+        for i, loss in enumerate(candidates):
+            per_block = results[i * len(bloques):(i + 1) * len(bloques)]
+            statuses = [LpStatus[r['status']] for r in per_block]
+            self.log_lines.append(f"trunk loss {loss} dB ({', '.join(candidates[loss])}): block status {statuses}")
+            if any(s != 'Optimal' for s in statuses):
+                continue
+            total = sum(r['objective'] for r in per_block)
+            self.log_lines.append(f"  total deviation {total:.3f}")
+            if best is None or total < best[0]:
+                best = (total, loss, per_block)
+
+        if best is None:
+            self.status = LpStatusInfeasible
+        else:
+            total, loss, per_block = best
+            diseno = {'troncal': candidates[loss][0], 'derivadores': {}, 'repartidores': {}}
+            for r in per_block:
+                diseno['derivadores'].update(r['derivadores'])
+                diseno['repartidores'].update(r['repartidores'])
+            self.objective = _asignar_diseno(self._aux, self.params, self.all_toma_indices, diseno)
+            self.status = LpStatusOptimal
+            self.log_lines.append(f"selected trunk {diseno['troncal']} (loss {loss} dB), objective {self.objective:.3f}")
+
+        resumen = f"Decomposition engine ({self.block_solver} block solver)\n" + "\n".join(self.log_lines) + "\n"
+        log_callback = getattr(solver, 'log_callback', None)
+        log_path = getattr(solver, 'optionsDict', {}).get('logPath') if solver is not None else None
+        if log_callback is not None:
+            log_callback(resumen)
+        elif log_path:
+            with open(log_path, 'w', encoding='utf-8') as f:
+                f.write(resumen)
+        return self.status
@@ -0,0 +1,118 @@
+"""Infeasibility diagnosis by elastic relaxation of the TU level limits.
+
+When the MILP has no feasible design, diagnosticar builds the same model with a
+non-negative slack on every `nivel_min_*` and `nivel_max_*` constraint of
+_restriccion_niveles_tu:
+
+    nivel_tu + falta >= Nivel_minimo        nivel_tu - exceso <= Nivel_maximo
+
+and minimizes the total slack in dB instead of the deviation from the target. The
+relaxed model is always feasible, and its solution is a design that violates the
+limits as little as possible in total. The report lists every TU still out of
+limits with its violation, and aggregates them per floor and per block, so one
+diagnostic solve shows how far the data is from feasible and where.
+
+The apartment tables prune repartidores by the level limits, so the relaxed model
+offers every adequate repartidor (apartment_tables.tablas_sin_poda). It is always
+built with PuLP and never reuses a cached model.
+"""
+from pulp import LpVariable, LpStatus, lpSum, value
+
+from Optimizacion_RITEL_10 import construir_modelo_milp
+from apartment_tables import tablas_apartamento, tablas_sin_poda, FEASIBILITY_TOL
+
+# Violations below this (dB) are rounding noise of the solver.
+TOLERANCIA_DB = 1e-6
+
+
+def modelo_elastico(params, all_toma_indices):
+    """MILP with elastic level limits; returns (modelo, {(p, a, t): (falta, exceso)})."""
+    tablas = tablas_sin_poda(tablas_apartamento(params, all_toma_indices))
+    modelo = construir_modelo_milp(params, all_toma_indices, tablas)
+    clases = modelo._aux['clases_tomas']
+    holguras = {}
+    for (p, a, t), miembros in clases.items():
+        # One slack pair per TU class, weighted like its deviation in the MILP.
+        falta = LpVariable(f"falta_min_{p}_{a}_{t}", lowBound=0)
+        exceso = LpVariable(f"exceso_max_{p}_{a}_{t}", lowBound=0)
+        modelo.get_constraint_by_name(f"nivel_min_{p}_{a}_{t}").addInPlace(falta)
+        modelo.get_constraint_by_name(f"nivel_max_{p}_{a}_{t}").subInPlace(exceso)
+        for toma in miembros:
+            holguras[toma] = (falta, exceso)
+    modelo.setObjective(lpSum(len(clases[k]) * (holguras[k][0] + holguras[k][1]) for k in clases))
+    return modelo, holguras
+
+
+def _agregar(tomas, clave):
+    grupos = {}
+    for t in tomas:
+        g = grupos.setdefault(t[clave], {clave: t[clave], "tus": 0, "max_violacion_db": 0.0, "violacion_total_db": 0.0})
+        if clave == "piso":
+            g["bloque"] = t["bloque"]
+        g["tus"] += 1
+        g["max_violacion_db"] = max(g["max_violacion_db"], t["violacion_db"])
+        g["violacion_total_db"] = round(g["violacion_total_db"] + t["violacion_db"], 3)
+    return sorted(grupos.values(), key=lambda g: -g["violacion_total_db"])
+
+
+def diagnosticar(params, all_toma_indices, solver):
+    """Solves the elastic model with ``solver`` and reports the level violations.
+
+    Returns a dict with the solver status, the total violation in dB and, largest
+    first, the TUs out of limits ("tus"), and their totals per floor ("pisos") and per
+    block ("bloques"). The violation lists are empty if the relaxed model has no
+    solution either (e.g. no catalog entry has enough outputs).
+    """
+    modelo, holguras = modelo_elastico(params, all_toma_indices)
+    modelo.solve(solver)
+    diagnostico = {
+        "status": LpStatus[modelo.status],
+        "violacion_total_db": None,
+        "tus": [], "pisos": [], "bloques": []
+    }
+    if LpStatus[modelo.status] != 'Optimal':
+        return diagnostico
+
+    # Blocks are numbered from 1, like the 'Bloque' column of the result rows.
+    bloque_de = {p: b for b, bloque in enumerate(modelo._aux['bloques_de_pisos'], start=1) for p in bloque}
+    nivel_tu = modelo._aux['nivel_tu']
+    tomas = []
+    for (p, a, t), (falta, exceso) in holguras.items():
+        f, e = value(falta) or 0.0, value(exceso) or 0.0
+        if max(f, e) <= TOLERANCIA_DB + FEASIBILITY_TOL:
+            continue
+        tomas.append({
+            "tu_id": f"P{p:02d}A{a}TU{t}",
+            "piso": p,
+            "apto": a,
+            "bloque": bloque_de[p],
+            "nivel": round(value(nivel_tu[p, a, t]), 3),
+            "limite": 'Nivel_minimo' if f >= e else 'Nivel_maximo',
+            "violacion_db": round(max(f, e), 3)
+        })
+    tomas.sort(key=lambda t: -t["violacion_db"])
+    diagnostico.update(
+        violacion_total_db=round(sum(t["violacion_db"] for t in tomas), 3),
+        tus=tomas,
+        pisos=_agregar(tomas, "piso"),
+        bloques=_agregar(tomas, "bloque")
+    )
+    return diagnostico
+
+
+def resumen_diagnostico(diagnostico):
+    """Solver log text for the result of diagnosticar."""
+    if diagnostico["violacion_total_db"] is None:
+        return f"Elastic diagnosis: no solution ({diagnostico['status']})\n"
+    lineas = [
+        f"Elastic diagnosis: {len(diagnostico['tus'])} TUs out of limits, "
+        f"total violation {diagnostico['violacion_total_db']:.3f} dB"
+    ]
+    for b in diagnostico["bloques"]:
+        lineas.append(
+            f"  block {b['bloque']}: {b['tus']} TUs, max {b['max_violacion_db']:.3f} dB, "
+            f"total {b['violacion_total_db']:.3f} dB"
+        )
+    for t in diagnostico["tus"][:10]:
+        lineas.append(f"  {t['tu_id']}: level {t['nivel']:.3f}, misses {t['limite']} by {t['violacion_db']:.3f} dB")
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,209 @@
+"""Greedy constructive heuristic used as the MIP start (warmStart) of the MILP.
+
+For every trunk splitter (one per insertion loss) the heuristic walks each block from
+its entry floor in propagation order, i.e. the way the signal travels from the trunk.
+On each floor it picks the derivador with the lowest total deviation of the floor's
+apartments, every apartment taking its best repartidor from its lookup table
+(apartment_tables.py), so all TU levels stay within [Nivel_minimo, Nivel_maximo] and
+as close to Potencia_Objetivo_TU as that floor allows. The trunk with the lowest total
+deviation is kept.
+
+A backward pass over each block first computes, per floor and derivador, the riser
+powers from which the remaining floors can still be completed (ventanas_derivador:
+unions of intervals built from the apartment tables); the walk only takes derivadores
+whose window contains the riser power, so it finds a feasible design whenever one
+exists for the trunk. bound_tightening.py uses the same windows as valid inequalities.
+
+The design takes milliseconds even for thousands of TUs. It is not optimal: each floor
+is chosen without looking at what its `paso` costs the floors further down the riser.
+"""
+from Funciones_apoyo_datos_entrada import dividir_en_bloques
+from Funciones_apoyo_optimizacion import (
+    _derivadores_validos, _troncales_validos, entrada_y_direccion_bloque,
+    _potencia_entrada_bloque, _asignar_diseno
+)
+from apartment_tables import tablas_apartamento, FEASIBILITY_TOL
+from catalog import compile_catalog
+
+SIN_LIMITES = [(float('-inf'), float('inf'))]
+
+
+def _unir(intervalos):
+    """Sorted, disjoint union of [(lo, hi)]."""
+    union = []
+    for lo, hi in sorted(intervalos):
+        if union and lo <= union[-1][1] + FEASIBILITY_TOL:
+            union[-1] = (union[-1][0], max(union[-1][1], hi))
+        else:
+            union.append((lo, hi))
+    return union
+
+
+def _cortar(a, b):
+    """Intersection of two unions of intervals."""
+    corte = []
+    for lo_a, hi_a in a:
+        for lo_b, hi_b in b:
+            lo, hi = max(lo_a, lo_b), min(hi_a, hi_b)
+            if lo <= hi + FEASIBILITY_TOL:
+                corte.append((lo, max(lo, hi)))
+    return _unir(corte)
+
+
+def _contiene(intervalos, q):
+    return any(lo - FEASIBILITY_TOL <= q <= hi + FEASIBILITY_TOL for lo, hi in intervalos)
+
+
+def _contexto(params, tablas):
+    """Derivadores [(d, derivacion, paso)], apartments per floor [(apto, table, cable+connector
+    loss to the repartidor)], feasible repartidor input powers per table and the riser loss
+    between floors."""
+    att = params['atenuacion_cable_por_metro']
+    loss_piso = (
+        params['largo_cable_entre_pisos'] * att
+        + params['conectores_por_union'] * params['atenuacion_conector']
+    )
+    catalogo = compile_catalog(params)
+    derivadores = [
+        (d, catalogo.derivadores.valor(d, 'derivacion'), catalogo.derivadores.valor(d, 'paso'))
+        for d in _derivadores_validos(params)
+    ]
+    apartamentos = {}
+    for (p, a), tabla in tablas.items():
+        loss_apto = params['largo_cable_derivador_repartidor'][(p, a)] * att + 4 * params['atenuacion_conector']
+        apartamentos.setdefault(p, []).append((a, tabla, loss_apto))
+    # Riser powers at which each apartment has a feasible repartidor.
+    factibles = {}
+    for tabla in tablas.values():
+        if id(tabla) not in factibles:
+            factibles[id(tabla)] = _unir((seg[0], seg[1]) for seg in tabla.segments)
+    return derivadores, apartamentos, factibles, loss_piso
+
+
+def ventanas_derivador(params, all_toma_indices, tablas=None):
+    """Riser powers from which each derivador keeps its block feasible.
+
+    Returns {(p, d): union of intervals}: the riser powers at floor ``p`` for which
+    derivador ``d`` leaves every apartment of the floor a feasible repartidor and the
+    next floor of the block within its own windows. An empty union means that ``d``
+    can never be chosen on ``p``.
+    """
+    if tablas is None:
+        tablas = tablas_apartamento(params, all_toma_indices)
+    derivadores, apartamentos, factibles, loss_piso = _contexto(params, tablas)
+    ventanas = {}
+    for bloque in dividir_en_bloques(params['Piso_Maximo']):
+        _, direccion = entrada_y_direccion_bloque(bloque, params['p_troncal'])
+        siguiente = SIN_LIMITES
+        for p in sorted(bloque, reverse=(direccion != 'down')):
+            union = []
+            for d, derivacion, paso in derivadores:
+                # Power at this floor that leaves the next one within `siguiente`.
+                potencias = [(lo + paso + loss_piso, hi + paso + loss_piso) for lo, hi in siguiente]
+                for _, tabla, loss_apto in apartamentos.get(p, []):
+                    desplazamiento = derivacion + loss_apto
+                    potencias = _cortar(potencias, [(lo + desplazamiento, hi + desplazamiento) for lo, hi in factibles[id(tabla)]])
+                    if not potencias:
+                        break
+                ventanas[p, d] = potencias
+                union.extend(potencias)
+            siguiente = _unir(union)
+    return ventanas
+
+
+def diseno_greedy(params, all_toma_indices, tablas=None, pesos=None):
+    """Builds the greedy design of the building.
+
+    Args:
+        params: Dictionary containing all required parameters for the model.
+        all_toma_indices: List of tuples representing all (floor, apartment, TU) indices.
+        tablas: Optional precomputed apartment splitter tables.
+        pesos: Optional preferences {'troncal': {r: w}, 'derivadores': {(p, d): w}}
+            (e.g. LP relaxation values, see lp_preview.py). Each floor then takes the
+            feasible derivador with the largest weight, and the first trunk by weight
+            with a feasible design is kept instead of the best one.
+
+    Returns:
+        Tuple (diseno, objetivo) with the design in the format of _asignar_diseno and its
+        total deviation, or (None, None) if the walk finds no feasible design.
+    """
+    if tablas is None:
+        tablas = tablas_apartamento(params, all_toma_indices)
+    bloques = dividir_en_bloques(params['Piso_Maximo'])
+    p_troncal = params['p_troncal']
+    catalogo = compile_catalog(params)
+    derivadores, apartamentos, _, loss_piso = _contexto(params, tablas)
+    ventanas = ventanas_derivador(params, all_toma_indices, tablas)
+
+    def opciones_piso(p, pot):
+        """[(deviation, paso, derivador, {(p, a): repartidor})] of the derivadores whose
+        window contains the riser power ``pot``."""
+        opciones = []
+        for d, derivacion, paso in derivadores:
+            if not _contiene(ventanas[p, d], pot):
+                continue
+            total, elecciones = 0.0, {}
+            for a, tabla, loss_apto in apartamentos.get(p, []):
+                costo, r = tabla.lookup(pot - derivacion - loss_apto)
+                if costo is None:
+                    break
+                total += costo
+                elecciones[p, a] = r
+            else:
+                opciones.append((total, paso, d, elecciones))
+        return opciones
+
+    bloques_orden = []
+    for bloque in bloques:
+        _, direccion = entrada_y_direccion_bloque(bloque, p_troncal)
+        bloques_orden.append((bloque, sorted(bloque, reverse=(direccion == 'down'))))
+
+    def recorrer_bloque(bloque, orden, loss_troncal, diseno):
+        """Walks one block from its entry floor; returns its deviation or None."""
+        pot = _potencia_entrada_bloque(params, bloque, p_troncal, loss_troncal)
+        total = 0.0
+        for p in orden:
+            opciones = opciones_piso(p, pot)
+            if not opciones:
+                return None
+            costo, paso, d, elecciones = min(opciones, key=lambda o: (-peso_derivador.get((p, o[2]), 0.0), o[0], o[1]))
+            diseno['derivadores'][p] = d
+            diseno['repartidores'].update(elecciones)
+            total += costo
+            pot -= paso + loss_piso
+        return total
+
+    # The compiled catalog keeps a single trunk splitter per insertion loss.
+    troncales = _troncales_validos(params, len(bloques))
+    peso_derivador = {}
+    if pesos is not None:
+        troncales = sorted(troncales, key=lambda r: -pesos['troncal'].get(r, 0.0))
+        peso_derivador = pesos['derivadores']
+
+    mejor, mejor_objetivo = None, None
+    for r in troncales:
+        loss_troncal = catalogo.repartidores.valor(r, 'perdida_insercion')
+        diseno = {'troncal': r, 'derivadores': {}, 'repartidores': {}}
+        objetivo = 0.0
+        for bloque, orden in bloques_orden:
+            costo = recorrer_bloque(bloque, orden, loss_troncal, diseno)
+            if costo is None:
+                break
+            objetivo += costo
+        else:
+            if mejor_objetivo is None or objetivo < mejor_objetivo:
+                mejor, mejor_objetivo = diseno, objetivo
+            if pesos is not None:
+                break
+    return mejor, mejor_objetivo
+
+
+def fijar_arranque(modelo, params, all_toma_indices, diseno):
+    """Loads ``diseno`` into ``modelo`` as its MIP start and returns its objective.
+
+    Works for the LpProblem of construir_modelo_milp (variable values, read by solvers
+    created with warmStart=True) and for sparse_model.SparseModel (`asignar_diseno`).
+    """
+    if hasattr(modelo, 'asignar_diseno'):
+        return modelo.asignar_diseno(diseno)
+    return _asignar_diseno(modelo._aux, params, all_toma_indices, diseno)
@@ -0,0 +1,164 @@
+"""Infeasibility pre-screen by interval propagation, run before the MILP is built.
+
+Every TU level is the block entry power minus a chain of losses, and each loss of
+that chain lies between the smallest and the largest value the catalog offers for it:
+
+- trunk insertion loss: over the trunk repartidores with enough outputs for all blocks;
+- riser: one derivador `paso` (plus cable and connectors) per floor between the block
+  entry and the TU's floor;
+- the floor derivador's `derivacion`;
+- the apartment repartidor's insertion loss (0 for apartments with a single TU);
+- the fixed cable and connector losses of the TU.
+
+Taking every loss at its minimum gives the highest level a TU can reach, and at its
+maximum the lowest one. If the highest level is below Nivel_minimo, or the lowest
+one above Nivel_maximo, no design can serve that TU and the instance is rejected
+without building the model. The check only uses the catalog and the geometry, so
+it takes milliseconds even for thousands of TUs. It is a relaxation: passing it does
+not guarantee that the MILP is feasible.
+
+The same ranges (rangos_riser, rangos_nivel) bound the riser power and TU level
+variables in bound_tightening.py.
+"""
+from Funciones_apoyo_datos_entrada import dividir_en_bloques
+from Funciones_apoyo_optimizacion import (
+    _derivadores_validos, _troncales_validos, entrada_y_direccion_bloque, _potencia_entrada_bloque
+)
+from apartment_tables import _candidatos, FEASIBILITY_TOL
+from catalog import compile_catalog
+
+# TUs listed in the rejection message; the full list is returned by cribar_niveles.
+MAX_TUS_MENSAJE = 5
+
+
+def _rango(columnas, nombres, atributo):
+    valores = [columnas.valor(n, atributo) for n in nombres]
+    return min(valores), max(valores)
+
+
+def _rangos_repartidor(params):
+    """Apartment repartidor loss range per number of TUs (None: no repartidor has enough outputs)."""
+    rangos = {}
+    for n in set(params['tus_requeridos_por_apartamento'].values()):
+        perdidas = [loss for _, loss in _candidatos(params, n)]
+        rangos[n] = (min(perdidas), max(perdidas)) if perdidas else None
+    return rangos
+
+
+def rangos_riser(params):
+    """Riser power range of every floor over all designs: {p: (lowest, highest)}.
+
+    Returns None if no derivador or no trunk repartidor has enough outputs.
+    """
+    catalogo = compile_catalog(params)
+    bloques = dividir_en_bloques(params['Piso_Maximo'])
+    p_troncal = params['p_troncal']
+    derivadores = _derivadores_validos(params)
+    troncales = _troncales_validos(params, len(bloques))
+    if not derivadores or not troncales:
+        return None
+
+    troncal_min, troncal_max = _rango(catalogo.repartidores, troncales, 'perdida_insercion')
+    paso_min, paso_max = _rango(catalogo.derivadores, derivadores, 'paso')
+    loss_piso = (
+        params['largo_cable_entre_pisos'] * params['atenuacion_cable_por_metro']
+        + params['conectores_por_union'] * params['atenuacion_conector']
+    )
+    riser = {}
+    for bloque in bloques:
+        p_ent, _ = entrada_y_direccion_bloque(bloque, p_troncal)
+        alto = _potencia_entrada_bloque(params, bloque, p_troncal, troncal_min)
+        bajo = _potencia_entrada_bloque(params, bloque, p_troncal, troncal_max)
+        for p in bloque:
+            pisos = abs(p - p_ent)
+            riser[p] = (bajo - pisos * (paso_max + loss_piso), alto - pisos * (paso_min + loss_piso))
+    return riser
+
+
+def rangos_nivel(params, all_toma_indices, riser):
+    """Level range of every TU over all designs: {(p, a, t): (lowest, highest)}.
+
+    ``riser`` is the result of rangos_riser. Apartments without an adequate repartidor
+    are bounded as if they had none.
+    """
+    catalogo = compile_catalog(params)
+    derivacion_min, derivacion_max = _rango(catalogo.derivadores, _derivadores_validos(params), 'derivacion')
+    rep_rango = _rangos_repartidor(params)
+    att = params['atenuacion_cable_por_metro']
+    niveles = {}
+    for (p, a, t) in all_toma_indices:
+        rep_min, rep_max = rep_rango[params['tus_requeridos_por_apartamento'][(p, a)]] or (0.0, 0.0)
+        fijas = (
+            params['largo_cable_derivador_repartidor'][(p, a)] * att
+            + 4 * params['atenuacion_conector']
+            + params['largo_cable_tu'][(p, a, t)] * att
+            + params['atenuacion_conexion_tu']
+        )
+        bajo, alto = riser[p]
+        niveles[p, a, t] = (bajo - derivacion_max - rep_max - fijas, alto - derivacion_min - rep_min - fijas)
+    return niveles
+
+
+def cribar_niveles(params, all_toma_indices):
+    """Finds the TUs that cannot reach [Nivel_minimo, Nivel_maximo] with any design.
+
+    Args:
+        params: Dictionary containing all required parameters for the model.
+        all_toma_indices: List of tuples representing all (floor, apartment, TU) indices.
+
+    Returns:
+        Tuple (problemas, tomas). ``problemas`` lists catalog problems that make every
+        design impossible (no derivador, trunk or repartidor with enough outputs).
+        ``tomas`` has one dict per offending TU with its reachable level range and the
+        dB margin it misses the limit by, largest margin first.
+    """
+    bloques = dividir_en_bloques(params['Piso_Maximo'])
+    n_min = float(params['Nivel_minimo'])
+    n_max = float(params['Nivel_maximo'])
+
+    problemas = []
+    if not _derivadores_validos(params):
+        problemas.append(f"No derivador has {params['apartamentos_por_piso']} outputs for the apartments of a floor")
+    if not _troncales_validos(params, len(bloques)):
+        problemas.append(f"No trunk repartidor has {len(bloques)} outputs for the blocks")
+    rep_rango = _rangos_repartidor(params)
+    sin_repartidor = sorted(
+        (p, a) for (p, a), n in params['tus_requeridos_por_apartamento'].items() if rep_rango[n] is None
+    )
+    if sin_repartidor:
+        problemas.append(f"No repartidor has enough outputs for apartments {sin_repartidor[:MAX_TUS_MENSAJE]}")
+    riser = rangos_riser(params)
+    if riser is None:
+        return problemas, []
+
+    tomas = []
+    for (p, a, t), (nivel_bajo, nivel_alto) in rangos_nivel(params, all_toma_indices, riser).items():
+        if nivel_alto < n_min - FEASIBILITY_TOL:
+            limite, margen = 'Nivel_minimo', n_min - nivel_alto
+        elif nivel_bajo > n_max + FEASIBILITY_TOL:
+            limite, margen = 'Nivel_maximo', nivel_bajo - n_max
+        else:
+            continue
+        tomas.append({
+            "tu_id": f"P{p:02d}A{a}TU{t}",
+            "piso": p,
+            "apto": a,
+            "nivel_min_alcanzable": round(nivel_bajo, 3),
+            "nivel_max_alcanzable": round(nivel_alto, 3),
+            "limite": limite,
+            "margen_db": round(margen, 3)
+        })
+    tomas.sort(key=lambda t: -t['margen_db'])
+    return problemas, tomas
+
+
+def mensaje_rechazo(problemas, tomas):
+    """Rejection message for the result of cribar_niveles."""
+    partes = list(problemas)
+    if tomas:
+        peores = ", ".join(
+            f"{t['tu_id']} misses {t['limite']} by {t['margen_db']:.2f} dB" for t in tomas[:MAX_TUS_MENSAJE]
+        )
+        resto = f" and {len(tomas) - MAX_TUS_MENSAJE} more" if len(tomas) > MAX_TUS_MENSAJE else ""
+        partes.append(f"{len(tomas)} TUs cannot reach the level limits with any design: {peores}{resto}")
+    return "Infeasible instance: " + "; ".join(partes)
@@ -0,0 +1,46 @@
+"""Provisional design from the LP relaxation of the MILP, for a first result in about a second.
+
+relajacion_lp solves the LP relaxation of the milp model (PuLP or sparse builder)
+in-process with HiGHS: without integrality it takes a small fraction of the MILP time,
+even on thousands of TUs. Its trunk and derivador values are fractional, so
+diseno_preliminar rounds them to a feasible design with the walk of greedy_start.py:
+each floor takes the feasible derivador with the largest LP value, and the trunk with
+the largest LP value that admits a feasible design is used.
+
+optimizer_canonical emits this design as a provisional message before the exact solve.
+"""
+import numpy as np
+from pulp import LpStatusOptimal, value
+
+from greedy_start import diseno_greedy
+from solver_backends import HighsSolver
+
+
+def relajacion_lp(modelo):
+    """Solves the LP relaxation of ``modelo``.
+
+    Returns the LP values as greedy_start weights ({'troncal': {r: v}, 'derivadores':
+    {(p, d): v}}), or None if the relaxation has no optimal solution.
+    """
+    solver = HighsSolver(mip=False)
+    if hasattr(modelo, 'matriz'):
+        matriz = dict(modelo.matriz(), enteras=np.zeros(modelo.n_cols, dtype=np.uint8))
+        status, valores = solver.resolver_matriz(matriz)
+        if status != LpStatusOptimal or valores is None:
+            return None
+        modelo._cargar_solucion(np.asarray(valores))
+    elif modelo.solve(solver) != LpStatusOptimal:
+        return None
+    aux = modelo._aux
+    return {
+        'troncal': {r: value(v) or 0.0 for r, v in aux['r_troncal'].items()},
+        'derivadores': {k: value(v) or 0.0 for k, v in aux['x'].items()}
+    }
+
+
+def diseno_preliminar(modelo, params, all_toma_indices):
+    """Feasible design rounded from the LP relaxation: (diseno, objetivo) or (None, None)."""
+    pesos = relajacion_lp(modelo)
+    if pesos is None:
+        return None, None
+    return diseno_greedy(params, all_toma_indices, pesos=pesos)
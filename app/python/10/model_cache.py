@@ -0,0 +1,95 @@
+"""In-memory cache of built MILP models keyed by the structural part of the building.
+
+`potencia_entrada`, `Nivel_minimo`, `Nivel_maximo` and `Potencia_Objetivo_TU` only
+enter the model as constants of a few constraint families, so a model built for one
+set of values can be reused for another by rewriting those constants. Floors,
+apartments, TUs, catalogs, cable lengths and attenuations are structural: any change
+there builds a new model.
+
+Useful in long-lived processes (optimizer_worker.py) and for what-if sweeps over
+power or tolerances, which then skip construir_modelo_milp entirely.
+
+Environment:
+    TDT_MODEL_CACHE_SIZE  Number of models kept in memory (default 4). 0 disables the cache.
+"""
+import os
+from collections import OrderedDict
+
+from Optimizacion_RITEL_10 import construir_modelo_milp, make_json_safe, normalize_numbers, compute_canonical_hash
+from apartment_tables import tablas_apartamento, firma
+
+MAX_MODELS = int(os.environ.get('TDT_MODEL_CACHE_SIZE', '4'))
+
+# Scalar params that only appear as constraint constants, and the name prefixes of
+# the constraints they appear in. In every family the param sits on the right-hand
+# side with a positive sign, so a change in the param shifts the RHS by the same amount.
+PARAMETRIC_CONSTRAINTS = {
+    'potencia_entrada': ('pot_block_init_',),
+    'Nivel_minimo': ('nivel_min_',),
+    'Nivel_maximo': ('nivel_max_',),
+    'Potencia_Objetivo_TU': ('dev_abs_',),
+}
+
+_models = OrderedDict()
+
+
+def structural_key(params, tablas):
+    """Hash of params without the parametric scalars.
+
+    The repartidores kept by the apartment lookup tables (`tablas`) depend on the
+    level limits and target, so their signature is part of the key.
+    """
+    structural = {k: v for k, v in params.items() if k not in PARAMETRIC_CONSTRAINTS}
+    structural['__repartidores_apto'] = firma(tablas)
+    return compute_canonical_hash(normalize_numbers(make_json_safe(structural)))
+
+
+def _snapshot(modelo, params):
+    """Records the base value of each parametric scalar and the RHS values it feeds."""
+    families = {}
+    for key, prefixes in PARAMETRIC_CONSTRAINTS.items():
+        families[key] = [
+            (c, -c.constant) for c in modelo.constraints()
+            if c.name.startswith(prefixes)
+        ]
+    return {'base': {key: params[key] for key in PARAMETRIC_CONSTRAINTS}, 'families': families}
+
+
+def _apply(entry, params):
+    """Rewrites the constraint RHS values for the scalar values in ``params``."""
+    for key, constraints in entry['families'].items():
+        delta = params[key] - entry['base'][key]
+        for c, base_rhs in constraints:
+            c.changeRHS(base_rhs + delta)
+
+
+def get_model(params, all_toma_indices, reducida=False):
+    """Returns a MILP model for ``params``, reusing a cached one when only scalars changed.
+
+    Args:
+        params: Dictionary containing all required parameters for the model.
+        all_toma_indices: List of tuples representing all (floor, apartment, TU) indices.
+        reducida: Builds the reduced formulation (see construir_modelo_milp); both
+            formulations of a building are cached separately.
+
+    Returns:
+        Tuple (modelo, reused) with the PuLP LpProblem and whether it came from the cache.
+    """
+    if MAX_MODELS <= 0:
+        return construir_modelo_milp(params, all_toma_indices, reducida=reducida), False
+
+    tablas = tablas_apartamento(params, all_toma_indices)
+    key = (structural_key(params, tablas), reducida)
+    entry = _models.get(key)
+    if entry is not None:
+        _models.move_to_end(key)
+        _apply(entry, params)
+        return entry['modelo'], True
+
+    modelo = construir_modelo_milp(params, all_toma_indices, tablas, reducida)
+    entry = _snapshot(modelo, params)
+    entry['modelo'] = modelo
+    _models[key] = entry
+    while len(_models) > MAX_MODELS:
+        _models.popitem(last=False)
+    return modelo, False
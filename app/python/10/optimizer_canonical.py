@@ -2,35 +2,284 @@
 import sys
 import json
 import os
+import time
 import traceback
-import io
-import tempfile
-import pandas as pd
-import pulp
-from pulp import LpStatus, PULP_CBC_CMD
+from pulp import LpStatus, value
 
-# Import from existing project structure
+# Import from existing project structure. Only the canonical solve path is loaded:
+# the Excel/plot/HTML tooling of Optimizacion_RITEL_10 is never imported here.
 sys.path.append(os.path.dirname(__file__))
 import Optimizacion_RITEL_10
 from Funciones_apoyo_datos_entrada import generar_indices_y_validar_datos
+import solution_cache
+import model_cache
+from decomposition_engine import DecomposedModel
+import solver_backends
+import greedy_start
+from infeasibility_screen import cribar_niveles, mensaje_rechazo
+import bound_tightening
+from result_pipeline import ResultPipeline
+from result_contract import detail_rows_v2, building_v3, stream_records
 
-# Mock out export functions to avoid file I/O and permission issues
-Optimizacion_RITEL_10._exportar_a_excel = lambda *args, **kwargs: None
-Optimizacion_RITEL_10._generar_graficos = lambda *args, **kwargs: None
-Optimizacion_RITEL_10._dibujar_esquema_conexiones_ascii = lambda *args, **kwargs: None
-Optimizacion_RITEL_10._generar_arbol_completo_con_specs = lambda *args, **kwargs: None
+# Solver settings for every run (PuLP names, used by every backend). Part of the solution cache key.
+SOLVER_SETTINGS = {"timeLimit": 60, "gapRel": 0.05, "threads": 4}
 
-def main():
+# Per-request options, read from an optional "optimizer_options" object in the input JSON.
+#   engine: "milp" (single model, default), "decomposition" (trunk enumeration +
+#           independent per-block MILPs in a process pool) or "dp" (trunk enumeration +
+#           exact dynamic programming per block).
+#   builder: "pulp" (default) or "sparse" (sparse_model.SparseModel: NumPy arrays + bulk
+#            MPS write, for very large buildings). Only used by the "milp" engine.
+#   formulation: "standard" (default) or "reduced" (TU levels substituted out as affine
+#                expressions, see construir_modelo_milp). "milp" engine, "pulp" builder.
+#   solver: "cbc" (default, PULP_CBC_CMD subprocess), "highs" (in-process HiGHS) or
+#           "portfolio" (race of several configurations, milp engine only); see
+#           solver_backends.py. Also used for the block MILPs of "decomposition".
+#   warm_start: true (default) starts the "milp" engine from the greedy design of
+#               greedy_start.py (MIP start); its objective is reported in the solver log.
+#   preview: true emits a provisional result first ("provisional": true), rounded from
+#            the LP relaxation (lp_preview.py), before the exact solve ("milp" engine).
+#   anytime: true writes every improving solution of the solver as an
+#            {"event": "incumbent", ...} line while it runs, and the result always carries
+#            the best incumbent with its proven bound and relative gap ("milp" engine).
+#            A solve stopped by the time limit reports summary status "Feasible".
+#   time_limit: seconds for the solver, overriding SOLVER_SETTINGS["timeLimit"].
+#   diagnose: true re-solves an infeasible instance with elastic level limits
+#             (elastic_diagnosis.py) and adds the minimum violation per TU, floor and
+#             block to the failure response ("diagnosis").
+#   tighten: true (default) bounds the riser power, TU level and deviation variables
+#            and fixes derivadores and trunks that cannot be feasible before the solve
+#            (bound_tightening.py). "milp" engine with the "pulp" builder only.
+#   valid_inequalities: true also adds the per-floor riser power inequalities of
+#                       bound_tightening.py (only with tighten).
+#   contract_version: 2 (default, one flat row per TU in "detail") or 3 (values nested
+#                     by block, floor and apartment in "building"; see result_contract.py).
+#   stream: true writes a success result as NDJSON records (header, one record per TU
+#           for v2 or per floor for v3, summary, end; see result_contract.stream_records)
+#           instead of one JSON line. Streamed results are not cached.
+DEFAULT_OPTIONS = {
+    "engine": "milp", "builder": "pulp", "formulation": "standard", "solver": "cbc", "warm_start": True,
+    "preview": False, "anytime": False, "time_limit": None, "diagnose": False, "tighten": True,
+    "valid_inequalities": False, "contract_version": 2, "stream": False
+}
+ENGINES = ("milp", "decomposition", "dp")
+BUILDERS = ("pulp", "sparse")
+FORMULATIONS = ("standard", "reduced")
+CONTRACT_VERSIONS = (2, 3)
+
+def _read_options(params):
+    """Pops the request options out of params and merges them over the defaults."""
+    options = dict(DEFAULT_OPTIONS, **(params.pop('optimizer_options', None) or {}))
+    if options["engine"] not in ENGINES:
+        raise ValueError(f"Unknown engine '{options['engine']}'. Expected one of {ENGINES}")
+    if options["builder"] not in BUILDERS:
+        raise ValueError(f"Unknown builder '{options['builder']}'. Expected one of {BUILDERS}")
+    if options["formulation"] not in FORMULATIONS:
+        raise ValueError(f"Unknown formulation '{options['formulation']}'. Expected one of {FORMULATIONS}")
+    if options["contract_version"] not in CONTRACT_VERSIONS:
+        raise ValueError(f"Unknown contract_version '{options['contract_version']}'. Expected one of {CONTRACT_VERSIONS}")
+    if options["solver"] not in solver_backends.SOLVERS:
+        raise ValueError(f"Unknown solver '{options['solver']}'. Expected one of {solver_backends.SOLVERS}")
+    if options["solver"] == "portfolio" and options["engine"] != "milp":
+        raise ValueError("The portfolio solver is only available with the milp engine")
+    if options["time_limit"] is not None and not (
+        isinstance(options["time_limit"], (int, float)) and options["time_limit"] > 0
+    ):
+        raise ValueError(f"Invalid time_limit '{options['time_limit']}'. Expected a positive number of seconds")
+    return options
+
+def _build_model(params, all_toma_indices, options):
+    if options["engine"] == "decomposition":
+        return DecomposedModel(params, all_toma_indices, SOLVER_SETTINGS, solver=options["solver"])
+    if options["engine"] == "dp":
+        return DecomposedModel(params, all_toma_indices, SOLVER_SETTINGS, block_solver="dp")
+    if options["builder"] == "sparse":
+        # Imported here so the default path does not load NumPy at startup.
+        from sparse_model import SparseModel
+        return SparseModel(params, all_toma_indices)
+    modelo, _ = model_cache.get_model(params, all_toma_indices, reducida=options["formulation"] == "reduced")
+    if not options["tighten"]:
+        # A cached model keeps the bounds of its last solve.
+        bound_tightening.aflojar_modelo(modelo)
+    return modelo
+
+def _tighten(modelo, params, all_toma_indices, options):
+    """Applies the bound-tightening presolve; returns the solver log text."""
+    start_time = time.perf_counter()
+    stats = bound_tightening.apretar_modelo(
+        modelo, params, all_toma_indices, desigualdades=options["valid_inequalities"]
+    )
+    elapsed = time.perf_counter() - start_time
+    return (
+        f"Bound tightening: {stats.get('cotas', 0)} bounds, {stats.get('binarias_fijadas', 0)} binaries fixed, "
+        f"{stats.get('desigualdades', 0)} valid inequalities ({elapsed:.3f}s)\n\n"
+    )
+
+def _model_stats_log(modelo, params, all_toma_indices):
+    """Model-size summary (generated vs. full-catalog formulation) for the solver log."""
+    if hasattr(modelo, 'estadisticas'):
+        generado = modelo.estadisticas()
+    elif hasattr(modelo, 'constraints'):
+        generado = Optimizacion_RITEL_10.estadisticas_modelo(modelo)
+    else:
+        return ""
+    lines = ["Model size (generated / full catalog):"]
+    denso = Optimizacion_RITEL_10.estadisticas_modelo_denso(params, all_toma_indices)
+    for key in generado:
+        lines.append(f"  {key}: {generado[key]} / {denso[key]}")
+    return "\n".join(lines) + "\n\n"
+
+def _progress_line(event):
+    """Solver log line for an improving solution reported by the backend."""
+    bound = "n/a" if event['bound'] is None else f"{event['bound']:.3f}"
+    gap = "n/a" if event['gap'] is None else f"{100 * event['gap']:.2f}%"
+    return f"[progress] {event['time']:.2f}s incumbent {event['incumbent']:.3f} bound {bound} gap {gap}\n"
+
+def _preview(modelo, params, all_toma_indices):
+    """Loads the design rounded from the LP relaxation into the model.
+
+    Returns (diseno or None, objective, solver log text). The preview is optional: if
+    it fails (e.g. highspy is not installed), the failure is logged and the exact
+    solve goes on without it.
+    """
+    start_time = time.perf_counter()
+    try:
+        from lp_preview import diseno_preliminar
+        diseno, objetivo = diseno_preliminar(modelo, params, all_toma_indices)
+    except Exception as e:
+        sys.stderr.write(f"LP preview failed: {e}\n")
+        sys.stderr.write(traceback.format_exc())
+        elapsed = time.perf_counter() - start_time
+        return None, None, f"LP preview: failed ({type(e).__name__}: {e}), skipped ({elapsed:.3f}s)\n\n"
+    elapsed = time.perf_counter() - start_time
+    if diseno is None:
+        return None, None, f"LP preview: no feasible design rounded from the relaxation ({elapsed:.3f}s)\n\n"
+    greedy_start.fijar_arranque(modelo, params, all_toma_indices, diseno)
+    return diseno, objetivo, f"LP preview: objective {objetivo:.3f}, trunk {diseno['troncal']} ({elapsed:.3f}s)\n\n"
+
+def _warm_start(modelo, params, all_toma_indices, preview=None):
+    """Loads the greedy design as MIP start, or the LP preview design ``(diseno, objective)``
+    when it is better. Returns (diseno or None, objective, solver log text)."""
+    start_time = time.perf_counter()
+    diseno, objetivo = greedy_start.diseno_greedy(params, all_toma_indices)
+    elapsed = time.perf_counter() - start_time
+    if diseno is None:
+        log = f"Greedy warm start: no feasible design found ({elapsed:.3f}s)"
+    else:
+        log = f"Greedy warm start: objective {objetivo:.3f}, trunk {diseno['troncal']} ({elapsed:.3f}s)"
+    if preview is not None and (objetivo is None or preview[1] < objetivo):
+        diseno, objetivo = preview
+        log += f"; starting from the LP preview design instead (objective {objetivo:.3f})"
+    if diseno is None:
+        return None, None, log + "\n\n"
+    return diseno, greedy_start.fijar_arranque(modelo, params, all_toma_indices, diseno), log + "\n\n"
+
+def _objective_line(modelo, heuristic_objective):
+    """Final objective next to the greedy one, appended to the solver log."""
+    final = value(modelo.objective)
+    if final is None:
+        return ""
+    line = f"\nFinal objective: {final:.3f}"
+    if heuristic_objective is not None:
+        line += f" (warm start {heuristic_objective:.3f}"
+        if heuristic_objective > 0:
+            mejora = max(heuristic_objective - final, 0.0) / heuristic_objective
+            line += f", improved by {100 * mejora:.1f}%"
+        line += ")"
+    return line + "\n"
+
+def _summary(resultados, status, contract_version, summary_extra=None):
+    niveles = resultados.get('summary')
+    summary = {
+        "contract_version": contract_version,
+        "piso_max": niveles["piso_max"],
+        "total_tus": niveles["total_tus"],
+        "status": status,
+        "avg_nivel_tu": niveles["avg_nivel_tu"],
+        "min_nivel_tu": niveles["min_nivel_tu"],
+        "max_nivel_tu": niveles["max_nivel_tu"]
+    }
+    summary.update(summary_extra or {})
+    return summary
+
+def _result_payload(resultados, status, solver_status, solver_log, contract_version=2, summary_extra=None):
+    """Success payload for the ``detail`` and ``summary`` artifacts of a design.
+
+    ``resultados`` is the ResultPipeline of the design. ``status`` is the summary status:
+    "Optimal" for the exact solve, "Provisional" for the LP-relaxation preview. Contract
+    v2 has one flat row per TU; v3 nests the same values by block, floor and apartment
+    (see result_contract.py). ``summary_extra`` is added to the summary (anytime bounds).
+    """
+    filas_detalle = resultados.get('detail')
+    min_n = float(resultados.params['Nivel_minimo'])
+    max_n = float(resultados.params['Nivel_maximo'])
+
+    sys.stderr.write(f"Detail columns: {list(filas_detalle[0]) if filas_detalle else []}\n")
+
+    payload = {"success": True, "summary": _summary(resultados, status, contract_version, summary_extra)}
+    if contract_version == 3:
+        payload["building"] = building_v3(filas_detalle, resultados.all_toma_indices, min_n, max_n)
+    else:
+        payload["detail"] = detail_rows_v2(filas_detalle, min_n, max_n)
+    payload["solver_status"] = solver_status
+    payload["solver_log"] = solver_log
+    return payload
+
+def _stream_result(out, resultados, status, solver_status, solver_log, contract_version=2,
+                   summary_extra=None, provisional=False):
+    """Writes the success result of _result_payload as NDJSON records, flushing after every floor.
+
+    Only one floor of records is held at a time; collect_stream rebuilds the payload.
+    """
+    filas_detalle = resultados.get('detail')
+    sys.stderr.write(f"Detail columns: {list(filas_detalle[0]) if filas_detalle else []}\n")
+    records = stream_records(
+        filas_detalle, resultados.all_toma_indices, _summary(resultados, status, contract_version, summary_extra),
+        solver_status, solver_log, float(resultados.params['Nivel_minimo']),
+        float(resultados.params['Nivel_maximo']), provisional
+    )
+    for chunk in records:
+        out.write("".join(json.dumps(record) + "\n" for record in chunk))
+        out.flush()
+
+def _diagnosis(params, all_toma_indices, options, solver_settings):
+    """Elastic diagnosis of an infeasible instance: (diagnosis dict, solver log text)."""
+    from elastic_diagnosis import diagnosticar, resumen_diagnostico
+    start_time = time.perf_counter()
+    solver = solver_backends.make_solver(options["solver"], solver_settings)
+    diagnostico = diagnosticar(params, all_toma_indices, solver)
+    log = resumen_diagnostico(diagnostico)
+    return diagnostico, f"\n{log}Elastic diagnosis time: {time.perf_counter() - start_time:.3f}s\n"
+
+def _emit(out, payload):
+    out.write(json.dumps(payload) + "\n")
+    out.flush()
+
+def run(raw_input, out):
+    """Runs one optimization request and writes the JSON response to ``out``.
+
+    This is the stdin JSON -> stdout JSON contract shared by the CLI entry point
+    and the persistent worker (optimizer_worker.py). With the ``stream`` option a
+    success result is written as NDJSON records instead. Returns the process exit code.
+    """
     solver_log_content = ""
-    log_path = ""
 
     try:
-        raw_input = sys.stdin.read()
         if not raw_input:
-            print(json.dumps({"success": False, "message": "No input received via stdin"}))
-            sys.exit(1)
+            _emit(out, {"success": False, "message": "No input received via stdin"})
+            return 1
 
         params = json.loads(raw_input)
+        options = _read_options(params)
+
+        # Unchanged datasets are answered from the solution cache.
+        cache_settings = {"solver": SOLVER_SETTINGS, "options": options}
+        cache_key = solution_cache.make_key(params, cache_settings) if solution_cache.enabled() else None
+        cached = solution_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            cached["cache_hit"] = True
+            _emit(out, cached)
+            return 0
 
         # Convert string keys back to tuples for Python logic
         if 'largo_cable_derivador_repartidor' in params:
@@ -57,117 +306,143 @@ def main():
         # 3. Generate indices and validate
         all_toma_indices = generar_indices_y_validar_datos(params)
 
-        # 4. Construct model
-        modelo = Optimizacion_RITEL_10.construir_modelo_milp(params, all_toma_indices)
+        # Instances that no design can serve are rejected before the model is built
+        solver_settings = SOLVER_SETTINGS
+        if options["time_limit"] is not None:
+            solver_settings = dict(solver_settings, timeLimit=options["time_limit"])
+        problemas, tomas_infactibles = cribar_niveles(params, all_toma_indices)
+        if problemas or tomas_infactibles:
+            payload = {
+                "success": False,
+                "message": mensaje_rechazo(problemas, tomas_infactibles),
+                "solver_status": "Infeasible",
+                "infeasible_tus": tomas_infactibles
+            }
+            if options["diagnose"] and not problemas:
+                payload["diagnosis"], diagnosis_log = _diagnosis(params, all_toma_indices, options, solver_settings)
+                solver_log_content += diagnosis_log
+            payload["solver_log"] = solver_log_content
+            _emit(out, payload)
+            return 0
+
+        # 4. Construct model (or reuse a cached one if only levels/input power changed)
+        modelo = _build_model(params, all_toma_indices, options)
+        solver_log_content = _model_stats_log(modelo, params, all_toma_indices)
+        if options["tighten"] and options["engine"] == "milp" and options["builder"] == "pulp":
+            solver_log_content += _tighten(modelo, params, all_toma_indices, options)
+
+        # 5. Provisional result from the LP relaxation, emitted before the exact solve
+        preview = None
+        if options["preview"] and options["engine"] == "milp":
+            diseno_preview, objetivo_preview, preview_log = _preview(modelo, params, all_toma_indices)
+            solver_log_content += preview_log
+            if diseno_preview is not None:
+                preview = (diseno_preview, objetivo_preview)
+                resultados = ResultPipeline(modelo, params, all_toma_indices)
+                if options["stream"]:
+                    _stream_result(
+                        out, resultados, "Provisional", "Provisional", solver_log_content,
+                        options["contract_version"], provisional=True
+                    )
+                else:
+                    payload = _result_payload(
+                        resultados, "Provisional", "Provisional", solver_log_content, options["contract_version"]
+                    )
+                    payload["provisional"] = True
+                    _emit(out, payload)
 
-        # 5. Solve with log capture via temp file
-        tmp_log = tempfile.NamedTemporaryFile(delete=False, suffix='.log')
-        log_path = tmp_log.name
-        tmp_log.close()  # Close immediately so CBC can write to it freely
+        # 6. Greedy (or LP preview) design as MIP start (milp engine only)
+        diseno_arranque, heuristic_objective = None, None
+        if options["warm_start"] and options["engine"] == "milp":
+            diseno_arranque, heuristic_objective, warm_log = _warm_start(modelo, params, all_toma_indices, preview)
+            solver_log_content += warm_log
+            if diseno_arranque is not None:
+                solver_settings = dict(solver_settings, warmStart=True)
 
-        original_solve = modelo.solve
-        modelo.solve = lambda: original_solve(PULP_CBC_CMD(msg=False, timeLimit=60, gapRel=0.05, threads=4, logPath=log_path))
+        # 7. Solve with the selected backend; log and progress come back through callbacks
+        anytime = options["anytime"] and options["engine"] == "milp"
+        log_chunks = []
 
-        # 6. Extract results (resolver_y_exportar will call modelo.solve() internally)
-        result_data = Optimizacion_RITEL_10.resolver_y_exportar(modelo, params, all_toma_indices, "unused.xlsx")
+        def on_progress(event):
+            log_chunks.append(_progress_line(event))
+            if anytime:
+                _emit(out, dict(event, event="incumbent"))
 
-        # Read solver log immediately after solve
-        if os.path.exists(log_path):
-            with open(log_path, 'r', encoding='utf-8') as f:
-                solver_log_content = f.read()
-            os.unlink(log_path)
-            log_path = ""
+        solver = solver_backends.make_solver(
+            options["solver"], solver_settings, log_callback=log_chunks.append, progress_callback=on_progress
+        )
 
-        if isinstance(result_data, tuple):
-            df_detalle = result_data[0]
-        else:
-            df_detalle = result_data
+        # 8. Extract results (resolver_modelo will call modelo.solve() internally)
+        try:
+            filas_detalle = Optimizacion_RITEL_10.resolver_modelo(modelo, params, all_toma_indices, solver)
+        finally:
+            solver_log_content += "".join(log_chunks)
+        resumen = getattr(solver, 'resumen', None) if anytime else None
+        if filas_detalle is None and anytime and diseno_arranque is not None:
+            # The solver ended without a solution: the MIP start is still the best incumbent.
+            greedy_start.fijar_arranque(modelo, params, all_toma_indices, diseno_arranque)
+            filas_detalle = Optimizacion_RITEL_10.extraer_filas_detalle(modelo, params, all_toma_indices)
+            bound = resumen["bound"] if resumen else None
+            resumen = {
+                "optimal": False, "incumbent": heuristic_objective, "bound": bound,
+                "gap": solver_backends._gap(heuristic_objective, bound),
+                "nodes": resumen["nodes"] if resumen else None
+            }
+            solver_log_content += "\nNo solution from the solver; returning the warm start design\n"
+        if filas_detalle is not None:
+            solver_log_content += _objective_line(modelo, heuristic_objective)
 
-        if df_detalle is None:
-            print(json.dumps({
+        if filas_detalle is None:
+            payload = {
                 "success": False,
                 "message": "Optimal solution not found or failed to generate details.",
-                "solver_status": LpStatus[modelo.status],
-                "solver_log": solver_log_content
-            }))
-            sys.exit(0)
-
-        # 7. Map to ResultParser schema while PRESERVING original columns
-        nivel_key = 'Nivel TU Final (dBµV)'
-        min_n = float(params['Nivel_minimo'])
-        max_n = float(params['Nivel_maximo'])
-
-        detail = []
-        df_detalle_clean = df_detalle.where(pd.notnull(df_detalle), None)
-
-        sys.stderr.write(f"DF Columns: {list(df_detalle.columns)}\n")
-
-        for _, row in df_detalle_clean.iterrows():
-            row_dict = row.to_dict()
-
-            val = float(row_dict.get(nivel_key, 0) or 0)
-            cumple = 1 if (min_n <= val <= max_n) else 0
-
-            losses = [
-                {"segment": "riser_dentro_del_bloque", "value": float(row_dict.get('Pérdida Riser dentro del Bloque (dB)', 0) or 0)},
-                {"segment": "riser_atenuacion_conectores", "value": float(row_dict.get('Riser Atenuacion Conectores (dB)', 0) or 0)},
-                {"segment": "riser_atenuacin_taps", "value": float(row_dict.get('Riser Atenuación Taps (dB)', 0) or 0)},
-                {"segment": "feeder_cable", "value": float(row_dict.get('Pérdida Feeder (cable) (dB)', 0) or 0)},
-                {"segment": "feeder_conectores", "value": float(row_dict.get('Pérdida Feeder (conectores) (dB)', 0) or 0)},
-                {"segment": "derivador_piso", "value": float(row_dict.get('Pérdida Derivador Piso (dB)', 0) or 0)},
-                {"segment": "cable_derivrep", "value": float(row_dict.get('Pérdida Cable Deriv→Rep (dB)', 0) or 0)},
-                {"segment": "cable_reptu", "value": float(row_dict.get('Pérdida Cable Rep→TU (dB)', 0) or 0)},
-                {"segment": "conexin_tu", "value": float(row_dict.get('Pérdida Conexión TU (dB)', 0) or 0)},
-                {"segment": "total", "value": float(row_dict.get('Pérdida Total (dB)', 0) or 0)}
-            ]
-
-            row_dict.update({
-                "tu_id": str(row_dict.get('Toma', '')),
-                "piso": int(row_dict.get('Piso', 0)),
-                "apto": int(row_dict.get('Apto', 0)),
-                "bloque": int(row_dict.get('Bloque', 0)),
-                "nivel_tu": val,
-                "nivel_min": min_n,
-                "nivel_max": max_n,
-                "cumple": cumple,
-                "losses": losses
-            })
-            detail.append(row_dict)
-
-        # Summary JSON
-        summary = {
-            "contract_version": 2,
-            "piso_max": int(params['Piso_Maximo']),
-            "total_tus": len(all_toma_indices),
-            "status": "Optimal",
-            "avg_nivel_tu": float(df_detalle[nivel_key].mean()) if nivel_key in df_detalle.columns else 0,
-            "min_nivel_tu": float(df_detalle[nivel_key].min()) if nivel_key in df_detalle.columns else 0,
-            "max_nivel_tu": float(df_detalle[nivel_key].max()) if nivel_key in df_detalle.columns else 0
-        }
-
-        # 8. Output final structured JSON
-        print(json.dumps({
-            "success": True,
-            "summary": summary,
-            "detail": detail,
-            "solver_status": LpStatus[modelo.status],
-            "solver_log": solver_log_content
-        }))
+                "solver_status": LpStatus[modelo.status]
+            }
+            if options["diagnose"]:
+                diagnosis_settings = {k: v for k, v in solver_settings.items() if k != "warmStart"}
+                payload["diagnosis"], diagnosis_log = _diagnosis(params, all_toma_indices, options, diagnosis_settings)
+                solver_log_content += diagnosis_log
+            payload["solver_log"] = solver_log_content
+            _emit(out, payload)
+            return 0
+
+        # 9. Map to ResultParser schema and output final structured JSON
+        status = "Optimal" if resumen is None or resumen["optimal"] else "Feasible"
+        resultados = ResultPipeline(modelo, params, all_toma_indices, filas_detalle)
+        summary_extra = None
+        if resumen is not None:
+            summary_extra = {"objective": resumen["incumbent"], "bound": resumen["bound"], "gap": resumen["gap"]}
+        if options["stream"]:
+            _stream_result(
+                out, resultados, status, LpStatus[modelo.status], solver_log_content,
+                options["contract_version"], summary_extra
+            )
+            return 0
+        payload = _result_payload(
+            resultados, status, LpStatus[modelo.status], solver_log_content, options["contract_version"], summary_extra
+        )
+        _emit(out, payload)
+
+        # A result stopped by the time limit may improve on the next run: not cached.
+        if cache_key and status == "Optimal":
+            try:
+                solution_cache.put(cache_key, payload)
+            except OSError as e:
+                sys.stderr.write(f"Solution cache write failed: {e}\n")
+        return 0
 
     except Exception as e:
         sys.stderr.write(f"Exception in optimizer_canonical: {str(e)}\n")
         sys.stderr.write(traceback.format_exc())
-        print(json.dumps({
+        _emit(out, {
             "success": False,
             "message": str(e),
             "solver_log": solver_log_content
-        }))
-        sys.exit(1)
+        })
+        return 1
 
-    finally:
-        # Clean up temp log file if still exists
-        if log_path and os.path.exists(log_path):
-            os.unlink(log_path)
+def main():
+    sys.exit(run(sys.stdin.read(), sys.stdout))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Thin client for the persistent optimizer worker (optimizer_worker.py).
+
+Keeps the stdin JSON -> stdout JSON contract of optimizer_canonical.py: the request
+is forwarded to the worker over a local Unix socket and the response is streamed
+back to stdout, one JSON message per line. If no worker is listening, the
+optimization runs in-process.
+
+Only the standard library is imported here so that a run served by the worker does
+not pay the pandas/PuLP import cost.
+"""
+import os
+import socket
+import sys
+
+SOCKET_PATH = os.environ.get('TDT_OPTIMIZER_SOCKET', '/tmp/tdt_optimizer.sock')
+
+# The worker ends every response with this byte followed by the exit code.
+# json.dumps escapes control characters, so it never appears inside the payload.
+EXIT_CODE_SEPARATOR = b"\0"
+
+
+def request(raw_input, out, socket_path=SOCKET_PATH):
+    """Sends one request to the worker and copies the response into ``out`` (binary).
+
+    Returns the exit code reported by the worker, or None if no worker is reachable.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+
+    exit_code = b""
+    with sock:
+        sock.sendall(raw_input.encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+
+        in_trailer = False
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            if in_trailer:
+                exit_code += chunk
+                continue
+            head, sep, tail = chunk.partition(EXIT_CODE_SEPARATOR)
+            out.write(head)
+            # Flushed per chunk so a provisional message reaches the reader right away.
+            out.flush()
+            if sep:
+                in_trailer = True
+                exit_code += tail
+        out.flush()
+
+    # A worker that died mid-request never sends the trailer.
+    return int(exit_code) if exit_code else 1
+
+
+def main():
+    raw_input = sys.stdin.read()
+    exit_code = request(raw_input, sys.stdout.buffer)
+    if exit_code is None:
+        # No worker running: fall back to the classic one-process-per-run path.
+        sys.path.append(os.path.dirname(__file__))
+        import optimizer_canonical
+        exit_code = optimizer_canonical.run(raw_input, sys.stdout)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Persistent, pre-warmed optimizer worker.
+
+Imports PuLP and Optimizacion_RITEL_10 once and then serves optimization
+requests back to back over a local Unix socket, using the same stdin JSON -> stdout
+JSON contract as optimizer_canonical.py (see optimizer_client.py for the client).
+
+A small pre-forked pool of processes shares the listening socket; the parent only
+supervises them and replaces any child that exits.
+
+Environment:
+    TDT_OPTIMIZER_SOCKET        Socket path (default /tmp/tdt_optimizer.sock).
+    TDT_OPTIMIZER_WORKERS       Number of worker processes (default 2).
+    TDT_OPTIMIZER_MAX_REQUESTS  Requests served by a child before it is recycled (default 200).
+"""
+import os
+import signal
+import socket
+import sys
+import traceback
+
+sys.path.append(os.path.dirname(__file__))
+from optimizer_client import SOCKET_PATH, EXIT_CODE_SEPARATOR
+import optimizer_canonical
+from pulp import PULP_CBC_CMD
+
+NUM_WORKERS = int(os.environ.get('TDT_OPTIMIZER_WORKERS', '2'))
+MAX_REQUESTS = int(os.environ.get('TDT_OPTIMIZER_MAX_REQUESTS', '200'))
+
+
+def _read_request(conn):
+    """Reads the request until the client half-closes the connection."""
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b"".join(chunks).decode('utf-8')
+
+
+def _handle(conn):
+    out = conn.makefile('w', encoding='utf-8')
+    try:
+        exit_code = optimizer_canonical.run(_read_request(conn), out)
+    except Exception:
+        sys.stderr.write(traceback.format_exc())
+        exit_code = 1
+    finally:
+        out.flush()
+        out.close()
+    conn.sendall(EXIT_CODE_SEPARATOR + str(exit_code).encode('ascii'))
+
+
+def _serve(listener):
+    """Child loop: accepts and handles requests until recycled."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    for _ in range(MAX_REQUESTS):
+        conn, _ = listener.accept()
+        with conn:
+            try:
+                _handle(conn)
+            except OSError as e:
+                # Client went away; keep serving.
+                sys.stderr.write(f"optimizer_worker: connection error: {e}\n")
+    os._exit(0)
+
+
+def _spawn(listener):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _serve(listener)
+        finally:
+            os._exit(1)
+    return pid
+
+
+def main():
+    # Warm up the solver lookup so the first request does not pay for it.
+    PULP_CBC_CMD(msg=False).available()
+
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(SOCKET_PATH)
+    listener.listen(16)
+
+    children = set()
+
+    def _shutdown(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        if os.path.exists(SOCKET_PATH):
+            os.unlink(SOCKET_PATH)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    for _ in range(NUM_WORKERS):
+        children.add(_spawn(listener))
+    sys.stderr.write(f"optimizer_worker: {NUM_WORKERS} workers listening on {SOCKET_PATH}\n")
+
+    # Supervise: replace children that exit (recycled or crashed).
+    while True:
+        pid, _ = os.wait()
+        children.discard(pid)
+        children.add(_spawn(listener))
+
+
+if __name__ == "__main__":
+    main()
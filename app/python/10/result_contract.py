@@ -0,0 +1,339 @@
+"""Result payload schemas of optimizer_canonical: the flat contract v2 and the nested v3.
+
+Contract v2 (the default) has one row per TU in ``detail``. Each row carries every
+detail column of _generar_filas_detalle plus the ResultParser fields (``tu_id``,
+``piso``, ``apto``, ``bloque``, ``nivel_tu``, ``nivel_min``, ``nivel_max``, ``cumple``,
+``losses``), so building-wide and block-wide values are repeated for every TU.
+
+Contract v3 (``contract_version: 3``) replaces ``detail`` with ``building``. It nests
+building -> blocks -> floors -> apartments -> TUs and stores every value once, at the
+level it belongs to, under a short key:
+
+    {"piso_troncal": ..., "repartidor_troncal": ..., "nivel_min": ..., "nivel_max": ...,
+     "blocks": [{"bloque": 1, ..., "floors": [{"piso": 5, ..., "apartments": [
+         {"apto": 1, ..., "tus": [{"tu": 1, "nivel_tu": ..., ...}]}]}]}]}
+
+The ResultParser fields and ``losses`` are not stored, since they are derived from the
+detail columns; ``Toma`` is rebuilt from the floor, apartment and TU numbers.
+expand_to_v2 rebuilds the v2 payload from a v3 one, byte for byte. Blocks, floors,
+apartments and TUs keep the order of the v2 rows.
+
+stream_records splits a result of either contract into NDJSON records (the
+``stream`` option of optimizer_canonical), one floor at a time, and collect_stream
+joins them back into the payload.
+
+This module only depends on the standard library, so the expander can run on its own.
+"""
+
+NIVEL_KEY = 'Nivel TU Final (dBµV)'
+
+# Loss breakdown of each v2 row: (segment, detail column).
+LOSS_SEGMENTS = (
+    ("riser_dentro_del_bloque", 'Pérdida Riser dentro del Bloque (dB)'),
+    ("riser_atenuacion_conectores", 'Riser Atenuacion Conectores (dB)'),
+    ("riser_atenuacin_taps", 'Riser Atenuación Taps (dB)'),
+    ("feeder_cable", 'Pérdida Feeder (cable) (dB)'),
+    ("feeder_conectores", 'Pérdida Feeder (conectores) (dB)'),
+    ("derivador_piso", 'Pérdida Derivador Piso (dB)'),
+    ("cable_derivrep", 'Pérdida Cable Deriv→Rep (dB)'),
+    ("cable_reptu", 'Pérdida Cable Rep→TU (dB)'),
+    ("conexin_tu", 'Pérdida Conexión TU (dB)'),
+    ("total", 'Pérdida Total (dB)'),
+)
+
+# Columns of the detail rows of _generar_filas_detalle, in order.
+DETAIL_COLUMNS = (
+    'Toma', 'Piso', 'Apto', 'Bloque', 'Piso Troncal', 'Piso Entrada Riser Bloque',
+    'Direccion Propagacion', 'Longitud Antena→Troncal (m)', 'Pérdida Antena→Troncal (cable) (dB)',
+    'Pérdida Antena↔Troncal (conectores) (dB)', 'Repartidor Troncal', 'Salidas Troncal',
+    'Pérdida Repartidor Troncal (dB)', 'Feeder Troncal→Entrada Bloque (m)', 'Pérdida Feeder (cable) (dB)',
+    'Pérdida Feeder (conectores) (dB)', 'Pérdida Riser dentro del Bloque (dB)',
+    'Distancia riser dentro bloque (m)', 'Riser Atenuacion Cable (dB)', 'Riser Conectores (uds)',
+    'Riser Atenuacion Conectores (dB)', 'Riser Atenuación Taps (dB)', 'Derivador Piso',
+    'Pérdida Derivador Piso (dB)', 'Pérdida Cable Deriv→Rep (dB)', 'Pérdida Conectores Apto (dB)',
+    'Repartidor Apt', 'Pérdida Repartidor Apt (dB)', 'Pérdida Cable Rep→TU (dB)', 'Pérdida Conexión TU (dB)',
+    'Pérdida Total (dB)', 'P_in (entrada) (dBµV)', NIVEL_KEY, 'Distancia total hasta la toma (m)',
+)
+
+# Contract v3 fields per level: (v3 key, detail column).
+BUILDING_FIELDS = (
+    ("piso_troncal", 'Piso Troncal'),
+    ("longitud_antena_troncal_m", 'Longitud Antena→Troncal (m)'),
+    ("perdida_antena_troncal_cable_db", 'Pérdida Antena→Troncal (cable) (dB)'),
+    ("perdida_antena_troncal_conectores_db", 'Pérdida Antena↔Troncal (conectores) (dB)'),
+    ("repartidor_troncal", 'Repartidor Troncal'),
+    ("salidas_troncal", 'Salidas Troncal'),
+    ("perdida_repartidor_troncal_db", 'Pérdida Repartidor Troncal (dB)'),
+    ("perdida_conectores_apto_db", 'Pérdida Conectores Apto (dB)'),
+    ("perdida_conexion_tu_db", 'Pérdida Conexión TU (dB)'),
+    ("p_in_dbuv", 'P_in (entrada) (dBµV)'),
+)
+BLOCK_FIELDS = (
+    ("bloque", 'Bloque'),
+    ("piso_entrada", 'Piso Entrada Riser Bloque'),
+    ("direccion", 'Direccion Propagacion'),
+    ("feeder_m", 'Feeder Troncal→Entrada Bloque (m)'),
+    ("perdida_feeder_cable_db", 'Pérdida Feeder (cable) (dB)'),
+    ("perdida_feeder_conectores_db", 'Pérdida Feeder (conectores) (dB)'),
+)
+FLOOR_FIELDS = (
+    ("piso", 'Piso'),
+    ("perdida_riser_db", 'Pérdida Riser dentro del Bloque (dB)'),
+    ("distancia_riser_m", 'Distancia riser dentro bloque (m)'),
+    ("riser_cable_db", 'Riser Atenuacion Cable (dB)'),
+    ("riser_conectores", 'Riser Conectores (uds)'),
+    ("riser_conectores_db", 'Riser Atenuacion Conectores (dB)'),
+    ("riser_taps_db", 'Riser Atenuación Taps (dB)'),
+    ("derivador", 'Derivador Piso'),
+    ("perdida_derivador_db", 'Pérdida Derivador Piso (dB)'),
+)
+APARTMENT_FIELDS = (
+    ("apto", 'Apto'),
+    ("perdida_cable_deriv_rep_db", 'Pérdida Cable Deriv→Rep (dB)'),
+    ("repartidor", 'Repartidor Apt'),
+    ("perdida_repartidor_db", 'Pérdida Repartidor Apt (dB)'),
+)
+TU_FIELDS = (
+    ("perdida_cable_rep_tu_db", 'Pérdida Cable Rep→TU (dB)'),
+    ("perdida_total_db", 'Pérdida Total (dB)'),
+    ("nivel_tu", NIVEL_KEY),
+    ("distancia_total_m", 'Distancia total hasta la toma (m)'),
+)
+
+
+def detail_columns(filas_detalle):
+    """Columns of the detail rows, in order of first appearance, and the numeric ones to write as floats.
+
+    The v2 payload used to be built through a pandas DataFrame, which stores a column
+    that mixes ints and floats (or has missing values) as float64. Those columns are
+    still written as floats, so the payload stays byte-compatible.
+    """
+    columns = list(dict.fromkeys(k for fila in filas_detalle for k in fila))
+    float_columns = []
+    for column in columns:
+        values = [fila.get(column) for fila in filas_detalle]
+        numeric = all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values)
+        ints = sum(isinstance(v, int) for v in values)
+        if numeric and 0 < ints < len(values):
+            float_columns.append(column)
+    return columns, float_columns
+
+
+def _row_v2(fila, columns, float_columns, nivel_min, nivel_max):
+    # Rows of _generar_filas_detalle all have the same keys in the same order: copied as they are.
+    row_dict = dict(fila) if len(fila) == len(columns) else {k: fila.get(k) for k in columns}
+    for k in float_columns:
+        if row_dict[k] is not None:
+            row_dict[k] = float(row_dict[k])
+
+    val = float(row_dict.get(NIVEL_KEY, 0) or 0)
+    row_dict.update({
+        "tu_id": str(row_dict.get('Toma', '')),
+        "piso": int(row_dict.get('Piso', 0)),
+        "apto": int(row_dict.get('Apto', 0)),
+        "bloque": int(row_dict.get('Bloque', 0)),
+        "nivel_tu": val,
+        "nivel_min": nivel_min,
+        "nivel_max": nivel_max,
+        "cumple": 1 if (nivel_min <= val <= nivel_max) else 0,
+        "losses": [
+            {"segment": segment, "value": float(row_dict.get(column, 0) or 0)}
+            for segment, column in LOSS_SEGMENTS
+        ]
+    })
+    return row_dict
+
+
+def detail_rows_v2(filas_detalle, nivel_min, nivel_max):
+    """Contract v2 ``detail``: the detail columns of each row plus the ResultParser fields."""
+    columns, float_columns = detail_columns(filas_detalle)
+    return [_row_v2(fila, columns, float_columns, nivel_min, nivel_max) for fila in filas_detalle]
+
+
+def _check_columns(filas_detalle):
+    if not filas_detalle or tuple(filas_detalle[0]) != DETAIL_COLUMNS:
+        raise ValueError("Contract v3 needs the detail rows of _generar_filas_detalle")
+
+
+def _building_fields(filas_detalle, nivel_min, nivel_max):
+    building = {key: filas_detalle[0][col] for key, col in BUILDING_FIELDS}
+    building.update(nivel_min=nivel_min, nivel_max=nivel_max)
+    return building
+
+
+def _group_by_floor(filas_detalle, all_toma_indices):
+    """(floor, [((p, a, t), row)]) for every run of consecutive rows of one floor."""
+    grupo = []
+    for k, fila in zip(all_toma_indices, filas_detalle):
+        if grupo and k[0] != grupo[0][0][0]:
+            yield grupo[0][0][0], grupo
+            grupo = []
+        grupo.append((k, fila))
+    if grupo:
+        yield grupo[0][0][0], grupo
+
+
+def _floor_v3(grupo):
+    """Contract v3 floor (with its apartments and TUs) of the rows of one floor."""
+    floor = {key: grupo[0][1][col] for key, col in FLOOR_FIELDS}
+    floor['apartments'] = []
+    aptos = {}
+    for (p, a, t), fila in grupo:
+        if a not in aptos:
+            aptos[a] = {key: fila[col] for key, col in APARTMENT_FIELDS}
+            aptos[a]['tus'] = []
+            floor['apartments'].append(aptos[a])
+        tu = {"tu": t}
+        for key, col in TU_FIELDS:
+            tu[key] = fila[col]
+        aptos[a]['tus'].append(tu)
+    return floor
+
+
+def building_v3(filas_detalle, all_toma_indices, nivel_min, nivel_max):
+    """Contract v3 ``building`` of the detail rows (one per index of ``all_toma_indices``).
+
+    Raises:
+        ValueError: If the rows do not have the columns of DETAIL_COLUMNS.
+    """
+    _check_columns(filas_detalle)
+    building = _building_fields(filas_detalle, nivel_min, nivel_max)
+    building['blocks'] = []
+    bloques = {}
+    for _, grupo in _group_by_floor(filas_detalle, all_toma_indices):
+        b = grupo[0][1]['Bloque']
+        if b not in bloques:
+            bloques[b] = {key: grupo[0][1][col] for key, col in BLOCK_FIELDS}
+            bloques[b]['floors'] = []
+            building['blocks'].append(bloques[b])
+        bloques[b]['floors'].append(_floor_v3(grupo))
+    return building
+
+
+def stream_records(filas_detalle, all_toma_indices, summary, solver_status, solver_log,
+                   nivel_min, nivel_max, provisional=False):
+    """Records of a streamed (NDJSON) success result, in chunks: one list per floor.
+
+    The first chunk is the header record:
+        {"record": "header", "contract_version", "piso_max", "total_tus"[, "provisional"]}
+    For contract v3 the header also carries the building-level values (``building``).
+    Then comes one chunk per floor:
+    - v2: one {"record": "tu", ...} per TU, with the fields of a v2 ``detail`` row.
+    - v3: a {"record": "block", ...} when a block starts, then one {"record": "floor", ...}
+      with the floor's apartments and TUs.
+    The last chunk holds {"record": "summary", ...} (the payload ``summary``) and the
+    trailing {"record": "end", "success", "solver_status", "records", "solver_log"}, where
+    ``records`` counts the TU or floor records. collect_stream rebuilds the payload.
+    """
+    contract_version = summary["contract_version"]
+    header = {
+        "record": "header", "contract_version": contract_version,
+        "piso_max": summary["piso_max"], "total_tus": summary["total_tus"]
+    }
+    if provisional:
+        header["provisional"] = True
+    if contract_version == 3:
+        _check_columns(filas_detalle)
+        header["building"] = _building_fields(filas_detalle, nivel_min, nivel_max)
+    else:
+        columns, float_columns = detail_columns(filas_detalle)
+    yield [header]
+
+    registros, bloque_actual = 0, None
+    for _, grupo in _group_by_floor(filas_detalle, all_toma_indices):
+        if contract_version == 3:
+            chunk = []
+            fila = grupo[0][1]
+            if fila['Bloque'] != bloque_actual:
+                bloque_actual = fila['Bloque']
+                chunk.append(dict({"record": "block"}, **{key: fila[col] for key, col in BLOCK_FIELDS}))
+            chunk.append(dict({"record": "floor"}, **_floor_v3(grupo)))
+            registros += 1
+        else:
+            chunk = [
+                dict({"record": "tu"}, **_row_v2(fila, columns, float_columns, nivel_min, nivel_max))
+                for _, fila in grupo
+            ]
+            registros += len(chunk)
+        yield chunk
+
+    yield [
+        dict({"record": "summary"}, **summary),
+        {"record": "end", "success": True, "solver_status": solver_status, "records": registros,
+         "solver_log": solver_log}
+    ]
+
+
+def collect_stream(records):
+    """Rebuilds the payload of a streamed result from its records (parsed NDJSON lines).
+
+    The result is the payload the same request writes without ``stream``. Lines that
+    are not result records (incumbent events) are skipped.
+    """
+    header, summary, end = None, None, None
+    detail, blocks = [], []
+    for record in records:
+        tipo = record.get("record")
+        valores = {k: v for k, v in record.items() if k != "record"}
+        if tipo == "header":
+            header = valores
+        elif tipo == "tu":
+            detail.append(valores)
+        elif tipo == "block":
+            valores["floors"] = []
+            blocks.append(valores)
+        elif tipo == "floor":
+            blocks[-1]["floors"].append(valores)
+        elif tipo == "summary":
+            summary = valores
+        elif tipo == "end":
+            end = valores
+    if header is None or end is None:
+        raise ValueError("Incomplete result stream: missing header or end record")
+
+    payload = {"success": end["success"], "summary": summary}
+    if header["contract_version"] == 3:
+        payload["building"] = dict(header["building"], blocks=blocks)
+    else:
+        payload["detail"] = detail
+    payload["solver_status"] = end["solver_status"]
+    payload["solver_log"] = end["solver_log"]
+    if header.get("provisional"):
+        payload["provisional"] = True
+    return payload
+
+
+def expand_to_v2(payload):
+    """Rebuilds the contract v2 payload of a contract v3 one.
+
+    json.dumps of the result equals the v2 payload optimizer_canonical writes for the
+    same design. Payloads that are not v3 (failures, incumbent events) are returned as
+    they are.
+    """
+    if "building" not in payload:
+        return payload
+    building = payload["building"]
+    nivel_min, nivel_max = building["nivel_min"], building["nivel_max"]
+
+    filas_detalle = []
+    valores = {col: building[key] for key, col in BUILDING_FIELDS}
+    for block in building["blocks"]:
+        valores.update((col, block[key]) for key, col in BLOCK_FIELDS)
+        for floor in block["floors"]:
+            valores.update((col, floor[key]) for key, col in FLOOR_FIELDS)
+            for apt in floor["apartments"]:
+                valores.update((col, apt[key]) for key, col in APARTMENT_FIELDS)
+                for tu in apt["tus"]:
+                    valores.update((col, tu[key]) for key, col in TU_FIELDS)
+                    valores['Toma'] = f"P{floor['piso']:02d}A{apt['apto']}TU{tu['tu']}"
+                    filas_detalle.append({col: valores[col] for col in DETAIL_COLUMNS})
+
+    expanded = {}
+    for key, value in payload.items():
+        if key == "summary":
+            expanded[key] = dict(value, contract_version=2)
+        elif key == "building":
+            expanded["detail"] = detail_rows_v2(filas_detalle, nivel_min, nivel_max)
+        else:
+            expanded[key] = value
+    return expanded
@@ -0,0 +1,146 @@
+"""Demand-driven result artifacts of a solved model.
+
+A ResultPipeline computes only the artifacts its caller asks for, each one from the
+artifacts it depends on. Every artifact is memoized, so intermediates shared by
+several artifacts (the detail rows, the detail DataFrame, the tables of the Excel
+workbook) are computed once:
+
+    detail            per-TU detail rows (list of dicts, extraer_filas_detalle)
+    summary           level statistics of the result summary
+    detail_df         the detail rows as a pandas DataFrame
+    inventory         bill of materials (cable, connectors, TUs, equipment)
+    floor_summary     per-floor equipment and level statistics
+    frequency_table   per-TU losses and levels at 470 and 698 MHz
+    excel             workbook with the four tables; returns its path
+    plots             level bar chart and histogram (file names set by the exporter)
+    scheme            ASCII connection scheme; returns its path
+    tree              interactive HTML tree, read back from the workbook and the specs file
+
+pandas and the Excel/plot/HTML tooling are imported by the artifacts that use them
+only, so a pipeline asked for ``detail`` and ``summary`` (the JSON path of
+optimizer_canonical) never loads them.
+"""
+import Optimizacion_RITEL_10
+from result_contract import NIVEL_KEY
+
+
+class ResultPipeline:
+    """Lazily computed, memoized result artifacts of one design.
+
+    Args:
+        modelo: Solved model (or one with a design loaded by greedy_start.fijar_arranque).
+        params: Dictionary containing all required parameters for the model.
+        all_toma_indices: List of tuples representing all (floor, apartment, TU) indices.
+        filas_detalle: Detail rows already extracted from ``modelo``, if any.
+        output_excel_file: Path of the workbook written by the ``excel`` artifact.
+        scheme_file: Path of the ASCII scheme written by the ``scheme`` artifact.
+        specs_file: Input Excel file with the component specs, for the ``tree`` artifact.
+    """
+
+    def __init__(self, modelo, params, all_toma_indices, filas_detalle=None,
+                 output_excel_file=None, scheme_file=None, specs_file=None):
+        self.modelo = modelo
+        self.params = params
+        self.all_toma_indices = all_toma_indices
+        self.output_excel_file = output_excel_file
+        self.scheme_file = scheme_file
+        self.specs_file = specs_file
+        self._artefactos = {}
+        if filas_detalle is not None:
+            self._artefactos['detail'] = filas_detalle
+
+    def get(self, artifact):
+        """Returns ``artifact``, computing it and its dependencies on first use."""
+        if artifact not in self._artefactos:
+            if artifact not in ARTIFACTS:
+                raise ValueError(f"Unknown artifact '{artifact}'. Expected one of {tuple(ARTIFACTS)}")
+            dependencias, construir = ARTIFACTS[artifact]
+            self._artefactos[artifact] = construir(self, *(self.get(d) for d in dependencias))
+        return self._artefactos[artifact]
+
+    def build(self, artifacts):
+        """Computes the requested artifacts: {name: value}."""
+        return {a: self.get(a) for a in artifacts}
+
+    def computed(self):
+        """Names of the artifacts computed so far, in order of computation."""
+        return list(self._artefactos)
+
+
+def _detail(pipeline):
+    return Optimizacion_RITEL_10.extraer_filas_detalle(pipeline.modelo, pipeline.params, pipeline.all_toma_indices)
+
+
+def _summary(pipeline, filas_detalle):
+    import numpy as np
+    # np.mean sums pairwise, like the pandas mean the summary was first computed with.
+    # Without any level (e.g. the INFEASIBLE row) the statistics are 0.
+    niveles = np.array([f[NIVEL_KEY] for f in filas_detalle if f.get(NIVEL_KEY) is not None], dtype=float)
+    return {
+        "piso_max": int(pipeline.params['Piso_Maximo']),
+        "total_tus": len(pipeline.all_toma_indices),
+        "avg_nivel_tu": float(niveles.mean()) if niveles.size else 0,
+        "min_nivel_tu": float(niveles.min()) if niveles.size else 0,
+        "max_nivel_tu": float(niveles.max()) if niveles.size else 0
+    }
+
+
+def _detail_df(pipeline, filas_detalle):
+    import pandas as pd
+    return pd.DataFrame(filas_detalle)
+
+
+def _inventory(pipeline, df_detalle):
+    from Funciones_apoyo_salida import _generar_df_inventario
+    return _generar_df_inventario(df_detalle, pipeline.params, pipeline.modelo._aux['bloques_de_pisos'])
+
+
+def _floor_summary(pipeline, df_detalle):
+    from Funciones_apoyo_salida import _generar_df_resumen_por_piso
+    return _generar_df_resumen_por_piso(df_detalle)
+
+
+def _frequency_table(pipeline, df_detalle):
+    from Funciones_apoyo_salida import _generar_df_detalle_resumido
+    return _generar_df_detalle_resumido(df_detalle, pipeline.params)
+
+
+def _excel(pipeline, df_detalle, df_inventario, df_resumen_piso, df_detalle_resumido):
+    from Funciones_apoyo_salida import _exportar_a_excel
+    _exportar_a_excel(df_detalle, df_inventario, df_resumen_piso, df_detalle_resumido, pipeline.output_excel_file)
+    return pipeline.output_excel_file
+
+
+def _plots(pipeline, df_detalle):
+    from Funciones_apoyo_salida import _generar_graficos
+    _generar_graficos(df_detalle)
+
+
+def _scheme(pipeline, df_detalle):
+    from Funciones_apoyo_salida import _dibujar_esquema_conexiones_ascii
+    _dibujar_esquema_conexiones_ascii(
+        df_detalle, params=pipeline.params, aux=pipeline.modelo._aux, output_file=pipeline.scheme_file
+    )
+    return pipeline.scheme_file
+
+
+def _tree(pipeline, excel_file):
+    from Funciones_apoyo_visualizacion import _generar_arbol_completo_con_specs
+    if pipeline.specs_file is None:
+        raise ValueError("The tree artifact needs the specs file (specs_file)")
+    _generar_arbol_completo_con_specs(excel_file, pipeline.specs_file)
+
+
+# artifact: (dependencies, builder). Builders take the pipeline and their dependencies.
+ARTIFACTS = {
+    'detail': ((), _detail),
+    'summary': (('detail',), _summary),
+    'detail_df': (('detail',), _detail_df),
+    'inventory': (('detail_df',), _inventory),
+    'floor_summary': (('detail_df',), _floor_summary),
+    'frequency_table': (('detail_df',), _frequency_table),
+    'excel': (('detail_df', 'inventory', 'floor_summary', 'frequency_table'), _excel),
+    'plots': (('detail_df',), _plots),
+    'scheme': (('detail_df',), _scheme),
+    'tree': (('excel',), _tree),
+}
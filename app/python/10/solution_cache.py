@@ -0,0 +1,103 @@
+"""Content-addressed on-disk cache of optimizer responses.
+
+Entries are keyed by (canonical SHA256 of the normalized params, solver settings,
+code version) and stored as one JSON file per key. The file mtime is refreshed on
+every hit, and the least recently used entries are evicted once the directory
+grows past the size limit.
+
+Environment:
+    TDT_SOLUTION_CACHE_DIR     Cache directory (default app/python/10/output/solution_cache).
+    TDT_SOLUTION_CACHE_MAX_MB  Size limit in MB (default 256). 0 disables the cache.
+"""
+import glob
+import hashlib
+import json
+import os
+import tempfile
+
+from Optimizacion_RITEL_10 import make_json_safe, normalize_numbers, canonical_json_dumps, compute_canonical_hash
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+CACHE_DIR = os.environ.get('TDT_SOLUTION_CACHE_DIR', os.path.join(_HERE, 'output', 'solution_cache'))
+MAX_BYTES = int(float(os.environ.get('TDT_SOLUTION_CACHE_MAX_MB', '256')) * 1024 * 1024)
+
+
+def _code_version():
+    """Hash of the optimizer sources, so any code change invalidates old entries."""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(_HERE, '*.py'))):
+        with open(path, 'rb') as f:
+            digest.update(os.path.basename(path).encode('utf-8'))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+CODE_VERSION = _code_version()
+
+
+def enabled():
+    return MAX_BYTES > 0
+
+
+def make_key(params, solver_settings):
+    """Builds the cache key for the raw (JSON-decoded) params and solver settings."""
+    params_hash = compute_canonical_hash(normalize_numbers(make_json_safe(params)))
+    settings = canonical_json_dumps(make_json_safe(solver_settings))
+    return hashlib.sha256(f"{params_hash}|{settings}|{CODE_VERSION}".encode('utf-8')).hexdigest()
+
+
+def _path(key):
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def get(key):
+    """Returns the cached payload for ``key`` or None."""
+    if not enabled():
+        return None
+    path = _path(key)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        os.utime(path)  # Mark as recently used.
+    except (OSError, ValueError):
+        return None
+    return payload
+
+
+def put(key, payload):
+    """Stores ``payload`` under ``key`` and evicts old entries if needed."""
+    if not enabled():
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Write to a temp file and rename so concurrent readers never see a partial entry.
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, _path(key))
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    _evict()
+
+
+def _evict():
+    entries = []
+    for path in glob.glob(os.path.join(CACHE_DIR, '*.json')):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= MAX_BYTES:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -0,0 +1,379 @@
+"""Pluggable MILP solver backends, selected per request.
+
+make_solver(name, settings, ...) returns a PuLP solver object, so every model type
+(LpProblem, SparseModel, DecomposedModel) is solved through the usual `solve(solver)`:
+
+- "cbc": PULP_CBC_CMD. CBC runs as a separate process from an MPS file; its log is
+  captured through a temp file and handed to `log_callback` when the solve ends. A
+  thread follows that file while CBC runs and passes every improving solution to
+  `progress_callback`.
+- "highs": HiGHS in-process through highspy. The model is passed to HiGHS as one
+  row-wise matrix (no files, no process spawn); log lines arrive through
+  `log_callback` while HiGHS runs, and every improving MIP solution through
+  `progress_callback({"time", "incumbent", "bound", "gap"})`.
+- "portfolio": a race of CBC/HiGHS configurations in parallel processes, first one at
+  the target gap wins (solver_portfolio.py).
+
+`settings` uses the PuLP names (timeLimit, gapRel, threads) for both backends. With
+`warmStart=True` every backend starts from the current variable values (the MIP start
+of greedy_start.py).
+
+After a solve, `solver.resumen` holds the outcome reported by the backend:
+{"optimal": reached the target gap, "incumbent", "bound", "gap", "nodes": branch-and-bound
+nodes explored} (None if unknown).
+"""
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from pulp import PULP_CBC_CMD, HiGHS, LpMaximize, LpInteger
+from pulp import LpStatusOptimal, LpStatusInfeasible, LpStatusUnbounded, LpStatusNotSolved
+
+SOLVERS = ("cbc", "highs", "portfolio")
+
+# Seconds between reads of the CBC log while CBC runs.
+LOG_POLL_INTERVAL = 0.1
+
+_NUMERO = r"(-?[\d.]+(?:e[-+]?\d+)?)"
+_CBC_INCUMBENTE = re.compile(r"Integer solution of " + _NUMERO + r" found.*\(" + _NUMERO + r" seconds\)")
+_CBC_COTA = re.compile(r"(?:best possible|Continuous objective value is) " + _NUMERO)
+_CBC_RESULTADO = re.compile(r"^Result - (.*)$", re.MULTILINE)
+_CBC_OBJETIVO = re.compile(r"^Objective value:\s+" + _NUMERO, re.MULTILINE)
+_CBC_COTA_FINAL = re.compile(r"^Lower bound:\s+" + _NUMERO, re.MULTILINE)
+_CBC_NODOS = re.compile(r"^Enumerated nodes:\s+(\d+)", re.MULTILINE)
+
+
+def argumentos_cbc(solver, mps_path, sol_path, mst_path=None):
+    """CBC command line for an MPS file, built from a PULP_CBC_CMD like COIN_CMD.solve_CBC does.
+
+    ``mst_path`` is an optional MIP start written by escribir_arranque_cbc.
+    """
+    args = [solver.path, mps_path]
+    if mst_path is not None:
+        args += ['-mips', mst_path]
+    if solver.timeLimit is not None:
+        args += ['-sec', str(solver.timeLimit)]
+    if solver.optionsDict.get('presolve') is not None:
+        args += ['-presolve', 'on' if solver.optionsDict['presolve'] else 'off']
+    if solver.optionsDict.get('cuts') is not None:
+        args += ['-gomory', 'on', 'knapsack', 'on', 'probing', 'on'] if solver.optionsDict['cuts'] else ['-cuts', 'off']
+    for option in solver.options + solver.getOptions():
+        args += ('-' + option).split()
+    return args + ['-solve', '-printingOptions', 'all', '-solution', sol_path]
+
+
+def leer_solucion_cbc(solver, sol_path):
+    """Reads a CBC solution file: (status, sol_status, objective, {column name: value})."""
+    status, sol_status = solver.get_status(sol_path)
+    valores = {}
+    with open(sol_path) as f:
+        cabecera = f.readline().split()
+        for linea in f:
+            partes = linea.split()
+            if partes[0] == '**':
+                partes = partes[1:]
+            valores[partes[1]] = float(partes[2])
+    try:
+        objetivo = float(cabecera[-1])
+    except (IndexError, ValueError):
+        objetivo = None
+    return status, sol_status, objetivo, valores
+
+
+def escribir_arranque_cbc(path, arranque):
+    """Writes a MIP start {column name: value} in the solution format CBC reads with -mips."""
+    with open(path, 'w') as f:
+        f.write("Stopped on time - objective value 0\n")
+        f.writelines(f"{i:>7} {nombre} {valor:>15} {0:>23}\n" for i, (nombre, valor) in enumerate(arranque.items()))
+
+
+def _gap(incumbente, cota):
+    """Relative gap |incumbent - bound| / |incumbent|, as HiGHS reports it."""
+    if incumbente is None or cota is None:
+        return None
+    return abs(incumbente - cota) / abs(incumbente) if incumbente else 0.0
+
+
+def resumen_cbc(log):
+    """Outcome of a CBC run read from its log (see `resumen` in the module docstring)."""
+    resultado = _CBC_RESULTADO.search(log)
+    objetivo = _CBC_OBJETIVO.search(log)
+    cota = _CBC_COTA_FINAL.search(log)
+    optimo = resultado is not None and resultado.group(1).startswith('Optimal')
+    incumbente = float(objetivo.group(1)) if objetivo and resultado and 'infeasible' not in resultado.group(1) else None
+    # A model solved at the root reports no lower bound: it is the objective.
+    cota = float(cota.group(1)) if cota else (incumbente if optimo else None)
+    nodos = _CBC_NODOS.search(log)
+    return {
+        "optimal": optimo, "incumbent": incumbente, "bound": cota, "gap": _gap(incumbente, cota),
+        "nodes": int(nodos.group(1)) if nodos else None
+    }
+
+
+class _SeguidorLogCbc(threading.Thread):
+    """Reads a CBC log file while CBC writes it and reports every improving solution."""
+
+    def __init__(self, log_path, progress_callback):
+        super().__init__(daemon=True)
+        self.log_path = log_path
+        self.progress_callback = progress_callback
+        self.incumbente = None
+        self.cota = None
+        self._fin = threading.Event()
+
+    def run(self):
+        pendiente = ""
+        with open(self.log_path, 'r', encoding='utf-8', errors='replace') as f:
+            while True:
+                fin = self._fin.is_set()
+                *lineas, pendiente = (pendiente + f.read()).split("\n")
+                for linea in lineas:
+                    self._leer(linea)
+                if fin:
+                    break
+                self._fin.wait(LOG_POLL_INTERVAL)
+
+    def _leer(self, linea):
+        cota = _CBC_COTA.search(linea)
+        if cota:
+            self.cota = float(cota.group(1))
+        solucion = _CBC_INCUMBENTE.search(linea)
+        if solucion:
+            incumbente = float(solucion.group(1))
+            if self.incumbente is None or incumbente < self.incumbente:
+                self.incumbente = incumbente
+                self.progress_callback({
+                    "time": float(solucion.group(2)),
+                    "incumbent": incumbente,
+                    "bound": self.cota,
+                    "gap": _gap(incumbente, self.cota)
+                })
+
+    def detener(self):
+        """Reads what is left of the log and stops."""
+        self._fin.set()
+        self.join()
+
+
+class CbcSolver(PULP_CBC_CMD):
+    """PULP_CBC_CMD that hands its log and progress to callbacks instead of leaving them in a file."""
+
+    def __init__(self, log_callback=None, progress_callback=None, **settings):
+        super().__init__(msg=False, **settings)
+        self.log_callback = log_callback
+        self.progress_callback = progress_callback
+        self.resumen = None
+
+    @contextmanager
+    def capturar_log(self):
+        """Points logPath at a temp file during a solve, follows it for progress_callback and
+        sends its content to log_callback. `resumen` is read from it at the end."""
+        if self.log_callback is None and self.progress_callback is None:
+            yield
+            return
+        fd, log_path = tempfile.mkstemp(suffix='.log')
+        os.close(fd)
+        self.optionsDict['logPath'] = log_path
+        seguidor = None
+        if self.progress_callback is not None:
+            seguidor = _SeguidorLogCbc(log_path, self.progress_callback)
+            seguidor.start()
+        try:
+            yield
+        finally:
+            del self.optionsDict['logPath']
+            if seguidor is not None:
+                seguidor.detener()
+            with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+                log = f.read()
+            os.unlink(log_path)
+            self.resumen = resumen_cbc(log)
+            if self.log_callback is not None:
+                self.log_callback(log)
+
+    def actualSolve(self, lp, **kwargs):
+        with self.capturar_log():
+            return super().actualSolve(lp, **kwargs)
+
+
+class HighsSolver(HiGHS):
+    """In-process HiGHS with log/progress callbacks and a bulk model load."""
+
+    def __init__(self, log_callback=None, progress_callback=None, **settings):
+        super().__init__(msg=False, **settings)
+        self.log_callback = log_callback
+        self.progress_callback = progress_callback
+        self.resumen = None
+
+    def _nuevo_highs(self):
+        import highspy
+        h = highspy.Highs()
+        h.setOptionValue("log_to_console", False)
+        if self.log_callback is None and self.progress_callback is None:
+            h.setOptionValue("output_flag", False)
+        else:
+            h.setCallback(self._callback, None)
+            if self.log_callback is not None:
+                h.startCallback(highspy.cb.HighsCallbackType.kCallbackLogging)
+            if self.progress_callback is not None:
+                h.startCallback(highspy.cb.HighsCallbackType.kCallbackMipImprovingSolution)
+        if self.gapRel is not None:
+            h.setOptionValue("mip_rel_gap", self.gapRel)
+        if self.gapAbs is not None:
+            h.setOptionValue("mip_abs_gap", self.gapAbs)
+        if self.threads is not None:
+            # HiGHS keeps one global thread pool, sized by the first solve of the process
+            # (or of the parent, for forked workers); rebuild it for this thread count.
+            highspy.Highs.resetGlobalScheduler(True)
+            h.setOptionValue("threads", self.threads)
+        if self.timeLimit is not None:
+            h.setOptionValue("time_limit", float(self.timeLimit))
+        for key, value in self.optionsDict.items():
+            if key != 'warmStart':
+                h.setOptionValue(key, value)
+        return h
+
+    @staticmethod
+    def fijar_arranque(h, valores):
+        """Passes a full vector of column values to HiGHS as the MIP start."""
+        import numpy as np
+        valores = np.asarray(valores, dtype=np.float64)
+        h.setSolution(len(valores), np.arange(len(valores), dtype=np.int32), valores)
+
+    def _callback(self, tipo, mensaje, salida, entrada, datos):
+        import highspy
+        if tipo == highspy.cb.HighsCallbackType.kCallbackLogging:
+            self.log_callback(mensaje)
+        elif tipo == highspy.cb.HighsCallbackType.kCallbackMipImprovingSolution:
+            # Before the root LP is solved the bound is still -inf.
+            cota = salida.mip_dual_bound if abs(salida.mip_dual_bound) < highspy.kHighsInf else None
+            self.progress_callback({
+                "time": salida.running_time,
+                "incumbent": salida.objective_function_value,
+                "bound": cota,
+                "gap": _gap(salida.objective_function_value, cota)
+            })
+
+    def createAndConfigureSolver(self, lp):
+        lp.solverModel = self._nuevo_highs()
+
+    def callSolver(self, lp):
+        lp.solverModel.run()
+        self.resumen = _resumen_highs(lp.solverModel)
+
+    def buildSolverModel(self, lp):
+        """Loads the LpProblem into HiGHS as one row-wise matrix (passModel)."""
+        import numpy as np
+        variables = lp.variables()
+        for i, var in enumerate(variables):
+            var.index = i
+        obj_mult = -1 if lp.sense == LpMaximize else 1
+
+        inicio, indices, valores, fila_lo, fila_hi = [0], [], [], [], []
+        for i, constraint in enumerate(lp._constraints.values()):
+            constraint.index = i
+            for var, coef in constraint.items():
+                if coef != 0:
+                    indices.append(var.index)
+                    valores.append(coef)
+            inicio.append(len(indices))
+            lb, ub = constraint.getLb(), constraint.getUb()
+            fila_lo.append(-np.inf if lb is None else lb)
+            fila_hi.append(np.inf if ub is None else ub)
+
+        self._cargar(
+            lp.solverModel,
+            costo=[obj_mult * lp.objective.get(v, 0.0) for v in variables],
+            col_lo=[-np.inf if v.lowBound is None else v.lowBound for v in variables],
+            col_hi=[np.inf if v.upBound is None else v.upBound for v in variables],
+            enteras=[self.mip and v.cat == LpInteger for v in variables],
+            fila_lo=fila_lo, fila_hi=fila_hi,
+            inicio=inicio, indices=indices, valores=valores
+        )
+        if self.optionsDict.get('warmStart'):
+            self.fijar_arranque(lp.solverModel, [v.varValue or 0.0 for v in variables])
+
+    @staticmethod
+    def _cargar(h, costo, col_lo, col_hi, enteras, fila_lo, fila_hi, inicio, indices, valores):
+        import highspy
+        import numpy as np
+        inf = highspy.kHighsInf
+        h.passModel(
+            len(costo), len(fila_lo), len(indices),
+            int(highspy.MatrixFormat.kRowwise), int(highspy.ObjSense.kMinimize), 0.0,
+            np.asarray(costo, dtype=np.float64),
+            np.clip(np.asarray(col_lo, dtype=np.float64), -inf, inf),
+            np.clip(np.asarray(col_hi, dtype=np.float64), -inf, inf),
+            np.clip(np.asarray(fila_lo, dtype=np.float64), -inf, inf),
+            np.clip(np.asarray(fila_hi, dtype=np.float64), -inf, inf),
+            np.asarray(inicio, dtype=np.int32),
+            np.asarray(indices, dtype=np.int32),
+            np.asarray(valores, dtype=np.float64),
+            np.asarray(enteras, dtype=np.uint8)
+        )
+
+    def resolver_matriz(self, matriz, arranque=None):
+        """Solves a model given as arrays (see SparseModel.matriz).
+
+        ``arranque`` is an optional vector of column values used as MIP start.
+        Returns (PuLP status, column values or None).
+        """
+        h = self._nuevo_highs()
+        self._cargar(h, **matriz)
+        if arranque is not None:
+            self.fijar_arranque(h, arranque)
+        h.run()
+        self.resumen = _resumen_highs(h)
+        return _estado(h)
+
+
+def _estado(h):
+    """PuLP status of a finished HiGHS run, with the same mapping as pulp.HiGHS.
+
+    A run stopped by the time limit with an incumbent counts as Optimal, as PuLP
+    also does for CBC.
+    """
+    import highspy
+    status = h.getModelStatus()
+    tiene_solucion = h.getInfo().primal_solution_status == 2
+    valores = list(h.getSolution().col_value) if tiene_solucion else None
+    estados = highspy.HighsModelStatus
+    if status == estados.kOptimal:
+        return LpStatusOptimal, valores
+    if status in (estados.kInfeasible, estados.kUnboundedOrInfeasible):
+        return LpStatusInfeasible, None
+    if status == estados.kUnbounded:
+        return LpStatusUnbounded, None
+    if tiene_solucion and status in (
+        estados.kTimeLimit, estados.kIterationLimit, estados.kInterrupt,
+        estados.kObjectiveBound, estados.kObjectiveTarget
+    ):
+        return LpStatusOptimal, valores
+    return LpStatusNotSolved, None
+
+
+def _resumen_highs(h):
+    """Outcome of a finished HiGHS MIP run (see `resumen` in the module docstring)."""
+    import highspy
+    info = h.getInfo()
+    incumbente = info.objective_function_value if info.primal_solution_status == 2 else None
+    optimo = h.getModelStatus() == highspy.HighsModelStatus.kOptimal
+    cota = info.mip_dual_bound if abs(info.mip_dual_bound) < highspy.kHighsInf else None
+    return {
+        "optimal": optimo, "incumbent": incumbente, "bound": cota, "gap": _gap(incumbente, cota),
+        "nodes": info.mip_node_count
+    }
+
+
+def make_solver(name, settings, log_callback=None, progress_callback=None):
+    """Returns the PuLP solver object of backend ``name`` (one of SOLVERS)."""
+    if name == "cbc":
+        return CbcSolver(log_callback=log_callback, progress_callback=progress_callback, **settings)
+    if name == "highs":
+        return HighsSolver(log_callback=log_callback, progress_callback=progress_callback, **settings)
+    if name == "portfolio":
+        from solver_portfolio import PortfolioSolver
+        return PortfolioSolver(settings, log_callback=log_callback)
+    raise ValueError(f"Unknown solver '{name}'. Expected one of {SOLVERS}")
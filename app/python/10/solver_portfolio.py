@@ -0,0 +1,261 @@
+"""Portfolio race: several solver configurations on the same model, in parallel.
+
+Solve times vary a lot between buildings, and the fastest configuration is not always
+the default one. PortfolioSolver writes the MPS file once and starts every configuration
+of the portfolio that fits in the CPU budget as its own process: CBC with different
+seeds, cut settings and thread counts (the cbc binary) and HiGHS (a forked worker that
+reads the same MPS file). The first run that finishes at the target gap (or proves the
+model infeasible) wins and the others are killed. If none does (time limits), the best
+incumbent found is used.
+
+PortfolioSolver is a PuLP solver object, so it plugs into LpProblem.solve, and
+SparseModel.solve uses its `resolver_mps`. The outcome is kept in `informe` and sent to
+`log_callback`, so the winning configuration can be used to tune the defaults; the
+winner's incumbent, bound and gap are kept in `resumen` like the other backends do.
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from pulp import LpSolver, LpStatus, LpStatusOptimal, LpStatusNotSolved
+from pulp import LpSolutionOptimal, LpSolutionInfeasible
+
+from solver_backends import (
+    CbcSolver, HighsSolver, argumentos_cbc, leer_solucion_cbc, escribir_arranque_cbc, resumen_cbc,
+    _estado, _resumen_highs
+)
+
+# Configurations in order of priority; each one adds its threads to the CPU budget.
+# Keys other than nombre/solver/opciones are PuLP solver settings overriding the base ones.
+DEFAULT_PORTFOLIO = (
+    {"nombre": "cbc", "solver": "cbc", "threads": 1},
+    {"nombre": "highs", "solver": "highs", "threads": 1},
+    {"nombre": "cbc_seed17", "solver": "cbc", "threads": 1, "opciones": ["randomCbcSeed 17"]},
+    {"nombre": "cbc_nocuts", "solver": "cbc", "threads": 1, "cuts": False},
+    {"nombre": "cbc_4threads", "solver": "cbc", "threads": 4},
+)
+
+# Seconds between checks of the running configurations.
+POLL_INTERVAL = 0.02
+
+
+def _disponible(config):
+    if config["solver"] == "highs":
+        return HighsSolver().available()
+    return CbcSolver().available()
+
+
+def _correr_highs(mps_path, resultado_path, settings, arranque):
+    """Worker process: solves the MPS file with HiGHS and writes the result as JSON."""
+    import highspy
+    solver = HighsSolver(**settings)
+    h = solver._nuevo_highs()
+    h.readModel(mps_path)
+    if arranque:
+        solver.fijar_arranque(h, [arranque.get(nombre, 0.0) for nombre in h.getLp().col_names_])
+    h.run()
+    status, valores = _estado(h)
+    modelo = h.getModelStatus()
+    en_gap = modelo in (highspy.HighsModelStatus.kOptimal, highspy.HighsModelStatus.kInfeasible)
+    resultado = {
+        "status": status,
+        "en_gap": en_gap,
+        "objetivo": h.getInfo().objective_function_value if valores is not None else None,
+        "resumen": _resumen_highs(h),
+        "valores": dict(zip(h.getLp().col_names_, valores)) if valores is not None else {}
+    }
+    with open(resultado_path + ".tmp", "w") as f:
+        json.dump(resultado, f)
+    os.replace(resultado_path + ".tmp", resultado_path)
+
+
+class _Corredor:
+    """One running configuration of the race."""
+
+    def __init__(self, config, settings, directorio, mps_path, arranque=None, mst_path=None):
+        self.nombre = config["nombre"]
+        self.inicio = time.perf_counter()
+        self.tiempo = None
+        self.resultado = None
+        ajustes = dict(settings, **{k: v for k, v in config.items() if k not in ("nombre", "solver", "opciones")})
+        base = os.path.join(directorio, self.nombre)
+        if config["solver"] == "highs":
+            self.cbc = None
+            self.resultado_path = base + ".json"
+            self.proceso = multiprocessing.get_context("fork").Process(
+                target=_correr_highs, args=(mps_path, self.resultado_path, ajustes, arranque), daemon=True
+            )
+            self.proceso.start()
+        else:
+            self.cbc = CbcSolver(options=list(config.get("opciones", [])), **ajustes)
+            self.sol_path = base + ".sol"
+            self.log = open(base + ".log", "w")
+            self.proceso = subprocess.Popen(
+                argumentos_cbc(self.cbc, mps_path, self.sol_path, mst_path),
+                stdout=self.log, stderr=self.log, stdin=subprocess.DEVNULL
+            )
+
+    def terminado(self):
+        """True once the process has exited; loads its result the first time."""
+        if self.resultado is not None:
+            return True
+        if self.cbc is None:
+            if self.proceso.exitcode is None:
+                return False
+            if os.path.exists(self.resultado_path):
+                with open(self.resultado_path) as f:
+                    self.resultado = json.load(f)
+            else:
+                self.resultado = {"status": LpStatusNotSolved, "en_gap": False, "objetivo": None, "valores": {}}
+        else:
+            if self.proceso.poll() is None:
+                return False
+            self.log.close()
+            if self.proceso.returncode == 0 and os.path.exists(self.sol_path):
+                status, sol_status, objetivo, valores = leer_solucion_cbc(self.cbc, self.sol_path)
+                en_gap = sol_status in (LpSolutionOptimal, LpSolutionInfeasible)
+                with open(self.log.name, 'r', encoding='utf-8', errors='replace') as f:
+                    resumen = resumen_cbc(f.read())
+                self.resultado = {
+                    "status": status, "en_gap": en_gap, "objetivo": objetivo, "valores": valores, "resumen": resumen
+                }
+            else:
+                self.resultado = {"status": LpStatusNotSolved, "en_gap": False, "objetivo": None, "valores": {}}
+        self.tiempo = time.perf_counter() - self.inicio
+        return True
+
+    def detener(self):
+        if self.cbc is None:
+            self.proceso.kill()
+            self.proceso.join()
+        else:
+            self.proceso.kill()
+            self.proceso.wait()
+            self.log.close()
+
+
+class PortfolioSolver(LpSolver):
+    """Runs a portfolio race and keeps the result of the winning configuration.
+
+    Args:
+        settings: Base PuLP solver settings (timeLimit, gapRel, threads, ...).
+        portfolio: Configurations in order of priority (default: DEFAULT_PORTFOLIO).
+        cpu_budget: Total threads for the race (default: settings['threads'], at most the
+            CPU count).
+        log_callback: Receives the race summary as text.
+    """
+    name = "portfolio"
+
+    def __init__(self, settings=None, portfolio=DEFAULT_PORTFOLIO, cpu_budget=None, log_callback=None):
+        super().__init__(msg=False)
+        self.settings = dict(settings or {})
+        self.portfolio = portfolio
+        cpus = os.cpu_count() or 1
+        self.cpu_budget = cpu_budget or min(self.settings.get("threads") or cpus, cpus)
+        self.log_callback = log_callback
+        self.informe = None
+        self.resumen = None
+
+    def available(self):
+        return any(_disponible(c) for c in self.portfolio)
+
+    def seleccion(self):
+        """Configurations that fit in the CPU budget, in portfolio order."""
+        elegidas, hilos = [], 0
+        for config in self.portfolio:
+            n = config.get("threads", 1)
+            if hilos + n <= self.cpu_budget and _disponible(config):
+                elegidas.append(config)
+                hilos += n
+        # The first configuration always runs, even over a smaller budget.
+        return elegidas or self.portfolio[:1]
+
+    def resolver_mps(self, escribir_mps):
+        """Runs the race on the MPS file written by ``escribir_mps(path)``.
+
+        ``escribir_mps`` returns the MIP start as {MPS column name: value}, or None.
+        Returns (PuLP status, {MPS column name: value}).
+        """
+        directorio = tempfile.mkdtemp(prefix="tdt_portfolio_")
+        try:
+            mps_path = os.path.join(directorio, "model.mps")
+            arranque = escribir_mps(mps_path)
+            mst_path = None
+            if arranque:
+                mst_path = os.path.join(directorio, "start.mst")
+                escribir_arranque_cbc(mst_path, arranque)
+            corredores = [
+                _Corredor(c, self.settings, directorio, mps_path, arranque, mst_path) for c in self.seleccion()
+            ]
+            ganador = None
+            try:
+                pendientes = list(corredores)
+                while pendientes and ganador is None:
+                    for corredor in list(pendientes):
+                        if corredor.terminado():
+                            pendientes.remove(corredor)
+                            if corredor.resultado["en_gap"]:
+                                ganador = corredor
+                                break
+                    else:
+                        time.sleep(POLL_INTERVAL)
+            finally:
+                for corredor in corredores:
+                    if not corredor.terminado():
+                        corredor.detener()
+
+            if ganador is None:
+                # No run reached the gap: keep the best incumbent.
+                con_solucion = [
+                    c for c in corredores
+                    if c.resultado is not None and c.resultado["status"] == LpStatusOptimal and c.resultado["objetivo"] is not None
+                ]
+                ganador = min(con_solucion, key=lambda c: c.resultado["objetivo"], default=None)
+            self._informar(corredores, ganador)
+            self.resumen = ganador.resultado.get("resumen") if ganador else None
+            if ganador is None:
+                return LpStatusNotSolved, {}
+            return ganador.resultado["status"], ganador.resultado["valores"]
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    def _informar(self, corredores, ganador):
+        self.informe = {
+            "ganador": ganador.nombre if ganador else None,
+            "tiempo_s": round(ganador.tiempo, 3) if ganador else None,
+            "objetivo": ganador.resultado["objetivo"] if ganador else None,
+            "configuraciones": [
+                {
+                    "nombre": c.nombre,
+                    "estado": "ganador" if c is ganador else ("terminado" if c.tiempo is not None else "detenido"),
+                    "status": LpStatus[c.resultado["status"]] if c.resultado else None,
+                    "tiempo_s": round(c.tiempo, 3) if c.tiempo is not None else None,
+                    "objetivo": c.resultado["objetivo"] if c.resultado else None
+                }
+                for c in corredores
+            ]
+        }
+        if self.log_callback is not None:
+            lineas = [f"Portfolio race (cpu budget {self.cpu_budget}): winner {self.informe['ganador']}"]
+            for c in self.informe["configuraciones"]:
+                lineas.append(f"  {c['nombre']}: {c['estado']} status={c['status']} time={c['tiempo_s']} objective={c['objetivo']}")
+            self.log_callback("\n".join(lineas) + "\n")
+
+    def actualSolve(self, lp, **kwargs):
+        variables_mps = {}
+
+        def escribir_mps(path):
+            _, nombres, _, _ = lp.writeMPS(path, rename=1)
+            variables_mps.update(nombres)
+            if not self.settings.get("warmStart"):
+                return None
+            return {variables_mps[v.name]: v.varValue or 0.0 for v in lp.variables()}
+
+        status, valores = self.resolver_mps(escribir_mps)
+        lp.assignVarsVals({v.name: valores.get(variables_mps.get(v.name), 0.0) for v in lp.variables()})
+        lp.assignStatus(status)
+        return status
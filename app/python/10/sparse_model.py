@@ -0,0 +1,418 @@
+"""Sparse-matrix builder for the MILP of construir_modelo_milp.
+
+Assembles the same formulation as the PuLP builder (same variables, constraints and
+coefficients, including the feasible-pair filtering of the catalog and the apartment
+tables) directly as NumPy COO arrays, and writes the MPS file in a single pass. No
+LpVariable / LpAffineExpression objects are created, which is where the PuLP builder
+spends most of its time and memory on buildings with thousands of TUs.
+
+Column layout: binaries first (x, y, r_troncal), then pot_in_riser_by_block, nivel_tu,
+d_plus and d_minus. Row 0 is the objective. Like the PuLP builder, the TU columns and
+rows exist once per TU class (Funciones_apoyo_optimizacion._clases_tomas), with the
+deviation weighted by the class size.
+
+SparseModel exposes `solve(solver)`, `status` and `_aux` like the LpProblem returned by
+construir_modelo_milp, so Optimizacion_RITEL_10.resolver_modelo and the result
+extractors work unchanged.
+"""
+import os
+import subprocess
+import tempfile
+from contextlib import nullcontext
+
+import numpy as np
+from pulp import PULP_CBC_CMD, PulpSolverError, LpStatusNotSolved
+
+from Funciones_apoyo_datos_entrada import dividir_en_bloques
+from Funciones_apoyo_optimizacion import (
+    _derivadores_validos, _troncales_validos, entrada_y_direccion_bloque, _potencia_entrada_bloque,
+    _potencias_riser, _nivel_toma, _clases_tomas
+)
+from apartment_tables import tablas_apartamento, repartidores_permitidos
+from catalog import compile_catalog
+from solver_backends import argumentos_cbc, leer_solucion_cbc, escribir_arranque_cbc
+
+# MPS row types for the senses used by the model.
+SENSE_EQ, SENSE_GE, SENSE_LE = 'E', 'G', 'L'
+
+
+class _Valor:
+    """Holds the solution value of one column; read through pulp.value() like an LpVariable."""
+    __slots__ = ('varValue',)
+
+    def __init__(self, valor=None):
+        self.varValue = valor
+
+    def value(self):
+        return self.varValue
+
+
+class _Filas:
+    """Accumulates constraint rows as COO triplets."""
+
+    def __init__(self):
+        self.n = 1  # Row 0 is the objective.
+        self.rows, self.cols, self.vals = [], [], []
+        self.sentidos, self.rhs = [], []
+
+    def nuevas(self, cantidad, sentido, rhs):
+        """Reserves ``cantidad`` rows and returns their indices."""
+        idx = np.arange(self.n, self.n + cantidad)
+        self.n += cantidad
+        self.sentidos.append(np.full(cantidad, sentido))
+        self.rhs.append(np.broadcast_to(np.asarray(rhs, dtype=float), (cantidad,)))
+        return idx
+
+    def coef(self, rows, cols, vals):
+        rows, cols = np.asarray(rows), np.asarray(cols)
+        self.rows.append(rows)
+        self.cols.append(cols)
+        self.vals.append(np.broadcast_to(np.asarray(vals, dtype=float), rows.shape))
+
+
+class SparseModel:
+    """The MILP of construir_modelo_milp, assembled as sparse arrays.
+
+    Args:
+        params: Dictionary containing all required parameters for the model.
+        all_toma_indices: List of tuples representing all (floor, apartment, TU) indices.
+        tablas: Optional precomputed apartment splitter tables.
+    """
+
+    def __init__(self, params, all_toma_indices, tablas=None):
+        self.params = params
+        self.all_toma_indices = all_toma_indices
+        self.status = LpStatusNotSolved
+        self.objective = None
+        self.arranque = None
+        self._aux = None
+        self._construir(tablas if tablas is not None else tablas_apartamento(params, all_toma_indices))
+
+    def _construir(self, tablas):
+        params = self.params
+        att = params['atenuacion_cable_por_metro']
+        loss_conns = params['conectores_por_union'] * params['atenuacion_conector']
+        pisos = list(range(params['Piso_Maximo'], 0, -1))
+        bloques = dividir_en_bloques(params['Piso_Maximo'])
+        catalogo = compile_catalog(params)
+        p_troncal = params['p_troncal']
+
+        # ---- Columns ----
+        derivadores = _derivadores_validos(params)
+        troncales = _troncales_validos(params, len(bloques))
+        n_d = len(derivadores)
+        self._x_keys = [(p, d) for p in pisos for d in derivadores]
+        self._y_keys = [
+            (p, a, r) for p in pisos for a in range(1, params['apartamentos_por_piso'] + 1)
+            if (p, a) in tablas for r in repartidores_permitidos(tablas[p, a])
+        ]
+        self._r_keys = troncales
+        self._pot_keys = [(p, b_idx) for b_idx, bloque in enumerate(bloques) for p in bloque]
+        self._clases = _clases_tomas(params, self.all_toma_indices)
+        self._t_keys = list(self._clases)
+        n_t = len(self._t_keys)
+
+        x0 = 0
+        y0 = x0 + len(self._x_keys)
+        r0 = y0 + len(self._y_keys)
+        pot0 = r0 + len(self._r_keys)
+        nivel0 = pot0 + len(self._pot_keys)
+        dplus0 = nivel0 + n_t
+        dminus0 = dplus0 + n_t
+        self.n_cols = dminus0 + n_t
+        self.n_binarias = pot0
+        self._offsets = (x0, y0, r0, pot0, nivel0, dplus0, dminus0)
+
+        pos_piso = {p: i for i, p in enumerate(pisos)}
+        pot_col = {p: pot0 + i for i, (p, _) in enumerate(self._pot_keys)}
+        derivacion = np.array([catalogo.derivadores.valor(d, 'derivacion') for d in derivadores])
+        paso = np.array([catalogo.derivadores.valor(d, 'paso') for d in derivadores])
+        loss_troncales = np.array([catalogo.repartidores.valor(r, 'perdida_insercion') for r in troncales])
+
+        # y columns grouped by apartment (CSR-like: start/count into the y block).
+        apto_y = {}
+        for j, (p, a, r) in enumerate(self._y_keys):
+            apto_y.setdefault((p, a), []).append(j)
+        loss_y = np.array([catalogo.repartidores.valor(r, 'perdida_insercion') for (_, _, r) in self._y_keys])
+
+        f = _Filas()
+
+        # seleccion_un_troncal
+        fila = f.nuevas(1, SENSE_EQ, 1.0)
+        f.coef(np.repeat(fila, len(troncales)), r0 + np.arange(len(troncales)), 1.0)
+
+        # one_derivador_p{p}
+        filas = f.nuevas(len(pisos), SENSE_EQ, 1.0)
+        f.coef(np.repeat(filas, n_d), x0 + np.arange(len(pisos) * n_d), 1.0)
+
+        # one_y_p{p}_a{a}
+        aptos_rep = [
+            (p, a) for p in pisos for a in range(1, params['apartamentos_por_piso'] + 1)
+            if params['tus_requeridos_por_apartamento'].get((p, a), 0) > 1
+        ]
+        filas = f.nuevas(len(aptos_rep), SENSE_EQ, 1.0)
+        for fila, apto in zip(filas, aptos_rep):
+            cols = apto_y.get(apto, [])
+            f.coef(np.full(len(cols), fila), y0 + np.array(cols, dtype=int), 1.0)
+
+        # pot_block_init_* and prop_up_/prop_down_*
+        loss_entre_pisos = params['largo_cable_entre_pisos'] * att
+        for b_idx, bloque in enumerate(bloques):
+            p_ent, direccion = entrada_y_direccion_bloque(bloque, p_troncal)
+            fila = f.nuevas(1, SENSE_EQ, _potencia_entrada_bloque(params, bloque, p_troncal, 0.0))
+            f.coef(fila, [pot_col[p_ent]], 1.0)
+            f.coef(np.repeat(fila, len(troncales)), r0 + np.arange(len(troncales)), loss_troncales)
+
+            orden = sorted(bloque, reverse=(direccion == 'down'))
+            filas = f.nuevas(len(orden) - 1, SENSE_EQ, -(loss_entre_pisos + loss_conns))
+            for fila, p_act, p_sig in zip(filas, orden, orden[1:]):
+                f.coef([fila, fila], [pot_col[p_sig], pot_col[p_act]], [1.0, -1.0])
+                f.coef(np.repeat(fila, n_d), x0 + pos_piso[p_act] * n_d + np.arange(n_d), paso)
+
+        # nivel_tu_*, nivel_min_*, nivel_max_*, dev_abs_* (vectorised over the TUs)
+        t_piso = np.fromiter((pos_piso[p] for (p, _, _) in self._t_keys), dtype=int, count=n_t)
+        t_pot = np.fromiter((pot_col[p] for (p, _, _) in self._t_keys), dtype=int, count=n_t)
+        t_cable = np.fromiter(
+            (params['largo_cable_derivador_repartidor'][(p, a)] + params['largo_cable_tu'][(p, a, t)]
+             for (p, a, t) in self._t_keys), dtype=float, count=n_t
+        )
+        t_nivel = nivel0 + np.arange(n_t)
+
+        filas = f.nuevas(n_t, SENSE_EQ, -(t_cable * att + 4 * params['atenuacion_conector'] + params['atenuacion_conexion_tu']))
+        f.coef(filas, t_nivel, 1.0)
+        f.coef(filas, t_pot, -1.0)
+        f.coef(np.repeat(filas, n_d), (x0 + t_piso[:, None] * n_d + np.arange(n_d)).ravel(), np.tile(derivacion, n_t))
+        y_por_tu = [apto_y.get((p, a), []) for (p, a, _) in self._t_keys]
+        cuenta = np.fromiter((len(c) for c in y_por_tu), dtype=int, count=n_t)
+        y_cols = np.fromiter((j for c in y_por_tu for j in c), dtype=int, count=int(cuenta.sum()))
+        f.coef(np.repeat(filas, cuenta), y0 + y_cols, loss_y[y_cols])
+
+        filas = f.nuevas(n_t, SENSE_GE, params['Nivel_minimo'])
+        f.coef(filas, t_nivel, 1.0)
+        filas = f.nuevas(n_t, SENSE_LE, params['Nivel_maximo'])
+        f.coef(filas, t_nivel, 1.0)
+        filas = f.nuevas(n_t, SENSE_EQ, params['Potencia_Objetivo_TU'])
+        f.coef(filas, t_nivel, 1.0)
+        f.coef(filas, dplus0 + np.arange(n_t), -1.0)
+        f.coef(filas, dminus0 + np.arange(n_t), 1.0)
+
+        self.n_rows = f.n - 1
+        self.rows = np.concatenate(f.rows)
+        self.cols = np.concatenate(f.cols)
+        self.vals = np.concatenate(f.vals)
+        self.sentidos = np.concatenate(f.sentidos)
+        self.rhs = np.concatenate(f.rhs)
+        self.obj_cols = np.arange(dplus0, self.n_cols)
+        self.obj_vals = np.tile(np.array([len(self._clases[t]) for t in self._t_keys], dtype=float), 2)
+
+        # z[p, a] is not part of any constraint; fixed like in _crear_variables.
+        self._z = {
+            (p, a): _Valor(1 if params['tus_requeridos_por_apartamento'].get((p, a), 0) > 1 else 0)
+            for p in pisos for a in range(1, params['apartamentos_por_piso'] + 1)
+        }
+
+        # Auxiliary values used by the result extractors.
+        long_ant_troncal = (params['Piso_Maximo'] - p_troncal + 1) * params['largo_cable_entre_pisos'] + params['largo_cable_amplificador_ultimo_piso']
+        self._comunes = {
+            'bloques_de_pisos': bloques,
+            'p_troncal': p_troncal,
+            'long_ant_troncal': long_ant_troncal,
+            'loss_ant_troncal': long_ant_troncal * att,
+            'loss_conns_ant_troncal': loss_conns
+        }
+
+    def estadisticas(self):
+        """Same figures as Optimizacion_RITEL_10.estadisticas_modelo."""
+        return {
+            'variables': self.n_cols,
+            'binarias': self.n_binarias,
+            'restricciones': self.n_rows,
+            'no_ceros': int(self.rows.size)
+        }
+
+    def write_mps(self, path):
+        """Writes the model as an MPS file, column by column, in a single pass.
+
+        Uses the same fixed-width layout and number format as LpProblem.writeMPS.
+        """
+        orden = np.lexsort((self.rows, self.cols))
+        rows = np.concatenate([np.zeros(self.obj_cols.size, dtype=int), self.rows[orden]])
+        cols = np.concatenate([self.obj_cols, self.cols[orden]])
+        vals = np.concatenate([self.obj_vals, self.vals[orden]])
+        orden = np.argsort(cols, kind='stable')
+        rows, cols, vals = rows[orden].tolist(), cols[orden].tolist(), vals[orden].tolist()
+
+        nombres_fila = ['OBJ'] + [f"R{i:07d}" for i in range(1, self.n_rows + 1)]
+        nombres_col = [f"C{j:07d}" for j in range(self.n_cols)]
+        fin_binarias = np.searchsorted(cols, self.n_binarias)
+
+        with open(path, 'w') as f:
+            f.write("NAME          MODEL\nROWS\n N  OBJ\n")
+            f.write("".join(f" {s}  {n}\n" for s, n in zip(self.sentidos.tolist(), nombres_fila[1:])))
+            f.write("COLUMNS\n")
+            f.write("    MARKER                 'MARKER'                 'INTORG'\n")
+            f.write("".join(
+                f"    {nombres_col[c]}  {nombres_fila[r]:<8}  {v: .12e}\n"
+                for c, r, v in zip(cols[:fin_binarias], rows[:fin_binarias], vals[:fin_binarias])
+            ))
+            f.write("    MARKER                 'MARKER'                 'INTEND'\n")
+            f.write("".join(
+                f"    {nombres_col[c]}  {nombres_fila[r]:<8}  {v: .12e}\n"
+                for c, r, v in zip(cols[fin_binarias:], rows[fin_binarias:], vals[fin_binarias:])
+            ))
+            f.write("RHS\n")
+            f.write("".join(
+                f"    RHS       {nombres_fila[i + 1]}  {v: .12e}\n"
+                for i, v in enumerate(self.rhs.tolist()) if v != 0
+            ))
+            f.write("BOUNDS\n")
+            f.write("".join(f" BV BND       {nombres_col[j]}\n" for j in range(self.n_binarias)))
+            f.write("ENDATA\n")
+
+    def matriz(self):
+        """The model as row-wise arrays, in the layout of solver_backends.HighsSolver."""
+        orden = np.lexsort((self.cols, self.rows))
+        filas = self.rows[orden] - 1
+        costo = np.zeros(self.n_cols)
+        costo[self.obj_cols] = self.obj_vals
+        col_hi = np.full(self.n_cols, np.inf)
+        col_hi[:self.n_binarias] = 1.0
+        enteras = np.zeros(self.n_cols, dtype=np.uint8)
+        enteras[:self.n_binarias] = 1
+        return {
+            'costo': costo,
+            'col_lo': np.zeros(self.n_cols),
+            'col_hi': col_hi,
+            'enteras': enteras,
+            'fila_lo': np.where(self.sentidos == SENSE_LE, -np.inf, self.rhs),
+            'fila_hi': np.where(self.sentidos == SENSE_GE, np.inf, self.rhs),
+            'inicio': np.searchsorted(filas, np.arange(self.n_rows + 1)),
+            'indices': self.cols[orden],
+            'valores': self.vals[orden]
+        }
+
+    def asignar_diseno(self, diseno):
+        """Loads a design (format of _asignar_diseno) as MIP start and values; returns its objective."""
+        params = self.params
+        x0, y0, r0, pot0, nivel0, dplus0, dminus0 = self._offsets
+        troncal, derivadores, repartidores = diseno['troncal'], diseno['derivadores'], diseno['repartidores']
+        pot = _potencias_riser(
+            params, self._comunes['bloques_de_pisos'], self._comunes['p_troncal'],
+            params['repartidores_data'][troncal]['perdida_insercion'], derivadores
+        )
+        pot_piso = {p: v for (p, _), v in pot.items()}
+        niveles = np.array([
+            _nivel_toma(params, pot_piso[p], derivadores[p], repartidores.get((p, a)), p, a, t)
+            for (p, a, t) in self._t_keys
+        ])
+        desviacion = niveles - params['Potencia_Objetivo_TU']
+
+        arranque = np.zeros(self.n_cols)
+        arranque[x0:y0] = [derivadores[p] == d for (p, d) in self._x_keys]
+        arranque[y0:r0] = [repartidores.get((p, a)) == r for (p, a, r) in self._y_keys]
+        arranque[r0:pot0] = [r == troncal for r in self._r_keys]
+        arranque[pot0:nivel0] = [pot[k] for k in self._pot_keys]
+        arranque[nivel0:dplus0] = niveles
+        arranque[dplus0:dminus0] = np.maximum(desviacion, 0.0)
+        arranque[dminus0:] = np.maximum(-desviacion, 0.0)
+        self.arranque = arranque
+        # Like _asignar_diseno, the design can also be read as a result.
+        self._cargar_solucion(arranque)
+        return self.objective
+
+    def solve(self, solver=None):
+        """Solves the model with ``solver`` and loads the solution into `_aux`.
+
+        A solver with `resolver_matriz` (solver_backends.HighsSolver) receives the arrays
+        in-process, one with `resolver_mps` (solver_portfolio.PortfolioSolver) the MPS
+        file. Any other solver is taken as a PULP_CBC_CMD: the MPS file is written and
+        CBC runs with its time limit, options and logPath, the same way COIN_CMD.solve_CBC
+        does for an LpProblem. Solvers created with warmStart=True start from `arranque`
+        (see asignar_diseno) when it is set.
+        """
+        solver = solver or PULP_CBC_CMD(msg=False)
+        usa_arranque = getattr(solver, 'optionsDict', {}).get('warmStart')
+        arranque = self.arranque if usa_arranque else None
+        if hasattr(solver, 'resolver_matriz'):
+            self.status, valores = solver.resolver_matriz(self.matriz(), arranque)
+            valores = np.zeros(self.n_cols) if valores is None else np.asarray(valores)
+        elif hasattr(solver, 'resolver_mps'):
+            def escribir_mps(path):
+                self.write_mps(path)
+                return None if arranque is None else self._por_nombre(arranque)
+            self.status, por_nombre = solver.resolver_mps(escribir_mps)
+            valores = self._valores_por_nombre(por_nombre)
+        else:
+            capturar_log = getattr(solver, 'capturar_log', nullcontext)
+            with capturar_log():
+                valores = self._resolver_cbc(solver, arranque)
+
+        self._cargar_solucion(valores)
+        return self.status
+
+    def _resolver_cbc(self, solver, arranque=None):
+        """Runs CBC on the MPS file (and MIP start, if any) and returns the column values."""
+        fd, mps_path = tempfile.mkstemp(suffix='.mps')
+        os.close(fd)
+        fd, sol_path = tempfile.mkstemp(suffix='.sol')
+        os.close(fd)
+        fd, mst_path = tempfile.mkstemp(suffix='.mst')
+        os.close(fd)
+        try:
+            self.write_mps(mps_path)
+            if arranque is not None:
+                escribir_arranque_cbc(mst_path, self._por_nombre(arranque))
+            log_path = solver.optionsDict.get('logPath')
+            pipe = open(log_path, 'w') if log_path else (None if solver.msg else open(os.devnull, 'w'))
+            try:
+                args = argumentos_cbc(solver, mps_path, sol_path, mst_path if arranque is not None else None)
+                if subprocess.run(args, stdout=pipe, stderr=pipe, stdin=subprocess.DEVNULL).returncode != 0:
+                    raise PulpSolverError("Error while executing " + solver.path)
+            finally:
+                if pipe is not None:
+                    pipe.close()
+
+            self.status, _, _, por_nombre = leer_solucion_cbc(solver, sol_path)
+            valores = self._valores_por_nombre(por_nombre)
+        finally:
+            for path in (mps_path, sol_path, mst_path):
+                if os.path.exists(path):
+                    os.unlink(path)
+        return valores
+
+    @staticmethod
+    def _por_nombre(valores):
+        """{MPS column name: value} for a vector of column values."""
+        return {f"C{j:07d}": v for j, v in enumerate(valores.tolist())}
+
+    def _valores_por_nombre(self, por_nombre):
+        """Column values from a {MPS column name: value} solution."""
+        valores = np.zeros(self.n_cols)
+        for nombre, valor in por_nombre.items():
+            if nombre[0] == 'C':
+                valores[int(nombre[1:])] = valor
+        return valores
+
+    def _cargar_solucion(self, valores):
+        x0, y0, r0, pot0, nivel0, dplus0, dminus0 = self._offsets
+
+        def bloque(keys, inicio):
+            return {k: _Valor(v) for k, v in zip(keys, valores[inicio:inicio + len(keys)].tolist())}
+
+        def por_toma(inicio):
+            # Every TU of a class reads the value of its representative.
+            valores_clase = bloque(self._t_keys, inicio)
+            return {t: valores_clase[rep] for rep, miembros in self._clases.items() for t in miembros}
+
+        self._aux = dict(
+            self._comunes,
+            z=self._z,
+            x=bloque(self._x_keys, x0),
+            y=bloque(self._y_keys, y0),
+            r_troncal=bloque(self._r_keys, r0),
+            pot_in_riser_by_block=bloque(self._pot_keys, pot0),
+            nivel_tu=por_toma(nivel0),
+            d_plus=por_toma(dplus0),
+            d_minus=por_toma(dminus0),
+        )
+        self.objective = float(self.obj_vals @ valores[dplus0:])
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Build-time and memory benchmark: PuLP model builder vs. sparse_model.SparseModel.
+
+For synthetic buildings of increasing size it measures, for each builder, the time to
+build the model and write its MPS file (what CBC actually reads) and the peak Python
+memory of that step, and checks that both models have the same size. The reduced PuLP
+formulation (construir_modelo_milp(..., reducida=True)) is measured as well, with its
+own model size. Time and memory
+are measured in separate runs because tracemalloc slows allocation-heavy code down.
+
+Usage:
+    python3 scripts/benchmark_model_builders.py [tus ...]   (default: 100 1000 10000)
+"""
+import sys
+import json
+import os
+import gc
+import math
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../app/python/10'))
+import Optimizacion_RITEL_10
+from Funciones_apoyo_datos_entrada import generar_indices_y_validar_datos
+from apartment_tables import tablas_apartamento
+from sparse_model import SparseModel
+from template_to_canonical import DEFAULT_DERIVADORES, DEFAULT_REPARTIDORES
+
+DEFAULT_SIZES = [100, 1000, 10000]
+APARTAMENTOS_POR_PISO = 8
+
+
+def synthetic_params(tus_objetivo):
+    """Deterministic building with 1-5 TUs per apartment and ~tus_objetivo TUs in total."""
+    tus_por_piso = 3 * APARTAMENTOS_POR_PISO
+    pisos = max(2, math.ceil(tus_objetivo / tus_por_piso))
+    tus, cable_dr, cable_tu = {}, {}, {}
+    for p in range(1, pisos + 1):
+        for a in range(1, APARTAMENTOS_POR_PISO + 1):
+            n = 1 + ((p + a) % 5)
+            tus[p, a] = n
+            cable_dr[p, a] = 5 + (p * 7 + a * 3) % 11
+            for t in range(1, n + 1):
+                cable_tu[p, a, t] = [5, 8, 10, 12, 15, 20][(p + a + t) % 6]
+    return {
+        "Piso_Maximo": pisos, "apartamentos_por_piso": APARTAMENTOS_POR_PISO,
+        "largo_cable_amplificador_ultimo_piso": 7.0, "potencia_entrada": 110.0,
+        "largo_cable_feeder_bloque": 3.0, "atenuacion_cable_por_metro": 0.2,
+        "atenuacion_conector": 0.2, "largo_cable_entre_pisos": 3.0,
+        "Nivel_minimo": 45.0, "Nivel_maximo": 75.0, "Potencia_Objetivo_TU": 58.0,
+        "conectores_por_union": 2, "atenuacion_conexion_tu": 1.0, "p_troncal": round(pisos / 2),
+        "derivadores_data": DEFAULT_DERIVADORES, "repartidores_data": DEFAULT_REPARTIDORES,
+        "tus_requeridos_por_apartamento": tus,
+        "largo_cable_derivador_repartidor": cable_dr,
+        "largo_cable_tu": cable_tu,
+    }
+
+
+def build_pulp(params, all_toma_indices, tablas, mps_path):
+    modelo = Optimizacion_RITEL_10.construir_modelo_milp(params, all_toma_indices, tablas)
+    modelo.writeMPS(mps_path, rename=1)
+    return Optimizacion_RITEL_10.estadisticas_modelo(modelo)
+
+
+def build_pulp_reduced(params, all_toma_indices, tablas, mps_path):
+    modelo = Optimizacion_RITEL_10.construir_modelo_milp(params, all_toma_indices, tablas, reducida=True)
+    modelo.writeMPS(mps_path, rename=1)
+    return Optimizacion_RITEL_10.estadisticas_modelo(modelo)
+
+
+def build_sparse(params, all_toma_indices, tablas, mps_path):
+    modelo = SparseModel(params, all_toma_indices, tablas)
+    modelo.write_mps(mps_path)
+    return modelo.estadisticas()
+
+
+def measure(builder, params, all_toma_indices, tablas):
+    fd, mps_path = tempfile.mkstemp(suffix='.mps')
+    os.close(fd)
+    try:
+        gc.collect()
+        start_time = time.perf_counter()
+        stats = builder(params, all_toma_indices, tablas, mps_path)
+        elapsed = time.perf_counter() - start_time
+
+        gc.collect()
+        tracemalloc.start()
+        builder(params, all_toma_indices, tablas, mps_path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        mps_bytes = os.path.getsize(mps_path)
+    finally:
+        os.unlink(mps_path)
+    return {
+        "build_s": round(elapsed, 3),
+        "peak_mb": round(peak / 2 ** 20, 1),
+        "mps_kb": round(mps_bytes / 1024),
+        "model": stats,
+    }
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or DEFAULT_SIZES
+    results = []
+    for size in sizes:
+        params = synthetic_params(size)
+        all_toma_indices = generar_indices_y_validar_datos(params)
+        # Apartment tables are shared by both builders (model_cache computes them once).
+        tablas = tablas_apartamento(params, all_toma_indices)
+        pulp_result = measure(build_pulp, params, all_toma_indices, tablas)
+        sparse_result = measure(build_sparse, params, all_toma_indices, tablas)
+        results.append({
+            "tus": len(all_toma_indices),
+            "pisos": params["Piso_Maximo"],
+            "pulp": pulp_result,
+            "pulp_reduced": measure(build_pulp_reduced, params, all_toma_indices, tablas),
+            "sparse": sparse_result,
+            "same_model_size": pulp_result["model"] == sparse_result["model"],
+            "speedup": round(pulp_result["build_s"] / max(sparse_result["build_s"], 1e-9), 1),
+        })
+
+    print(json.dumps({"success": all(r["same_model_size"] for r in results), "results": results}, indent=2))
+    return 0 if all(r["same_model_size"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
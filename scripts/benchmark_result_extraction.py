@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Benchmark of the detail-row extraction and the JSON emission on large buildings.
+
+For synthetic buildings of increasing size it loads a fixed design into the PuLP model
+and into sparse_model.SparseModel and times extraer_filas_detalle on each (best of
+several runs), checking that both give the same rows. It then times the emission of
+the contract v2 payload (optimizer_canonical._result_payload plus json.dumps) against
+the former pandas path, kept below as pandas_payload, and checks that both write the
+same bytes. Finally it times and sizes the nested contract v3 payload, and checks that
+result_contract.expand_to_v2 rebuilds the v2 bytes from it. Last, it compares the
+single v2 line with the streamed NDJSON output (optimizer_canonical._stream_result):
+peak Python heap of the emission (tracemalloc), time to the first byte written and
+to the last, and
+whether result_contract.collect_stream rebuilds the same payload. The design is
+deterministic (trunk, one derivador per floor in turn and the first repartidor of each
+apartment table) and need not respect the level limits: the extraction does the same
+work for any design.
+
+The default catalog has at most 8 outputs per trunk repartidor, which caps a building
+at 8 blocks (~1,000 TUs); larger sizes add a trunk repartidor with one output per
+block to the catalog.
+
+Usage:
+    python3 scripts/benchmark_result_extraction.py [tus ...]   (default: 1000 5000 10000)
+"""
+import sys
+import json
+import os
+import contextlib
+import gc
+import io
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../app/python/10'))
+import Optimizacion_RITEL_10
+import greedy_start
+import optimizer_canonical
+import result_contract
+from Funciones_apoyo_datos_entrada import generar_indices_y_validar_datos, dividir_en_bloques
+from apartment_tables import tablas_apartamento
+from result_pipeline import ResultPipeline
+from sparse_model import SparseModel
+from benchmark_model_builders import synthetic_params
+
+DEFAULT_SIZES = [1000, 5000, 10000]
+REPEATS = 3
+TRONCAL_BENCHMARK = "BENCH_TRONCAL"
+
+
+def benchmark_params(tus):
+    params = synthetic_params(tus)
+    bloques = len(dividir_en_bloques(params["Piso_Maximo"]))
+    if bloques > max(r["salidas"] for r in params["repartidores_data"].values()):
+        params["repartidores_data"] = {
+            **params["repartidores_data"],
+            TRONCAL_BENCHMARK: {"salidas": bloques, "perdida_insercion": 20.0},
+        }
+    return params
+
+
+def fixed_design(aux):
+    derivadores = sorted({d for _, d in aux["x"]})
+    repartidores = {}
+    for (p, a, r) in aux["y"]:
+        repartidores.setdefault((p, a), r)
+    return {
+        "troncal": next(iter(aux["r_troncal"])),
+        "derivadores": {p: derivadores[p % len(derivadores)] for p, _ in aux["x"]},
+        "repartidores": repartidores,
+    }
+
+
+def pandas_payload(filas_detalle, params, all_toma_indices, status, solver_status, solver_log):
+    """The DataFrame-based _result_payload of optimizer_canonical before the pandas-free path."""
+    import pandas as pd
+    nivel_key = 'Nivel TU Final (dBµV)'
+    min_n = float(params['Nivel_minimo'])
+    max_n = float(params['Nivel_maximo'])
+    df_detalle = pd.DataFrame(filas_detalle)
+    detail = []
+    df_detalle_clean = df_detalle.where(pd.notnull(df_detalle), None)
+    for _, row in df_detalle_clean.iterrows():
+        row_dict = row.to_dict()
+        val = float(row_dict.get(nivel_key, 0) or 0)
+        losses = [
+            {"segment": segment, "value": float(row_dict.get(column, 0) or 0)}
+            for segment, column in result_contract.LOSS_SEGMENTS
+        ]
+        row_dict.update({
+            "tu_id": str(row_dict.get('Toma', '')),
+            "piso": int(row_dict.get('Piso', 0)),
+            "apto": int(row_dict.get('Apto', 0)),
+            "bloque": int(row_dict.get('Bloque', 0)),
+            "nivel_tu": val,
+            "nivel_min": min_n,
+            "nivel_max": max_n,
+            "cumple": 1 if (min_n <= val <= max_n) else 0,
+            "losses": losses
+        })
+        detail.append(row_dict)
+    summary = {
+        "contract_version": 2,
+        "piso_max": int(params['Piso_Maximo']),
+        "total_tus": len(all_toma_indices),
+        "status": status,
+        "avg_nivel_tu": float(df_detalle[nivel_key].mean()),
+        "min_nivel_tu": float(df_detalle[nivel_key].min()),
+        "max_nivel_tu": float(df_detalle[nivel_key].max())
+    }
+    return {
+        "success": True, "summary": summary, "detail": detail,
+        "solver_status": solver_status, "solver_log": solver_log
+    }
+
+
+def best_of(fn):
+    best, result = None, None
+    for _ in range(REPEATS):
+        gc.collect()
+        start_time = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def time_extraction(modelo, params, all_toma_indices):
+    return best_of(lambda: Optimizacion_RITEL_10.extraer_filas_detalle(modelo, params, all_toma_indices))
+
+
+def time_emission(payload):
+    # _result_payload lists the detail columns on stderr.
+    with contextlib.redirect_stderr(io.StringIO()):
+        return best_of(lambda: json.dumps(payload()))
+
+
+class Sink:
+    """Output stream that keeps the time of the first write and, optionally, the text."""
+
+    def __init__(self, keep=False):
+        self.start = time.perf_counter()
+        self.first_write = None
+        self.chunks = [] if keep else None
+
+    def write(self, text):
+        if self.first_write is None:
+            self.first_write = time.perf_counter() - self.start
+        if self.chunks is not None:
+            self.chunks.append(text)
+
+    def flush(self):
+        pass
+
+
+def measure_output(write):
+    """(peak traced MB, seconds to the first write, total seconds) of write(sink).
+
+    The detail rows are already extracted. The times come from a run without tracing.
+    """
+    with contextlib.redirect_stderr(io.StringIO()):
+        gc.collect()
+        sink = Sink()
+        write(sink)
+        total = time.perf_counter() - sink.start
+        gc.collect()
+        tracemalloc.start()
+        write(Sink())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return peak / 2 ** 20, sink.first_write, total
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or DEFAULT_SIZES
+    results = []
+    for size in sizes:
+        params = benchmark_params(size)
+        all_toma_indices = generar_indices_y_validar_datos(params)
+        tablas = tablas_apartamento(params, all_toma_indices)
+
+        modelo = Optimizacion_RITEL_10.construir_modelo_milp(params, all_toma_indices, tablas)
+        diseno = fixed_design(modelo._aux)
+        greedy_start.fijar_arranque(modelo, params, all_toma_indices, diseno)
+        pulp_s, filas_pulp = time_extraction(modelo, params, all_toma_indices)
+
+        sparse = SparseModel(params, all_toma_indices, tablas)
+        greedy_start.fijar_arranque(sparse, params, all_toma_indices, diseno)
+        sparse_s, filas_sparse = time_extraction(sparse, params, all_toma_indices)
+
+        emit_s, emitted = time_emission(lambda: optimizer_canonical._result_payload(
+            ResultPipeline(modelo, params, all_toma_indices, filas_pulp), "Optimal", "Optimal", ""
+        ))
+        pandas_s, emitted_pandas = time_emission(
+            lambda: pandas_payload(filas_pulp, params, all_toma_indices, "Optimal", "Optimal", "")
+        )
+        v3_s, emitted_v3 = time_emission(lambda: optimizer_canonical._result_payload(
+            ResultPipeline(modelo, params, all_toma_indices, filas_pulp), "Optimal", "Optimal", "", contract_version=3
+        ))
+        expand_s, expanded = best_of(lambda: json.dumps(result_contract.expand_to_v2(json.loads(emitted_v3))))
+
+        def resultados():
+            return ResultPipeline(modelo, params, all_toma_indices, filas_pulp)
+
+        single_mb, single_first_s, single_s = measure_output(lambda out: optimizer_canonical._emit(
+            out, optimizer_canonical._result_payload(resultados(), "Optimal", "Optimal", "")
+        ))
+        stream_mb, stream_first_s, stream_s = measure_output(lambda out: optimizer_canonical._stream_result(
+            out, resultados(), "Optimal", "Optimal", ""
+        ))
+        streamed = Sink(keep=True)
+        with contextlib.redirect_stderr(io.StringIO()):
+            optimizer_canonical._stream_result(streamed, resultados(), "Optimal", "Optimal", "")
+        records = [json.loads(line) for line in "".join(streamed.chunks).splitlines()]
+
+        results.append({
+            "tus": len(all_toma_indices),
+            "pisos": params["Piso_Maximo"],
+            "pulp_ms": round(pulp_s * 1000, 1),
+            "sparse_ms": round(sparse_s * 1000, 1),
+            "us_per_tu": round(min(pulp_s, sparse_s) * 1e6 / len(all_toma_indices), 2),
+            "same_rows": filas_pulp == filas_sparse,
+            "emit_ms": round(emit_s * 1000, 1),
+            "pandas_emit_ms": round(pandas_s * 1000, 1),
+            "same_payload": emitted == emitted_pandas,
+            "v2_kb": round(len(emitted.encode()) / 1024),
+            "v3_kb": round(len(emitted_v3.encode()) / 1024),
+            "v3_emit_ms": round(v3_s * 1000, 1),
+            "v3_expand_ms": round(expand_s * 1000, 1),
+            "v3_expands_to_v2": expanded == emitted,
+            "single_peak_mb": round(single_mb, 1),
+            "stream_peak_mb": round(stream_mb, 1),
+            "single_first_byte_ms": round(single_first_s * 1000, 1),
+            "stream_first_byte_ms": round(stream_first_s * 1000, 1),
+            "single_total_ms": round(single_s * 1000, 1),
+            "stream_total_ms": round(stream_s * 1000, 1),
+            "stream_collects_to_v2": json.dumps(result_contract.collect_stream(records)) == emitted,
+        })
+
+    success = all(r["same_rows"] and r["same_payload"] and r["v3_expands_to_v2"] and r["stream_collects_to_v2"]
+                  for r in results)
+    print(json.dumps({"success": success, "repeats": REPEATS, "results": results}, indent=2))
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Cold-start budget check for the canonical optimizer entry point.
+
+Spawns fresh interpreters that import optimizer_canonical (the JSON-in/JSON-out
+path) and reports the median import time against a budget. It also fails if any
+of the Excel/plot/HTML tooling leaks back into the solve path.
+
+Usage:
+    python3 scripts/validate_cold_start.py [runs] [budget_ms]
+"""
+import sys
+import json
+import os
+import subprocess
+import statistics
+
+OPTIMIZER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../app/python/10')
+
+# Default budget for `import optimizer_canonical` on the production host.
+DEFAULT_BUDGET_MS = 350
+
+# Modules that must not be imported by a JSON-in/JSON-out run.
+FORBIDDEN_MODULES = [
+    'pandas',
+    'openpyxl',
+    'matplotlib',
+    'Funciones_apoyo_salida',
+    'Funciones_apoyo_visualizacion',
+]
+
+PROBE = """
+import sys, time, json
+t0 = time.perf_counter()
+import optimizer_canonical
+elapsed_ms = (time.perf_counter() - t0) * 1000
+print(json.dumps({"import_ms": elapsed_ms, "modules": sorted(sys.modules)}))
+"""
+
+
+def measure_once():
+    proc = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=OPTIMIZER_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(proc.stdout)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget_ms = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_BUDGET_MS
+
+    samples = [measure_once() for _ in range(runs)]
+    import_ms = [s["import_ms"] for s in samples]
+    median_ms = statistics.median(import_ms)
+    leaked = [m for m in FORBIDDEN_MODULES if m in samples[0]["modules"]]
+
+    success = median_ms <= budget_ms and not leaked
+    print(json.dumps({
+        "success": success,
+        "budget_ms": budget_ms,
+        "median_import_ms": round(median_ms, 1),
+        "samples_ms": [round(v, 1) for v in import_ms],
+        "leaked_modules": leaked
+    }, indent=2))
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()